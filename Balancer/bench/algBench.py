@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""
+Benchmark of the control loop overhead (utilities.doEpoch and
+Algorithm.step) using the simulated MSR device, so it can be run on any
+GNU/Linux machine. The L3 occupancy monitor runs at the same time and the
+lock wait times are reported at the end.
+
+Usage: algBench.py [threads] [epochs] [algorithm]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import sys
+import threading
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'src'))
+import msr
+import simMSR
+import process
+import algorithms
+import utilities
+import timedLock
+import decisionTrace
+
+# Default configuration of the README (AMD Rome 7702P)
+CONFIG = {
+    "alg": "llcbw",
+    "msr": "sim",
+    "hpmo_limit": 0.06,
+    "hpmo_max": 0.065,
+    "lat_limit": 450,
+    "hwCounters": {
+        "Instr Retired": {"addr": "0xC0010200", "value": "0x5100c0"},
+        "Cycles": {"addr": "0xC0010202", "value": "0x510076"},
+        "L3HitDC": {"addr": "0xC0010204", "value": "0x511243"},
+        "L3MissDC": {"addr": "0xC0010206", "value": "0x514843"},
+        "L3HitPF": {"addr": "0xC0010208", "value": "0x51125A"},
+        "L3HitPFL2": {"addr": "0xC001020A", "value": "0x513F71"},
+        "L3Miss": {"addr": "0xC0010230", "value": "0x0F000000400106"},
+        "L3Latency1": {"addr": "0xC0010238", "value": "0xFF0F000000400090"},
+        "L3Latency2": {"addr": "0xC001023A", "value": "0xFF0F000000401B9A"}
+    },
+    "tepoch": 0.005,
+    "limit": 1.2,
+    "rolling": 10,
+    "bw_limit": 2.5
+}
+
+def stats(name, values):
+    """
+    Print the statistics of a list of times (seconds)
+    """
+    values = sorted(values)
+    print("{:8s} mean: {:7.3f} ms p50: {:7.3f} ms p99: {:7.3f} ms".format(
+        name, 1000 * sum(values) / len(values),
+        1000 * values[len(values) // 2], 1000 * values[int(len(values) * .99)]))
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    config = dict(CONFIG)
+    config['threads'] = list(range(0, threads))
+    if len(sys.argv) > 3:
+        config['alg'] = sys.argv[3]
+
+    msr.setBackend(simMSR.SimMSR(config['threads'],
+        ccx=config.get('ccx_size', 4)))
+    prc = process.Process({}, config)
+    parameters = {i: config[i] for i in ['limit', 'rolling', 'hpmo_max',
+        'bw_limit', 'lat_limit', 'hpmo_limit']}
+    parameters['core'] = config['threads']
+    parameters['prc'] = prc
+    # Binary decision trace, it is written by a background thread
+    parameters['trace'] = decisionTrace.DecisionTrace(config['threads'],
+            os.devnull, fmt='bin')
+    alg = algorithms.Algorithm(config['alg'], parameters)
+
+    # Silence the L3 monitor messages
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+
+    # L3 occupancy multiplexer
+    monitor = threading.Thread(target=prc._updateL3Monitor)
+    monitor.start()
+
+    tepoch = []
+    tstep = []
+    for _ in range(0, epochs):
+        t = perf_counter()
+        data = utilities.doEpoch(prc, config['threads'], config['tepoch'])
+        # Do not account the epoch sleep
+        tepoch.append(perf_counter() - t - config['tepoch'])
+        t = perf_counter()
+        alg.step(data)
+        tstep.append(perf_counter() - t)
+
+    prc.stop()
+    monitor.join()
+    parameters['trace'].close()
+    sys.stderr = stderr
+    print("Threads: {} Epochs: {} Algorithm: {}".format(threads, epochs,
+        config['alg']))
+    stats("doEpoch", tepoch)
+    stats("step", tstep)
+    print(timedLock.report())
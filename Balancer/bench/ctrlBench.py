@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""
+Benchmark of the epoch jitter of the controller on the simulated MSR device.
+It compares the threaded loop (doEpoch + step in a thread, L3 occupancy
+monitor in another thread) with the asyncio controller, the jitter is the
+difference between the real epoch length and tepoch. The watchdogs and the
+job reaping are disabled (no jobs are launched).
+
+Usage: ctrlBench.py [threads] [seconds] [tepoch]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import sys
+import threading
+from time import sleep
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'src'))
+import msr
+import simMSR
+import process
+import algorithms
+import utilities
+import controller
+from algBench import CONFIG, stats
+
+def setup(config):
+    """
+    Return a new process and algorithm objects for the given configuration
+    """
+    msr.setBackend(simMSR.SimMSR(config['threads'],
+        ccx=config.get('ccx_size', 4)))
+    prc = process.Process({}, config)
+    parameters = {i: config[i] for i in ['limit', 'rolling', 'hpmo_max',
+        'bw_limit', 'lat_limit', 'hpmo_limit']}
+    parameters['core'] = config['threads']
+    parameters['prc'] = prc
+    return prc, algorithms.Algorithm(config['alg'], parameters)
+
+def threaded(config, seconds):
+    """
+    Threaded loop (doEpoch, step and the L3 monitor thread)
+    """
+    prc, alg = setup(config)
+    monitor = threading.Thread(target=prc._updateL3Monitor)
+    monitor.start()
+    times = []
+
+    def run():
+        while not prc.isEnd():
+            data = utilities.doEpoch(prc, config['threads'], config['tepoch'])
+            times.append(data.elapsed().mean())
+            alg.step(data)
+
+    th = threading.Thread(target=run)
+    th.start()
+    sleep(seconds)
+    prc.stop()
+    th.join()
+    monitor.join()
+    # Elapsed time of each epoch
+    return [abs(i - config['tepoch']) for i in times]
+
+def asynchronous(config, seconds):
+    """
+    asyncio controller
+    """
+    prc, alg = setup(config)
+    times = []
+    ctrl = controller.Controller(prc, alg, config['threads'],
+            config['tepoch'], onEpoch=lambda data: times.append(
+                data.elapsed().mean()), timeCPU=0, timeProcess=0, reap=False)
+    threading.Timer(seconds, prc.stop).start()
+    ctrl.run()
+    return [abs(i - config['tepoch']) for i in times], ctrl
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    config = dict(CONFIG)
+    config['threads'] = list(range(0, threads))
+    config['tepoch'] = float(sys.argv[3]) if len(sys.argv) > 3 else .05
+
+    # The algorithm and the monitors write on stderr
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    tth = threaded(config, seconds)
+    tas, ctrl = asynchronous(config, seconds)
+    sys.stderr = stderr
+
+    print("Threads: {} Seconds: {} tepoch: {} s".format(threads, seconds,
+        config['tepoch']))
+    print("Epochs threads: {} asyncio: {}".format(len(tth) + 1, len(tas) + 1))
+    stats("threads", tth)
+    stats("asyncio", tas)
+    print(ctrl.report())
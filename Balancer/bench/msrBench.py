@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+"""
+Microbenchmark of the MSR access layer.
+
+It simulates the MSR accesses done in one epoch of Balancer (read all the
+hardware counters of every thread plus one sweep of the L3 occupancy
+multiplexer) and reports the number of syscalls and the time spent with the
+old access method (open + lseek + read/write + close per access), with the
+file descriptor pool of msr.py (readMSR) and with the hardware counters read
+by msr.readMany.
+
+By default the MSR devices are replaced by sparse temporal files, so it can
+be run on any GNU/Linux machine without root access. The files only measure
+the number of syscalls and the Python overhead: a read of the msr device
+also executes rdmsr on the target cpu (an IPI if it is not the current cpu),
+which costs more than the syscall itself. With --dev the real devices
+(/dev/cpu/*/msr, root and the msr module needed) are read instead, the L3
+occupancy sweep only writes back the values that it reads.
+
+Usage: msrBench.py [threads] [epochs] [--dev]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import sys
+import struct
+import tempfile
+import numpy as np
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'src'))
+import msr
+
+# Hardware counters used by the default configuration (counter addresses)
+HWC = [0xC0010201, 0xC0010203, 0xC0010205, 0xC0010207, 0xC0010209,
+        0xC001020B, 0xC0010231, 0xC0010239, 0xC001023B]
+PQR_ASSOC = 0xC8F
+QM_EVTSEL = 0xC8D
+QM_CTR = 0xC8E
+
+# Syscall counter
+calls = {}
+# Output buffer of readMany
+_out = None
+
+def _count(name, func):
+    """
+    Wrap an os function to count the number of times it is called
+    """
+    def wrapper(*args):
+        calls[name] = calls.get(name, 0) + 1
+        return func(*args)
+    return wrapper
+
+def legacyRead(cpu, reg):
+    """
+    Old readMSR implementation
+    """
+    f = os.open(msr.MSR_DEV.format(cpu), os.O_RDONLY)
+    os.lseek(f, reg, os.SEEK_SET)
+    value = struct.unpack('Q', os.read(f, 8))[0]
+    os.close(f)
+    return value
+
+def legacyWrite(cpu, reg, value):
+    """
+    Old writeMSR implementation
+    """
+    f = os.open(msr.MSR_DEV.format(cpu), os.O_WRONLY)
+    os.lseek(f, reg, os.SEEK_SET)
+    os.write(f, struct.pack('Q', value))
+    os.close(f)
+
+def epoch(threads, read, write, many=False):
+    """
+    MSR accesses of one epoch
+
+    Parameters :
+        - threads : number of threads
+        - read : function to read a MSR
+        - write : function to write a MSR
+        - many : read the hardware counters with msr.readMany
+    """
+    # Hardware counters of all the threads
+    if many:
+        msr.readMany(range(0, threads), HWC, out=_out)
+    else:
+        for cpu in range(0, threads):
+            for reg in HWC:
+                read(cpu, reg)
+    # One sweep of the L3 occupancy monitor
+    for cpu in range(0, threads):
+        aux = read(cpu, PQR_ASSOC)
+        write(cpu, PQR_ASSOC, aux)
+        evt = read(cpu, QM_EVTSEL)
+        write(cpu, QM_EVTSEL, evt)
+        read(cpu, QM_CTR)
+
+def run(name, threads, epochs, read, write, many=False):
+    """
+    Run the benchmark and print the results
+    """
+    global _out
+    _out = np.empty((threads, len(HWC)), dtype=np.uint64)
+    calls.clear()
+    t = perf_counter()
+    for _ in range(0, epochs):
+        epoch(threads, read, write, many)
+    t = perf_counter() - t
+    total = sum(calls.values())
+    print("{:8s} syscalls/epoch: {:8.1f} ({}) time/epoch: {:.3f} ms".format(
+        name, total / epochs, ', '.join(["{} {}".format(i, calls[i]) for i in
+            sorted(calls)]), t * 1000 / epochs))
+    return total
+
+if __name__ == '__main__':
+    dev = '--dev' in sys.argv
+    args = [i for i in sys.argv[1:] if i != '--dev']
+    threads = int(args[0]) if len(args) > 0 else 64
+    epochs = int(args[1]) if len(args) > 1 else 100
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not dev:
+            # Create one sparse file per cpu to act as MSR device
+            msr.MSR_DEV = os.path.join(tmp, "msr{}")
+            for cpu in range(0, threads):
+                with open(msr.MSR_DEV.format(cpu), 'wb') as f:
+                    f.truncate(0xC0010300)
+
+        # Count the syscalls
+        orig = {}
+        for i in ['open', 'close', 'lseek', 'read', 'write', 'pread',
+                'pwrite', 'preadv']:
+            orig[i] = getattr(os, i)
+            setattr(os, i, _count(i, orig[i]))
+
+        old = run("legacy", threads, epochs, legacyRead, legacyWrite)
+        new = run("pool", threads, epochs, msr.readMSR, msr.writeMSR)
+        run("readMany", threads, epochs, msr.readMSR, msr.writeMSR, True)
+        msr.close()
+
+        # Restore the os functions
+        for i in orig:
+            setattr(os, i, orig[i])
+
+    print("Syscall reduction: {:.1f}x ({})".format(old / new, "msr device"
+        if dev else "regular files, rdmsr not measured"))
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+Benchmark of the launch of a job pinned to a cpu. It compares the old launch
+(taskset -c N bash -c "..." through a shell) with the direct spawn of
+jobSpec.spawn. For each job it measures the time of the spawn call and the
+time until the job finishes (the command does nothing, so it is the cost of
+the execs).
+
+Usage: spawnBench.py [jobs] [command]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import sys
+import subprocess
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'src'))
+import jobSpec
+from algBench import stats
+
+def shell(cmd, cpu):
+    """
+    Old launch: taskset + bash through a shell
+    """
+    arg = " ".join(["taskset", "-c", str(cpu), "bash", "-c", "\""] +\
+            cmd.split(' ') + ["\""])
+    return subprocess.Popen(arg, stdout = subprocess.DEVNULL, \
+        stderr = subprocess.DEVNULL, preexec_fn = os.setsid, shell=True)
+
+def direct(cmd, cpu):
+    """
+    Direct spawn
+    """
+    return jobSpec.spawn(jobSpec.parse(cmd), cpu)
+
+def run(fn, cmd, jobs, cpu):
+    """
+    Launch the jobs one after the other
+
+    Return : (spawn times, spawn + run times)
+    """
+    spawn, total = [], []
+    for _ in range(0, jobs):
+        t = perf_counter()
+        proc = fn(cmd, cpu)
+        spawn.append(perf_counter() - t)
+        proc.wait()
+        total.append(perf_counter() - t)
+    return spawn, total
+
+if __name__ == '__main__':
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cmd = ' '.join(sys.argv[2:]) if len(sys.argv) > 2 else "/bin/true"
+    cpu = min(os.sched_getaffinity(0))
+
+    print("Jobs: {} Command: {} CPU: {}".format(jobs, cmd, cpu))
+    for name, fn in (("taskset+bash", shell), ("direct", direct)):
+        spawn, total = run(fn, cmd, jobs, cpu)
+        stats("{} spawn".format(name), spawn)
+        stats("{} spawn+exit".format(name), total)
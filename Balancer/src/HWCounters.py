@@ -1,9 +1,9 @@
 #!/usr/bin/python3
 
 """
-Functions to manage in an easy way the hardware counters on an AMD Zen2 
-processor. This class is ad-hoc develop to works with AMD Rome processor, 
-it maybe works on another AMD processors but some changes will probably must 
+Functions to manage in an easy way the hardware counters on an AMD Zen2
+processor. This class is ad-hoc develop to works with AMD Rome processor,
+it maybe works on another AMD processors but some changes will probably must
 be done.
 
 NOTE: The word cpu in this file refers to cpu physical thread.
@@ -12,63 +12,171 @@ NOTE: The word cpu in this file refers to cpu physical thread.
 @EMAIL: agusnt (at) unizar (dot) es
 @DATE: 23/06/2020
 @UPDATES:
+    Counter layout compiled once per cpu
+    CCX layout read from the topology module
 """
+import sys
 import msr
+import topology
+import numpy as np
 
 class HWCounters:
     """
     Class to configure HW counters.
+
+    The configuration is compiled into a table with one row per cpu and one
+    column per hardware counter (the column order is given by names()):
+        * _sel : MSR address where the counter is configured
+        * _ctr : MSR address where the counter value is read
+        * _val : value written in _sel to configure the counter
+        * _l3 : true if the counter is a L3 (CCX) counter
     """
     ###########################################################################
     # Class attribute
     ###########################################################################
+    L3_PMC_BASE = 0xC0010230 # First L3 PMC
+    L3_PMC_END = 0xC0010240 # Last L3 PMC (not included)
+    ALL_THREADS = 0xFF << 56 # Thread mask of all the threads of a CCX
+
     _config = None # Configuration file
+    _topo = None # CPU topology
+    _names = None # Hardware counter names (column order of the table)
+    _addr = None # Configured select addresses (by column)
+    _value = None # Configured select values (by column)
+    _l3 = None # L3 counters flag (by column)
+    _shared = None # L3 counters shared by all the threads of the CCX
+    _row = None # Row of each cpu in the table (cpu -> row)
+    _sel = None # Select addresses (cpus x counters)
+    _ctr = None # Counter addresses (cpus x counters)
+    _val = None # Select values (cpus x counters)
+    _regs = None # Counter addresses of the last readMany (cpus, matrix)
 
     ###########################################################################
     # Not override functions
     ###########################################################################
-    def __init__(self, config):
+    def __init__(self, config, cpus=None, topo=None):
         """
         Constructor of the class.
-        
+
         Parameters:
             - config : dictionary with the configuration. The configuration has
               two values:
-                * addr -> MSR address where the hardware counter will be 
+                * addr -> MSR address where the hardware counter will be
                         configured
-                * value -> value to write in the MSR that configure the 
+                * value -> value to write in the MSR that configure the
                         hardware counter
+            - cpus : cpus to compile the table, other cpus are added the
+                    first time that they are used
+            - topo : (optional) topology.Topology of the machine, by default
+                    it is read from sysfs
         """
         self._config = config
+        self._topo = topo if topo is not None else topology.Topology()
+        self._names = list(config)
+        self._row = {}
+        self._sel = np.zeros((0, len(self._names)), dtype=np.uint64)
+        self._ctr = np.zeros((0, len(self._names)), dtype=np.uint64)
+        self._val = np.zeros((0, len(self._names)), dtype=np.uint64)
+        self._regs = (None, None)
+
+        # Parse the configuration only once
+        self._addr = [int(config[i]['addr'], 16) for i in self._names]
+        self._value = [int(config[i]['value'], 16) for i in self._names]
+        self._l3 = np.array([self.L3_PMC_BASE <= i < self.L3_PMC_END for i in \
+                self._addr], dtype=bool)
+        # L3 counters with thread mask count the events of the whole CCX
+        self._shared = self._l3 & np.array([(i >> 56) != 0 for i in \
+                self._value], dtype=bool)
+
+        if cpus is not None:
+            self._compile(cpus)
 
     ###########################################################################
     # Private functions
     ###########################################################################
-    def _getAddrAndValue(self, thread):
+    def _compile(self, cpus):
         """
-        Generator.
-        Every time that his generator is called return the MSR addr and value 
-        to configure an L3 hardware counters
-    
+        Add the rows of the given cpus to the table
+
+        On AMD Rome the L3 PMCs are shared by all the threads of a CCX. The L3
+        counters without thread mask (bits 56-63 of the value) count only the
+        events of the cpu that configures them, so each core of the CCX uses
+        its own L3 PMC (addr + 2 * position of the core in the CCX) and sets
+        the bit of the thread in the mask (56 + 2 * position + smt). The SMT
+        siblings of a core share its L3 PMC. If there are not enough L3 PMCs
+        or thread mask bits for the cores of the CCX (e.g. the 8 cores CCX of
+        Milan and Genoa) the counter counts the events of all the threads of
+        the CCX in the configured PMC and it is flagged as shared.
+
         Parameters:
-            - thread : thread to configure hw counters
-        """
-        # Read and configure HW counters
-        for i in self._config:
-            if i == "L3Miss":
-                # TODO: change the way to recognize L3 HW counters to be more
-                # general
-                # On AMD Rome the hardware counters associate to the L3 are
-                # requires an extra configuration.
-                thdx = thread % 4
-                addr = int(self._config[i]['addr'], 16) + (thdx * 2)
-                value = int(self._config[i]['value'], 16)
-                value |= (1 << (56 + thdx * 2))
-            else:
-                addr = int(self._config[i]['addr'], 16)
-                value = int(self._config[i]['value'], 16)
-    
-            yield addr, value, i
+            - cpus : list of cpus
+        """
+        cpus = [i for i in cpus if i not in self._row]
+        if len(cpus) == 0:
+            return
+
+        # L3 counters without thread mask that do not fit in the CCX of a cpu
+        # (any cpu of the CCX, so the layout does not depend on the order)
+        for cpu in cpus:
+            last = max([self._topo.position(j) for j in \
+                    self._topo.ccxCpus(cpu)])
+            for i in range(0, len(self._names)):
+                if not self._l3[i] or self._shared[i]:
+                    continue
+                addr = self._addr[i] + last * 2
+                if addr >= self.L3_PMC_END or 56 + last * 2 + 1 > 63 or \
+                        any([self._addr[i] < j <= addr for j in self._addr]):
+                    self._share(i)
+
+        sel = []
+        val = []
+        for cpu in cpus:
+            pos = self._topo.position(cpu)
+            smt = self._topo.smt(cpu)
+            sel.append([])
+            val.append([])
+            for i in range(0, len(self._names)):
+                addr = self._addr[i]
+                value = self._value[i]
+                if self._l3[i] and (value >> 56) == 0:
+                    if self._shared[i]:
+                        value |= self.ALL_THREADS
+                    else:
+                        addr += pos * 2
+                        value |= (1 << (56 + pos * 2 + smt))
+                sel[-1].append(addr)
+                val[-1].append(value)
+            self._row[cpu] = len(self._row)
+
+        sel = np.array(sel, dtype=np.uint64)
+        self._sel = np.vstack((self._sel, sel))
+        self._ctr = np.vstack((self._ctr, sel + 1))
+        self._val = np.vstack((self._val, np.array(val, dtype=np.uint64)))
+
+    def _share(self, col):
+        """
+        Count a L3 counter for all the threads of the CCX (in the configured
+        PMC), the rows already compiled are updated
+        """
+        sys.stderr.write("Not enough L3 PMCs for {} per core, it counts the "
+                "whole CCX\n".format(self._names[col]))
+        sys.stderr.flush()
+        self._shared[col] = True
+        self._sel[:, col] = self._addr[col]
+        self._ctr[:, col] = self._addr[col] + 1
+        self._val[:, col] = self._value[col] | self.ALL_THREADS
+        self._regs = (None, None)
+
+    def _getRow(self, cpu):
+        """
+        Return the row of the table of the given cpu
+
+        Parameters:
+            - cpu : cpu
+        """
+        if cpu not in self._row:
+            self._compile([cpu])
+        return self._row[cpu]
 
     ###########################################################################
     # API functions
@@ -77,25 +185,27 @@ class HWCounters:
         """
         Reset all register dst hw counter. This Function doesn't disable hardware
         counters.
-    
+
         Parameters:
             - cpu : core to reset the hardware counter value
         """
-        for addr, _, _ in self._getAddrAndValue(cpu):
-            msr.writeMSR(cpu, addr + 1, 0)
-    
+        for addr in self._ctr[self._getRow(cpu)].tolist():
+            msr.writeMSR(cpu, addr, 0)
+
     def start(self, cpu):
         """
-        Start all hardware counters 
-    
+        Start all hardware counters
+
         Parameters :
             - cpu : core to init the hardware counters
         """
-        for addr, value, _ in self._getAddrAndValue(cpu):
-            msr.writeMSR(cpu, addr + 1, 0)
+        row = self._getRow(cpu)
+        for sel, ctr, value in zip(self._sel[row].tolist(),
+                self._ctr[row].tolist(), self._val[row].tolist()):
+            msr.writeMSR(cpu, ctr, 0)
             # Configure and enable de register
-            msr.writeMSR(cpu, addr, value)
-    
+            msr.writeMSR(cpu, sel, value)
+
     def readValues(self, cpu):
         """
         Return the hw counter value of the given CPU
@@ -105,11 +215,80 @@ class HWCounters:
                'HW Counter Alias' : value
             }
         """
-        dic = {}
-        for addr, _, i in self._getAddrAndValue(cpu):
-            # Read the hwCounter Value 
-            value = msr.readMSR(cpu, addr + 1)
-            # Save its value
-            dic[i] = value
-        return dic
-    
+        return dict(zip(self._names, self.readArray(cpu).tolist()))
+
+    def readArray(self, cpu, out=None):
+        """
+        Return the hw counter values of the given CPU
+
+        Parameters:
+            - cpu : cpu
+            - out : (optional) preallocated uint64 array (counters)
+
+        Return : uint64 array with one value per counter, the order is given
+            by names()
+        """
+        row = self._getRow(cpu)
+        if out is None:
+            out = np.empty(len(self._names), dtype=np.uint64)
+        return msr.readMany([cpu], self._ctr[row:row + 1],
+                out=out.reshape(1, -1)).reshape(-1)
+
+    def readCounter(self, cpu, idx):
+        """
+        Return the value of one hw counter of the given CPU
+
+        Parameters:
+            - cpu : cpu
+            - idx : column of the counter (see index())
+        """
+        return msr.readMSR(cpu, int(self._ctr[self._getRow(cpu), idx]))
+
+    def readMany(self, cpus, out=None):
+        """
+        Return the hw counter values of the given CPUs in a matrix
+
+        Parameters:
+            - cpus : list of cpus
+            - out : (optional) preallocated uint64 matrix (cpus x counters)
+
+        Return : uint64 matrix with one row per cpu and one column per
+            counter, the column order is given by names()
+        """
+        key, regs = self._regs
+        if key != cpus:
+            # Gather the counter addresses of the cpus (only when the list of
+            # cpus changes)
+            regs = self._ctr[[self._getRow(i) for i in cpus]]
+            self._regs = (list(cpus), regs)
+        return msr.readMany(cpus, regs, out=out)
+
+    def names(self):
+        """
+        Return the hw counter names in the column order of readMany
+        """
+        return self._names
+
+    def index(self, name):
+        """
+        Return the column of the given hw counter in the readMany matrix
+
+        Parameters:
+            - name : hw counter alias
+        """
+        return self._names.index(name)
+
+    def isL3(self):
+        """
+        Return a boolean array that flags the L3 (CCX) counters, the order is
+        given by names()
+        """
+        return self._l3
+
+    def isShared(self):
+        """
+        Return a boolean array that flags the L3 counters shared by all the
+        threads of a CCX (a reset in any thread resets them), the order is
+        given by names()
+        """
+        return self._shared
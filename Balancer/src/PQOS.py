@@ -2,17 +2,40 @@
 """
 Class to manage PQOS with mutual exclusion
 
+Every cpu has its own lock, so the allocation of one cpu does not wait for
+the monitoring of another one.
+
+A shadow copy of PQR_ASSOC of every cpu and of the L3 masks and the BW limits
+of every CCX (the mask and limit registers are shared by the cpus of a CCX)
+is kept, so writes that do not change the value of a register are skipped.
+Writes can also be staged in a transaction (begin/commit) and written at
+once grouped by cpu.
+
+The memory bandwidth monitors (MBM, total and local) are read selecting
+their event in QM_EVTSEL, their counters are only mbmWidth bits wide so the
+increments are accumulated in a 64 bits counter by software. A counter wraps
+every 2^mbmWidth * 64 bytes (1 GiB with 24 bits): the reads more apart than
+the time that a thread needs to transfer it at mbmPeak are discarded, as the
+counter could have wrapped more than once.
+
 NOTE: in this file cpu refers to physical threads.
 
 @AUTHOR: Navarro Torres, Agustín
 @EMAIL: agusnt (at) unizar (dot) es
 @DATE: 23/06/2020
 @UPDATES:
+    Shadow registers and batched commits
+    Per cpu locks
+    Memory bandwidth monitoring
+    Shadow of the CCX shared registers by CCX
 """
 import msr
 import time
 import sys
-from threading import Lock
+import timedLock
+import topology
+from threading import local
+from contextlib import contextmanager
 
 class PQOS:
     """
@@ -24,9 +47,46 @@ class PQOS:
     ###########################################################################
     # Class attribute
     ###########################################################################
-    _mutex = Lock()
+    _mutex = timedLock.TimedLock("pqos") # RMIDs and creation of cpu locks
+    _cpuMutex = {} # Lock of each cpu (cpu -> lock)
     _rmid_core = {}
     _rmid = 1
+    _shadow = {} # Last value written in each register, (cpu, reg) for the
+                 # registers of a cpu, ('ccx', ccx, reg) for the ones shared
+                 # by the CCX -> value
+    _ccxMutex = {} # Lock of the shared registers of each CCX
+    _topo = None
+    _staged = local() # Writes of the open transaction (by thread)
+    _stats = {} # Writes done and elided by cpu (cpu -> dictionary)
+    _commits = 0
+    _mbmWidth = 24 # Bits of the MBM counters
+    _mbm = {} # MBM counters, (cpu, event) -> [last value read, bytes,
+              # time of the read]
+    _mbmPeak = None # Peak bandwidth (bytes/s) of a thread
+
+    # QM_EVTSEL events
+    EVENT_OCCUPANCY = 1
+    EVENT_MBM_TOTAL = 2
+    EVENT_MBM_LOCAL = 3
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, mbmWidth=24, topo=None, mbmPeak=8):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - mbmWidth : width (bits) of the MBM counters, 24 is the
+                    architectural minimum (AMD Rome reports 44)
+            - topo : (optional) topology.Topology of the machine, by default
+                    it is read from sysfs
+            - mbmPeak : peak memory bandwidth (GiB/s) of a thread, used to
+                    detect the MBM reads that can miss a wrap
+        """
+        self._mbmWidth = mbmWidth
+        self._mbmPeak = mbmPeak * (1 << 30)
+        self._topo = topo if topo is not None else topology.Topology()
 
     ###########################################################################
     # Private functions 
@@ -42,14 +102,203 @@ class PQOS:
             # We know this core, we return its associated RMID
             return self._rmid_core[cpu]
 
-        self._rmid_core[cpu] = self._rmid
-        self._rmid += 1
+        with(self._mutex):
+            if cpu not in self._rmid_core:
+                self._rmid_core[cpu] = self._rmid
+                self._rmid += 1
 
         return self._rmid_core[cpu]
 
+    def _lock(self, cpu):
+        """
+        Return the lock of the given cpu (it is created the first time)
+
+        Parameters:
+            - cpu : cpu
+        """
+        if cpu not in self._cpuMutex:
+            with(self._mutex):
+                if cpu not in self._cpuMutex:
+                    self._stats[cpu] = {'writes': 0, 'elided': 0}
+                    self._cpuMutex[cpu] = timedLock.TimedLock("pqos cpu")
+        return self._cpuMutex[cpu]
+
+    def _key(self, cpu, reg):
+        """
+        Return the key of a register in the shadow copy and the lock of the
+        CCX if the register is shared by the CCX (None otherwise)
+
+        Parameters:
+            - cpu : cpu
+            - reg : msr register
+        """
+        if 0xC90 <= reg < 0xCA0 or 0xC0000200 <= reg < 0xC0000210:
+            # L3 masks and BW limits
+            ccx = self._topo.ccx(cpu)
+            if ccx not in self._ccxMutex:
+                with(self._mutex):
+                    if ccx not in self._ccxMutex:
+                        self._ccxMutex[ccx] = timedLock.TimedLock("pqos ccx")
+            return ('ccx', ccx, reg), self._ccxMutex[ccx]
+        return (cpu, reg), None
+
+    def _write(self, cpu, reg, value):
+        """
+        Write a shadowed register. If a transaction is open the write is
+        staged until commit, otherwise it is written only if the value
+        changes. The lock of the cpu must be held by the caller.
+
+        Parameters:
+            - cpu : cpu
+            - reg : msr register
+            - value : value to write
+        """
+        staged = getattr(self._staged, 'writes', None)
+        if staged is not None:
+            if cpu not in staged:
+                staged[cpu] = {}
+            if reg in staged[cpu]:
+                # The previous staged write will never be done
+                self._stats[cpu]['elided'] += 1
+            staged[cpu][reg] = value
+            return
+
+        key, lock = self._key(cpu, reg)
+        if lock is not None:
+            lock.acquire()
+        try:
+            if self._shadow.get(key) == value:
+                self._stats[cpu]['elided'] += 1
+            else:
+                msr.writeMSR(cpu, reg, value)
+                self._shadow[key] = value
+                self._stats[cpu]['writes'] += 1
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def _select(self, cpu, event):
+        """
+        Associate the RMID of the cpu and select the event to read in QM_CTR.
+        The lock of the cpu must be held by the caller.
+
+        Parameters:
+            - cpu : cpu
+            - event : QM_EVTSEL event
+        """
+        # MSR Registers
+        PQR_ASSOC = 0xC8F
+        QM_EVTSEL = 0xC8D
+
+        rmid = self._getRmid(cpu)
+        # Set event and mask
+        event = (rmid << 32) + event
+        aux = self._read(cpu, PQR_ASSOC)
+        aux &= (~((1 << 9) - 1))
+        rmid |= aux
+
+        # Associate RMID with the processor
+        self._write(cpu, PQR_ASSOC, rmid)
+        # Associate the event to measure
+        msr.writeMSR(cpu, QM_EVTSEL, event)
+
+    def _read(self, cpu, reg):
+        """
+        Read a shadowed register (staged value, shadow copy or the register).
+        The lock of the cpu must be held by the caller.
+
+        Parameters:
+            - cpu : cpu
+            - reg : msr register
+        """
+        staged = getattr(self._staged, 'writes', None)
+        if staged is not None and reg in staged.get(cpu, {}):
+            return staged[cpu][reg]
+        key, _ = self._key(cpu, reg)
+        if key not in self._shadow:
+            self._shadow[key] = msr.readMSR(cpu, reg)
+        return self._shadow[key]
+
     ###########################################################################
     # API functions
     ###########################################################################
+    def begin(self):
+        """
+        Open a transaction, the next writes of this thread are staged until
+        commit is called
+        """
+        if getattr(self._staged, 'writes', None) is None:
+            self._staged.writes = {}
+
+    def commit(self):
+        """
+        Write the staged registers (only the ones that change) grouped by cpu
+        and close the transaction
+        """
+        staged = getattr(self._staged, 'writes', None)
+        self._staged.writes = None
+        if staged is None:
+            return
+
+        for cpu in staged:
+            with(self._lock(cpu)):
+                for reg in staged[cpu]:
+                    self._write(cpu, reg, staged[cpu][reg])
+        with(self._mutex):
+            self._commits += 1
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager of a transaction (begin and commit), the transaction
+        is committed even if the block raises an exception so it is never
+        left open in the thread
+        """
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def close(self):
+        """
+        Nothing to release, the MSR devices are closed by msr.close (same API
+        than resctrl.Resctrl)
+        """
+        return
+
+    def invalidate(self, cpu=None):
+        """
+        Forget the shadow copy of the registers (e.g. if another program
+        modifies them)
+
+        Parameters:
+            - cpu : cpu to forget (and the registers shared by its CCX), None
+                    to forget all of them
+        """
+        ccx = None if cpu is None else self._topo.ccx(cpu)
+        for key in list(self._shadow):
+            if len(key) == 3:
+                # Shared by a CCX
+                if cpu is None or key[1] == ccx:
+                    with(self._ccxMutex[key[1]]):
+                        self._shadow.pop(key, None)
+            elif cpu is None or key[0] == cpu:
+                with(self._lock(key[0])):
+                    self._shadow.pop(key, None)
+
+    def stats(self):
+        """
+        Return a dictionary with the number of register writes done, elided
+        (skipped because the value does not change) and transactions
+        committed
+        """
+        stats = {'writes': 0, 'elided': 0, 'commits': self._commits}
+        for cpu in list(self._stats):
+            stats['writes'] += self._stats[cpu]['writes']
+            stats['elided'] += self._stats[cpu]['elided']
+        return stats
+
     def l3Occupancy(self, on, cpu):
         """
         Set/Unset the L3 occupancy monitor.
@@ -59,23 +308,12 @@ class PQOS:
             cpu -> cpu
         """
     
-        with(self._mutex):
-            rmid = self._getRmid(cpu)
+        with(self._lock(cpu)):
             # MSR Registers
-            PQR_ASSOC = 0xC8F
             QM_EVTSEL = 0xC8D
     
             if on:
-                # Set event and mask
-                event = (rmid << 32) + 1
-                aux = msr.readMSR(cpu, PQR_ASSOC)
-                aux &= (~((1 << 9) - 1))
-                rmid |= aux
-    
-                # Associate RMID with the processor
-                msr.writeMSR(cpu, PQR_ASSOC, rmid)
-                # Associate the event to measure
-                msr.writeMSR(cpu, QM_EVTSEL, event)
+                self._select(cpu, self.EVENT_OCCUPANCY)
             else:
                 # Disable monitor
     
@@ -90,16 +328,57 @@ class PQOS:
             - cpu : cpu
     
         Return :
-            - Occupancy in bytes
+            - Occupancy in bytes (0 if the monitor has no data yet)
         """
-        with(self._mutex):
+        with(self._lock(cpu)):
             # L3 Conversion factor
             factor = 64
     
             # MSR Registers
             QM_CTR = 0xC8E
-            value = msr.readMSR(cpu, 0xC8E) * factor 
-        return value
+            value = msr.readMSR(cpu, 0xC8E)
+        if value >> 62:
+            # Error (bit 63) or data unavailable (bit 62)
+            return 0
+        return value * factor
+
+    def mbmRead(self, cpu, local=False):
+        """
+        Read the memory bandwidth counter. It selects the MBM event, so the
+        L3 occupancy monitor of the cpu must be enabled again to read it.
+
+        Parameters :
+            - cpu : cpu
+            - local : read the local bandwidth instead of the total
+
+        Return :
+            - Bytes transferred since the first read, None if the value is
+              not available or the previous read is too old to know the
+              wraps of the counter (the bytes of that interval are lost)
+        """
+        event = self.EVENT_MBM_LOCAL if local else self.EVENT_MBM_TOTAL
+        with(self._lock(cpu)):
+            # MSR Registers
+            QM_CTR = 0xC8E
+            self._select(cpu, event)
+            value = msr.readMSR(cpu, QM_CTR)
+
+            t = time.monotonic()
+            counter = self._mbm.setdefault((cpu, event), [None, 0, t])
+            if value >> 62:
+                # Error (bit 63) or data unavailable (bit 62)
+                return None
+            value &= (1 << self._mbmWidth) - 1
+            last, elapsed = counter[0], t - counter[2]
+            counter[0], counter[2] = value, t
+            if last is None:
+                return counter[1]
+            if elapsed * self._mbmPeak >= (1 << self._mbmWidth) * 64:
+                # It could have wrapped more than once
+                return None
+            # Increment modulo the width of the counter (64 bytes units)
+            counter[1] += ((value - last) % (1 << self._mbmWidth)) * 64
+            return counter[1]
 
     def l3Allocation(self, on, cos, mask, cpu):
         """
@@ -112,24 +391,23 @@ class PQOS:
             - cpu : cpu
         """
 
-        with(self._mutex):
-            rmid = self._getRmid(cpu)
+        rmid = self._getRmid(cpu)
+        with(self._lock(cpu)):
             # MSR Registers
             PQR_ASSOC = 0xC8F
             PQR_MASK = 0xC90 + cos
             PQS_CFG = 0xC81
-            msr.writeMSR(cpu, PQR_ASSOC, 0x0)
     
             if on:
                 # Cos and Mask to associate with the processor
                 value = (cos << 32) + rmid
-                msr.writeMSR(cpu, PQR_ASSOC, value)
+                self._write(cpu, PQR_ASSOC, value)
                 # Associate Mask
-                msr.writeMSR(cpu, PQR_MASK, mask)
+                self._write(cpu, PQR_MASK, mask)
             else:
                 # Reset MSR Registers
-                msr.writeMSR(cpu, PQR_ASSOC, rmid)
-                msr.writeMSR(cpu, PQR_MASK, 0xFFFF)
+                self._write(cpu, PQR_ASSOC, rmid)
+                self._write(cpu, PQR_MASK, 0xFFFF)
 
     def bwAllocation(self, on, cos, mask, cpu):
         """
@@ -141,8 +419,8 @@ class PQOS:
             - mask : max amount of bw to the given core
             - cpu : cpu to enforce the allocation
         """
-        with(self._mutex):
-            rmid = self._getRmid(cpu)
+        rmid = self._getRmid(cpu)
+        with(self._lock(cpu)):
             # MSR Registers
             PQR_ASSOC = 0xC8F
             PQR_MASK = 0xC0000200 + cos
@@ -152,12 +430,12 @@ class PQOS:
                 value = (cos << 32) + rmid
 
                 # Associate RMID with the processor
-                msr.writeMSR(cpu, PQR_ASSOC, value)
-                msr.writeMSR(cpu, PQR_MASK, mask)
+                self._write(cpu, PQR_ASSOC, value)
+                self._write(cpu, PQR_MASK, mask)
             else:
                 # Reset MSR Registers
-                msr.writeMSR(cpu, PQR_ASSOC, rmid)
-                msr.writeMSR(cpu, PQR_MASK, 2048)
+                self._write(cpu, PQR_ASSOC, rmid)
+                self._write(cpu, PQR_MASK, 2048)
 
     def reset(self, cpu):
         """
@@ -166,10 +444,10 @@ class PQOS:
         Parameters :
             - cpu : cpu
         """
-        with(self._mutex):
+        with(self._lock(cpu)):
             PQR_ASSOC = 0xC8F
             QM_EVTSEL = 0xC8D
-            msr.writeMSR(cpu, PQR_ASSOC, 0)
+            self._write(cpu, PQR_ASSOC, 0)
             msr.writeMSR(cpu, QM_EVTSEL, 0)
 
         # Set new enforcement
@@ -11,8 +11,10 @@ Class for the algorithm execution
 # Local imports
 import HWCounters
 import rollingAVG
+import decisionTrace
 import utilities
 import process
+import missCurves
 
 # General imports
 import threading
@@ -38,17 +40,38 @@ class Algorithm:
     _limit_core = {} # None = 0, LLC = 1, BW = 2
     _mask = {}
     _limit_bw = {}
-    CCX_SIZE = 4
+    _topo = None
+    _ccxOf = None # CCX of each core (core -> ccx)
+    _ccxLimit = None # Max. number of cores with LLC limit of each CCX
+    WAYS = 16 # L3 ways
+    RAVG_KEYS = ('hpmo', 'acy', 'lat', 'bw', 'cpi') # Metrics with rolling
+                                                    # average
 
     def __init__(self, alg, parameters):
         self._alg = alg
         self._parameterCall = {}
         self._parameterCall['core'] = parameters['core']
+        # Decision trace (optional)
+        self._parameterCall['trace'] = parameters.get('trace', None)
         self._prc = parameters['prc']
-
-        for i in range(0, max(parameters['core']), 4):
-            # Initialize data structure
-            self._cores_with_limit.append(0)
+        self._topo = self._prc.topology()
+        # Data that must be keep between functions call, cmask has the masks
+        # applied to each core (llc mask, bw mask, cos)
+        self._interCall = {}
+        self._interCall['cmask'] = {}
+        # Phase change or latency spike in the last epoch
+        self._interCall['urgent'] = False
+
+        # Initialize data structure, cores with LLC limit of each CCX (at
+        # least one core of the CCX is never limited)
+        self._cores_with_limit = {}
+        self._ccxOf = {}
+        self._ccxLimit = {}
+        for ccx, cores in self._topo.group(parameters['core'], 'ccx'):
+            self._cores_with_limit[ccx] = 0
+            self._ccxLimit[ccx] = len(cores) - 1
+            for core in cores:
+                self._ccxOf[core] = ccx
 
         if (alg == "llc") or (alg == "llcbw") or (alg == "bw"):
             self._parameterCall['limit'] = parameters['limit']
@@ -57,43 +80,88 @@ class Algorithm:
             self._parameterCall['bw_limit'] = parameters['bw_limit']
             self._parameterCall['lat_limit'] = parameters['lat_limit']
             self._parameterCall['hpmo_limit'] = parameters['hpmo_limit']
-            # Data that must be keep between functions call
-            self._interCall = {}
-            self._interCall['hwc'] = {}
-            self._interCall['cmask'] = {}
+            # Latency of an epoch above lat_spike times its rolling average
+            # is a spike
+            self._parameterCall['lat_spike'] = parameters.get('lat_spike', 1.5)
+            # Rolling averages of all the cores (cores x RAVG_KEYS)
+            self._interCall['hwc'] = rollingAVG.BatchRollingAVG(\
+                    (len(self._parameterCall['core']), len(self.RAVG_KEYS)),
+                    self._parameterCall['rolling'])
+            # Last MBM bandwidth of every core (NaN while the core has not
+            # MBM reads, its bandwidth is the L3 misses proxy meanwhile)
+            self._interCall['mbm'] = np.full(len(self._parameterCall['core']),
+                    np.nan)
+            # LLC allocation: toggle (all the ways or only one) or graded
+            # (steps of llc_step ways, see _grade_llc)
+            self._parameterCall['llc_alloc'] = parameters.get('llc_alloc',
+                    'toggle')
+            self._parameterCall['llc_layout'] = parameters.get('llc_layout',
+                    'partition')
+            if self._parameterCall['llc_alloc'] not in ('toggle', 'graded'):
+                raise ValueError("Unknown LLC allocation {}".format(
+                    self._parameterCall['llc_alloc']))
+            if self._parameterCall['llc_layout'] not in ('partition',
+                    'overlap'):
+                raise ValueError("Unknown LLC layout {}".format(
+                    self._parameterCall['llc_layout']))
+            self._parameterCall['llc_step'] = parameters.get('llc_step', 2)
+            self._parameterCall['llc_hyst'] = parameters.get('llc_hyst', 2)
+            self._parameterCall['llc_settle'] = parameters.get('llc_settle', 3)
+            self._parameterCall['llc_ipc_loss'] = parameters.get(
+                    'llc_ipc_loss', .05)
+            self._parameterCall['llc_hold'] = parameters.get('llc_hold', 10)
+            self._interCall['grade'] = {}
+            # CCXs whose partition does not fit (they use overlap)
+            self._interCall['overlap'] = set()
+            for core in self._parameterCall['core']:
+                self._interCall['cmask'][core] = (0xFFFF, 2048,
+                        self._topo.cos(core))
+                self._limit_core[core] = (False, False)
+                self._interCall['grade'][core] = self._grade_reset()
+        elif alg == "model":
+            # Curves of the Characterization sweeps, the ways of each CCX are
+            # split every epoch (see _model)
+            self._interCall['curves'] = missCurves.MissCurves(
+                    parameters['profiles'], ways=self.WAYS,
+                    triads=parameters.get('profile_triads', 0))
+            if len(self._interCall['curves'].names()) == 0:
+                sys.stderr.write("No profiles in {}, the jobs are fitted to "
+                        "nothing\n".format(parameters['profiles']))
+                sys.stderr.flush()
             for core in self._parameterCall['core']:
-                # Rolling average functions
-                self._interCall['hwc'][core] = {
-                        'hpmo': rollingAVG.RollingAVG(\
-                            self._parameterCall['rolling']),
-                        'acy': rollingAVG.RollingAVG(\
-                                self._parameterCall['rolling']),
-                        'lat': rollingAVG.RollingAVG(\
-                                self._parameterCall['rolling']),
-                        'bw': rollingAVG.RollingAVG(\
-                                self._parameterCall['rolling'])
-                    }
-                self._interCall['cmask'][core] = (0xFFFF, 2048, (core % self.CCX_SIZE) +1)
+                self._interCall['cmask'][core] = (0xFFFF, 2048,
+                        self._topo.cos(core))
                 self._limit_core[core] = (False, False)
         elif alg == "static":
-            mask = [(0xF000, 13, 1), (0x0F00, 13, 2), (0x00F0, 13, 3), (0x000F,
-                13, 4)]
-            for core in range(0, len(self._parameterCall['core'])):
-                mask_llc, mask_bw, cos = mask[core % self.CCX_SIZE]
-                self._prc.pqos().l3Allocation(True, cos, mask_llc, core)
-                self._prc.pqos().bwAllocation(True, cos, mask_bw, core)
+            self._prc.pqos().begin()
+            # Split the ways of each CCX among its cores (e.g. 0xF000, 0x0F00,
+            # 0x00F0 and 0x000F with 4 cores)
+            for _, cores in self._topo.group(self._parameterCall['core']):
+                ways = self.WAYS // len(cores)
+                for idx, core in enumerate(cores):
+                    mask_llc = ((1 << ways) - 1) << \
+                            (self.WAYS - ways * (idx + 1))
+                    cos = self._topo.cos(core)
+                    self._prc.pqos().l3Allocation(True, cos, mask_llc, core)
+                    self._prc.pqos().bwAllocation(True, cos, 13, core)
+                    self._interCall['cmask'][core] = (mask_llc, 13, cos)
+            self._prc.pqos().commit()
         elif alg == "ucp":
+            self._prc.pqos().begin()
             with open(parameters['allocation']) as f:
                 raw = f.read().split('\n')
                 mov = 0
+                last = None
                 for i in raw[:-1]:
                     core = int(i.split(' ')[0])
                     ways = int(i.split(' ')[1])
 
-                    if core % self.CCX_SIZE == 0:
+                    if self._topo.ccx(core) != last:
+                        # First core of a CCX
                         mov = 0
+                        last = self._topo.ccx(core)
 
-                    cos = (core % self.CCX_SIZE) + 1
+                    cos = self._topo.cos(core)
                     # Add 1 to the mask
                     mask = 0
                     for i in range(0, ways):
@@ -105,6 +173,8 @@ class Algorithm:
 
                     # Apply mask
                     self._prc.pqos().l3Allocation(True, cos, mask, core)
+                    self._interCall['cmask'][core] = (mask, 2048, cos)
+            self._prc.pqos().commit()
 
         if (alg == "llcbw"):
             self._parameterCall['lat_limit'] = parameters['lat_limit']
@@ -121,63 +191,90 @@ class Algorithm:
         '''
         cores = self._parameterCall['core']
         hwc = self._interCall['hwc']
+        iacy = self.RAVG_KEYS.index('acy')
+
+        # Row of the measures of each core, -1 if the core was not measured
+        # (only computed when the measured cores change)
+        measured, rows = self._interCall.get('rows', (None, None))
+        if measured != hwcg.cores():
+            measured = set(hwcg.cores())
+            rows = np.array([hwcg.row(core) if core in measured else -1 \
+                    for core in cores])
+            self._interCall['rows'] = (list(hwcg.cores()), rows)
+        values = np.full((len(cores), len(self.RAVG_KEYS)), np.nan)
+        for i, key in enumerate(self.RAVG_KEYS):
+            values[rows >= 0, i] = hwcg[key][rows[rows >= 0]]
+
+        # Bandwidth: measured DRAM traffic (MBM), the L3 misses are only a
+        # proxy for the cores without MBM reads. The two sources are never
+        # mixed in a window: a core moves to MBM with a new window, and an
+        # epoch without MBM read (e.g. it could miss a wrap) repeats the last
+        # MBM value of the core
+        ibw = self.RAVG_KEYS.index('bw')
+        last = self._interCall['mbm']
+        mbm = np.full(len(cores), np.nan)
+        mbm[rows >= 0] = hwcg['mbm'][rows[rows >= 0]]
+        read = ~np.isnan(mbm)
+        first = read & np.isnan(last)
+        if np.any(first):
+            mask = np.zeros(hwc.nElements().shape, dtype=bool)
+            mask[first, ibw] = True
+            hwc.reset(mask)
+        last[read] = mbm[read]
+        # (only the cores measured in this epoch)
+        values[:, ibw] = np.where(np.isnan(last) | np.isnan(values[:, ibw]),
+                values[:, ibw], last)
+
+        # The epochs can have different lengths, every measure is weighted
+        # by its elapsed time
+        weights = None
+        if hwcg.elapsed() is not None:
+            weights = np.zeros(len(cores))
+            weights[rows >= 0] = hwcg.elapsed()[rows[rows >= 0]]
+            weights = weights[:, np.newaxis]
+
+        # Get average access (before adding the new measures)
+        full = hwc.full()
+        avg = hwc.avg()
         access = {}
+        for i, core in enumerate(cores):
+            access[core] = float(avg[i, iacy]) if full[i, iacy] else None
+
+        # Latency spikes against the average before this epoch
+        ilat = self.RAVG_KEYS.index('lat')
+        with np.errstate(invalid='ignore'):
+            self._interCall['spike'] = bool(np.any(full[:, ilat] &
+                (values[:, ilat] > self._parameterCall['lat_spike'] *
+                    avg[:, ilat])))
+
+        # If the value is none or 0, the rolling average is reset
+        hwc.update(values, valid=~np.isnan(values) & (values != 0),
+                weights=weights)
+
+        # Calculate rolling average
+        full = hwc.full()
+        avg = hwc.avg()
         ravg = {}
+        for j, key in enumerate(self.RAVG_KEYS):
+            ravg[key] = {}
+            for i, core in enumerate(cores):
+                ravg[key][core] = float(avg[i, j]) if full[i, j] else None
 
-        # Get hardware counters measures
-        for core in hwcg:
-
-            # Get average acess
-            if hwc[core]['acy'].nElements() == hwc[core]['acy'].max():
-                access[core] = hwc[core]['acy'].avg()
-            else:
-                access[core] = None 
-
-            for key in hwc[core]:
-                # If the value is none, we reset it
-                value = 0 if hwcg[core][key] == None else hwcg[core][key]
-    
-                if value != 0:
-                    # Add element the rolling average
-                    hwc[core][key].add(value)
-                else:
-                    # Reset rolling average
-                    hwc[core][key] = rollingAVG.RollingAVG(\
-                            self._parameterCall['rolling'])
-    
-                # Set rolling average structure
-                if key not in ravg:
-                    ravg[key] = {}
-                # Remove older data
-                if hwc[core][key].nElements() == hwc[core][key].max():
-                    # Calculate rolling average
-                    ravg[key][core] = hwc[core][key].avg()
-                else:
-                    ravg[key][core] = None
-    
         return ravg, access
 
-    def _getCCX(self, ccx=4):
+    def _getCCX(self):
         """
-        Return one ccx ever time is called
-    
-        Parameters :
-            - cores : list of the cores
-            - ccx : ccx size 
+        Return one ccx ever time is called (id and managed cores)
         """
-        for i in range(0, len(self._parameterCall['core']), ccx):
-            yield i, [i + j for j in range(0, ccx)]
+        for i, cores in self._topo.group(self._parameterCall['core'], 'ccx'):
+            yield i, cores
 
-    def _getCCD(self, ccd=8):
+    def _getCCD(self):
         """
-        Return one ccd ever time is called
-    
-        Parameters :
-            - cores : list of the cores
-            - ccd : ccd size 
+        Return one ccd ever time is called (id and managed cores)
         """
-        for i in range(0, len(self._parameterCall['core']), ccd):
-            yield i, [i + j for j in range(0, ccd)]
+        for i, cores in self._topo.group(self._parameterCall['core'], 'ccd'):
+            yield i, cores
 
     def _phase_change(self, new, old, core, bw=False):
         """
@@ -197,7 +294,7 @@ class Algorithm:
                 or \
                 ((new * self._parameterCall['limit']) < old):
 
-            cos = (core % 4) + 1
+            cos = self._topo.cos(core)
             llc_mask = 0xFFFF
             bw_mask = 2048
     
@@ -207,8 +304,10 @@ class Algorithm:
             self._interCall['cmask'][core] = (llc_mask, bw_mask, cos)
 
             self._limit_core[core] = (False, False)
-            if self._cores_with_limit[int(core / self.CCX_SIZE)] > 0:
-                self._cores_with_limit[int(core / self.CCX_SIZE)] -= 1
+            if self._cores_with_limit[self._ccxOf[core]] > 0:
+                self._cores_with_limit[self._ccxOf[core]] -= 1
+            if 'grade' in self._interCall:
+                self._interCall['grade'][core] = self._grade_reset()
 
             # Remove limit bw
             self._limit_bw[core] = 2.5
@@ -232,7 +331,8 @@ class Algorithm:
         llc_mask, bw_mask, cos = self._interCall['cmask'][core]
 
         if hpmo < self._parameterCall['hpmo_limit']:
-            if self._cores_with_limit[int(core / self.CCX_SIZE)] == 3:
+            if self._cores_with_limit[self._ccxOf[core]] >= \
+                    self._ccxLimit[self._ccxOf[core]]:
                 return
 
             # Decrease cache
@@ -240,7 +340,7 @@ class Algorithm:
                 llc_mask = 0x1
                 self._prc.pqos().l3Allocation(True, cos, llc_mask, core)
                 self._prc.pqos().bwAllocation(True, cos, bw_mask, core)
-                self._cores_with_limit[int(core / self.CCX_SIZE)] += 1
+                self._cores_with_limit[self._ccxOf[core]] += 1
                 limited = True
 
                 # Measure times that the core is limited
@@ -251,7 +351,7 @@ class Algorithm:
                 llc_mask = 0xFFFF
                 self._prc.pqos().l3Allocation(True, cos, llc_mask, core)
                 self._prc.pqos().bwAllocation(True, cos, bw_mask, core)
-                self._cores_with_limit[int(core / self.CCX_SIZE)] -= 1
+                self._cores_with_limit[self._ccxOf[core]] -= 1
 
                 # Measure times that the core is limited
                 _, lbw = self._limit_core[core]
@@ -260,6 +360,150 @@ class Algorithm:
         self._interCall['cmask'][core] = (llc_mask, bw_mask, cos)
         return limited
 
+    def _grade_reset(self):
+        """
+        Return the state of the graded LLC allocation of a core without
+        constraint
+        """
+        # ways : target ways, vote : consecutive epochs asking for less (< 0)
+        # or more (> 0) ways, age : epochs since the last step, hold : epochs
+        # without steps down, ipc0 : IPC before the last step down, ipc and n
+        # : sum and number of IPC measures since the last step
+        return {'ways': self.WAYS, 'vote': 0, 'age': 0, 'hold': 0,
+                'ipc0': None, 'ipc': 0., 'n': 0}
+
+    def _grade_llc(self, core, hpmo, cpi, epoch_cpi):
+        """
+        Walk the target ways of a core one step (llc_step ways) down when its
+        hpmo is below hpmo_limit and one step up when it is above hpmo_max.
+        A step needs llc_hyst consecutive epochs asking for it and llc_settle
+        epochs since the last step. A step down whose IPC (averaged since the
+        step) is llc_ipc_loss below the IPC before it is undone and no step
+        down is done in the next llc_hold epochs. The masks are applied by
+        _layout_llc.
+
+        Parameters:
+            - core: core to restrict
+            - hpmo: core hmpo value (rolling average)
+            - cpi: core CPI (rolling average), None if unknown
+            - epoch_cpi: core CPI of the last epoch, None if unknown
+
+        Return: true if the target ways of the core were decreased
+        """
+        g = self._interCall['grade'][core]
+        step = self._parameterCall['llc_step']
+        g['age'] += 1
+        if epoch_cpi:
+            g['ipc'] += 1 / epoch_cpi
+            g['n'] += 1
+        if g['age'] < self._parameterCall['llc_settle']:
+            return False
+
+        if g['ipc0'] is not None:
+            # Feedback of the last step down
+            ipc0, g['ipc0'] = g['ipc0'], None
+            if g['n'] > 0 and g['ipc'] / g['n'] < \
+                    (1 - self._parameterCall['llc_ipc_loss']) * ipc0:
+                g['ways'] = min(g['ways'] + step, self.WAYS)
+                g['hold'] = self._parameterCall['llc_hold']
+                g['vote'], g['age'], g['ipc'], g['n'] = 0, 0, 0., 0
+                return False
+
+        if g['hold'] > 0:
+            g['hold'] -= 1
+        if hpmo < self._parameterCall['hpmo_limit'] and g['hold'] == 0:
+            g['vote'] = min(g['vote'], 0) - 1
+        elif hpmo >= self._parameterCall['hpmo_max']:
+            g['vote'] = max(g['vote'], 0) + 1
+        else:
+            g['vote'] = 0
+
+        down = False
+        if g['vote'] <= -self._parameterCall['llc_hyst'] and g['ways'] > 1:
+            g['ways'] = max(g['ways'] - step, 1)
+            g['ipc0'] = 1 / cpi if cpi else None
+            down = True
+        elif g['vote'] >= self._parameterCall['llc_hyst'] and \
+                g['ways'] < self.WAYS:
+            g['ways'] = min(g['ways'] + step, self.WAYS)
+        else:
+            return False
+        g['vote'], g['age'], g['ipc'], g['n'] = 0, 0, 0., 0
+        return down
+
+    def _layout_llc(self, cores, hpmo):
+        """
+        Apply the target ways of the cores of a CCX as contiguous masks.
+        The constrained cores (less than WAYS target ways) get the low ways
+        and the rest of the cores share the high ways:
+            * partition : the constrained cores do not overlap and at least
+                one way is left to the rest. When the targets do not fit, the
+                cores with the lowest hpmo (marginal utility) lose ways first.
+                Without unconstrained cores, the free ways go to the cores
+                with the highest hpmo.
+            * overlap : every constrained core gets its target ways, the masks
+                are spread over all the ways and can overlap. The rest of the
+                cores keep all the ways.
+        With partition, when there are more constrained cores than ways to
+        give them (one way each) the CCX falls back to overlap; a warning is
+        written when a CCX enters and leaves the fallback.
+
+        Parameters:
+            - cores : cores of the CCX
+            - hpmo : rolling average of the hpmo of each core
+        """
+        grade = self._interCall['grade']
+        util = lambda i: hpmo.get(i) or 0
+        limited = sorted([i for i in cores if grade[i]['ways'] < self.WAYS],
+                key=util)
+        free = [i for i in cores if grade[i]['ways'] >= self.WAYS]
+        full = (1 << self.WAYS) - 1
+        width = {i: grade[i]['ways'] for i in limited}
+        avail = self.WAYS - (len(free) > 0)
+        masks = {}
+
+        partition = self._parameterCall['llc_layout'] == 'partition'
+        ccx = self._topo.ccx(cores[0])
+        if partition and (len(limited) > avail) != \
+                (ccx in self._interCall['overlap']):
+            if len(limited) > avail:
+                self._interCall['overlap'].add(ccx)
+                sys.stderr.write("CCX {}: {} constrained cores do not fit in "
+                        "{} ways, overlapping masks\n".format(ccx,
+                            len(limited), avail))
+            else:
+                self._interCall['overlap'].discard(ccx)
+                sys.stderr.write("CCX {}: partition again\n".format(ccx))
+            sys.stderr.flush()
+
+        if partition and len(limited) <= avail:
+            while sum(width.values()) > avail:
+                width[min([i for i in limited if width[i] > 1], key=util)] -= 1
+            if len(free) == 0 and len(limited) > 0:
+                width[limited[-1]] += self.WAYS - sum(width.values())
+            pos = 0
+            for i in limited:
+                masks[i] = ((1 << width[i]) - 1) << pos
+                pos += width[i]
+            for i in free:
+                masks[i] = full & ~((1 << pos) - 1)
+        else:
+            for idx, i in enumerate(limited):
+                pos = (idx * (self.WAYS - width[i])) // \
+                        max(len(limited) - 1, 1)
+                masks[i] = ((1 << width[i]) - 1) << pos
+            for i in free:
+                masks[i] = full
+
+        for i in cores:
+            llc_mask, bw_mask, cos = self._interCall['cmask'][i]
+            if masks[i] != llc_mask:
+                self._prc.pqos().l3Allocation(True, cos, masks[i], i)
+                self._prc.pqos().bwAllocation(True, cos, bw_mask, i)
+                self._interCall['cmask'][i] = (masks[i], bw_mask, cos)
+            _, lbw = self._limit_core[i]
+            self._limit_core[i] = (grade[i]['ways'] < self.WAYS, lbw)
+
     def _restrict_bw(self, core, lat, read_bw):
         """
         Limit BW
@@ -268,7 +512,8 @@ class Algorithm:
         Parameters:
             - core: core to restrict
             - lat: CCX latency value
-            - read_bw : read bw used by the core
+            - read_bw : bw used by the core (DRAM traffic measured by MBM,
+                    or L3 misses if MBM is not available)
 
         Return: true if the bw is limited
         """
@@ -297,6 +542,41 @@ class Algorithm:
             self._interCall['cmask'][core] = (mask_llc, mask_bw, cos)
         return True
     
+    def _l3Focus(self, data, hpmo):
+        """
+        Ask for more L3 occupancy samples of the cores whose LLC decision
+        could change within the confidence interval of their occupancy
+
+        Parameters:
+            - data : data get from the hardware counters
+            - hpmo : rolling average of the hpmo of each core
+        """
+        focus = []
+        for core in hpmo:
+            if hpmo[core] == None or core not in self._interCall['cmask']:
+                continue
+            llc_mask, _, _ = self._interCall['cmask'][core]
+            ways = bin(llc_mask).count('1')
+            if self._parameterCall['llc_alloc'] == 'graded':
+                ways = self._interCall['grade'][core]['ways']
+            # Thresholds of the next decisions (less or more ways)
+            limits = []
+            if ways > 1:
+                limits.append(self._parameterCall['hpmo_limit'])
+            if ways < self.WAYS:
+                limits.append(self._parameterCall['hpmo_max'])
+            oc, oci = data.get(core, 'oc'), data.get(core, 'oci')
+            if oc == None or oci == None:
+                # Unknown interval
+                focus.append(core)
+                continue
+            # hpmo is inversely proportional to the occupancy
+            rel = oci / oc
+            if any([hpmo[core] * (1 - rel) <= i <= hpmo[core] * (1 + rel) \
+                    for i in limits]):
+                focus.append(core)
+        self._prc.l3Focus(focus)
+
     def _balancer(self, data, bw=False, llc=True):
         """
         Algorithm that manage only llc
@@ -308,20 +588,31 @@ class Algorithm:
         """
         phase = {}
         ravg, access = self._rollingAVG_update(data)
+        graded = self._parameterCall['llc_alloc'] == 'graded'
         for _, cores in self._getCCD():
             limit = False
             for core in cores:
                 phase[core] = False
                 # Iterate over all core of this CCX
                 if access[core] != None:
-                    phase[core] = self._phase_change(data[core]['acy'], \
+                    phase[core] = self._phase_change(data.get(core, 'acy'), \
                             access[core], core, bw=bw)
                 
                 if llc:
                     if ravg['hpmo'][core] != None and not phase[core]:
                         # Restrict LLC core
-                        limit = self._restrict_llc(core, ravg['hpmo'][core], \
-                                bw=bw)
+                        if graded:
+                            limit = self._grade_llc(core, ravg['hpmo'][core],
+                                    ravg['cpi'][core],
+                                    data.get(core, 'cpi')) or limit
+                        else:
+                            limit = self._restrict_llc(core, \
+                                    ravg['hpmo'][core], bw=bw)
+
+            if llc and graded:
+                # Masks of the new targets
+                for _, ccx in self._topo.group(cores, 'ccx'):
+                    self._layout_llc(ccx, ravg['hpmo'])
 
             if bw:
                 # Restrict BW also
@@ -335,8 +626,82 @@ class Algorithm:
                 if not limit and not phase[core]:
                     # Restrict LLC core
                     self._restrict_bw(core, ravg['lat'][core], ravg['bw'][core])
+        if llc:
+            self._l3Focus(data, ravg['hpmo'])
         return phase
 
+    def _model(self, data):
+        """
+        Split the ways of every CCX among its cores with the UCP lookahead
+        over the miss curves (misses per kilo cycle) of their jobs. The curve
+        of a job is the one of its command in the profiles or, when the
+        command is not profiled, the profile with the closest MPKI at the
+        ways it has. The cores are packed from the low ways.
+
+        Parameters:
+            - data : data get from the hardware counters
+        """
+        curves = self._interCall['curves']
+        for _, cores in self._getCCX():
+            jobs = []
+            for core in cores:
+                command = self._prc.command(core)
+                curve = None
+                if command is not None:
+                    curve = curves.matchCurve(command, 'mpkc')
+                if curve is None and core in data.cores():
+                    llc_mask, _, _ = self._interCall['cmask'][core]
+                    mpki = data.get(core, 'mpki3')
+                    name = None if mpki is None else \
+                            curves.fit(bin(llc_mask).count('1'), mpki)
+                    if name is not None:
+                        curve = curves.curve(name, 'mpkc')
+                jobs.append(curve)
+
+            pos = 0
+            for core, ways in zip(cores, missCurves.lookahead(jobs,
+                    self.WAYS)):
+                llc_mask, bw_mask, cos = self._interCall['cmask'][core]
+                mask = ((1 << ways) - 1) << pos
+                pos += ways
+                if mask != llc_mask:
+                    self._prc.pqos().l3Allocation(True, cos, mask, core)
+                    self._interCall['cmask'][core] = (mask, bw_mask, cos)
+                self._limit_core[core] = (ways < self.WAYS, False)
+        return {}
+
+    def masks(self, cores):
+        """
+        Return the masks applied to the given cores (0 if the algorithm did
+        not set a mask in the core)
+
+        Parameters:
+            - cores : list of cores
+
+        Return : (llc masks, bw masks, cos) as uint32 arrays
+        """
+        cmask = self._interCall['cmask']
+        masks = np.array([cmask.get(i, (0, 0, 0)) for i in cores],
+                dtype=np.uint32).reshape(-1, 3)
+        return masks[:, 0], masks[:, 1], masks[:, 2]
+
+    def _record(self, rec, cores, phase):
+        """
+        Fill a decision record with the phase, limit state and BW limit of
+        each core
+
+        Parameters:
+            - rec : decisionTrace record
+            - cores : cores of the record (column order)
+            - phase : phase changes detected in the epoch
+        """
+        rec['phase'] = [phase.get(i, decisionTrace.NO_VALUE) for i in cores]
+        # Index of decisionTrace.LIMITS (None, LLC, BW, LLCBW)
+        rec['limit'] = [self._limit_core[i][0] + 2 * self._limit_core[i][1] \
+                if i in self._limit_core else decisionTrace.NO_VALUE \
+                for i in cores]
+        rec['bw'] = [self._limit_bw.get(i, np.nan) for i in cores]
+
     def step(self, data):
         """
         Execute the selected algorithm
@@ -345,39 +710,34 @@ class Algorithm:
             - data: data used for the algorithm
         """
         phase = {}
-        if self._alg == "llc":
-            phase = self._balancer(data)
-        elif self._alg == "llcbw":
-            phase = self._balancer(data, bw=True)
-        elif self._alg == "bw":
-            phase = self._balancer(data, bw=True, llc=False)
+        # Stage the PQOS changes of the epoch and write them at once
+        with self._prc.pqos().transaction():
+            if self._alg == "llc":
+                phase = self._balancer(data)
+            elif self._alg == "llcbw":
+                phase = self._balancer(data, bw=True)
+            elif self._alg == "bw":
+                phase = self._balancer(data, bw=True, llc=False)
+            elif self._alg == "model":
+                phase = self._model(data)
 
         self._prc.update_restrictions(self._limit_core)
+        self._interCall['urgent'] = any(phase.values()) or \
+                self._interCall.get('spike', False)
+
+        # Decision record of the epoch (written by the trace writer thread)
+        trace = self._parameterCall['trace']
+        if trace is not None:
+            rec = trace.record()
+            if rec is None:
+                trace.drop()
+            else:
+                self._record(rec, trace.cores(), phase)
+                trace.push()
 
-        # Get data to analyze behavior
-        lphase = "Phase:"
-        limit_core = "LimitCore:"
-        limit_bw = "LimitBW:"
-        for i in range(0, 64):
-            if i in phase:
-                if phase[i]:
-                    lphase = "{} {},True".format(lphase, i)
-                else:
-                    lphase = "{} {},False".format(lphase, i)
-
-            if i in self._limit_core:
-                lllc, lbw = self._limit_core[i]
-                if lllc and not lbw:
-                    limit_core = "{} {},LLC".format(limit_core, i)
-                elif not lllc and lbw:
-                    limit_core = "{} {},BW".format(limit_core, i)
-                elif lllc and lbw:
-                    limit_core = "{} {},LLCBW".format(limit_core, i)
-                else:
-                    limit_core = "{} {},None".format(limit_core, i)
-
-            if i in self._limit_bw:
-                limit_bw = "{} {},{}".format(limit_bw, i, self._limit_bw[i])
-
-        sys.stderr.write("{}\n{}\n{}\n".format(lphase, limit_core, limit_bw))
-        sys.stderr.flush()
+    def urgent(self):
+        """
+        Return true if the last step detected a phase change or a latency
+        spike (the next epoch should be shorter)
+        """
+        return self._interCall['urgent']
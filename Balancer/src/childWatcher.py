@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+"""
+Notification of the end of the jobs in an asyncio event loop.
+
+Every job is watched with a pidfd (os.pidfd_open, Linux >= 5.3). The pidfd
+becomes readable when the process finishes, so it is added as one more
+reader of the event loop and the exit is known without polling nor
+sleeping. The process is reaped with wait4 to get its exit status and its
+resource usage. Without pidfd support SIGCHLD is used instead: the signal
+handler of the loop reaps the watched pids that finished.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import signal
+import threading
+
+def pidfdSupported():
+    """
+    Return true if the kernel and Python support pidfd_open
+    """
+    if not hasattr(os, 'pidfd_open'):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+        return True
+    except OSError:
+        return False
+
+def exitCode(status):
+    """
+    Return the exit code of a wait status (-signal if it was killed by a
+    signal), None if the status is unknown
+
+    Parameters:
+        - status : status returned by os.wait4 (or None)
+    """
+    if status is None:
+        return None
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return None
+
+class ChildWatcher:
+    """
+    Class that calls a function every time that a watched child finishes
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _loop = None
+    _callback = None # Function called with (pid, exit status, rusage)
+    _pidfd = None # Use pidfds (otherwise SIGCHLD)
+    _fds = None # Watched children (pid -> pidfd or None)
+    _pending = None # Pids watched before attach
+    _mutex = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, pidfd=None):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - pidfd : use pidfds (True), SIGCHLD (False) or the best one
+                    supported (None)
+        """
+        self._pidfd = pidfdSupported() if pidfd is None else pidfd
+        self._fds = {}
+        self._pending = []
+        self._mutex = threading.Lock()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _register(self, pid):
+        """
+        Start to watch a pid, it must be called from the loop thread
+        """
+        if self._pidfd:
+            try:
+                fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                # Already reaped by someone else
+                return
+            self._fds[pid] = fd
+            self._loop.add_reader(fd, self._reap, pid)
+        else:
+            self._fds[pid] = None
+        # The child could finish before it was watched
+        self._reap(pid)
+
+    def _reap(self, pid):
+        """
+        Reap the given pid if it finished and call the callback
+        """
+        if pid not in self._fds:
+            return
+        try:
+            rpid, status, rusage = os.wait4(pid, os.WNOHANG)
+        except ChildProcessError:
+            # Not our child or already reaped
+            rpid, status, rusage = pid, None, None
+        if rpid == 0:
+            # Still running
+            return
+
+        fd = self._fds.pop(pid)
+        if fd is not None:
+            self._loop.remove_reader(fd)
+            os.close(fd)
+        self._callback(pid, exitCode(status), rusage)
+
+    def _sigchld(self):
+        """
+        SIGCHLD handler: reap all the watched children that finished
+        """
+        for pid in list(self._fds):
+            self._reap(pid)
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def attach(self, loop, callback):
+        """
+        Start to notify the end of the children in the given loop. It must be
+        called from the loop thread.
+
+        Parameters:
+            - loop : asyncio event loop
+            - callback : function called (in the loop thread) with the pid,
+                    the exit code (negative if it was killed by a signal) and
+                    the resource usage (resource.struct_rusage) of every
+                    child that finishes
+        """
+        self._loop = loop
+        self._callback = callback
+        if not self._pidfd:
+            loop.add_signal_handler(signal.SIGCHLD, self._sigchld)
+        with self._mutex:
+            pending = self._pending
+            self._pending = None
+        for pid in pending:
+            self._register(pid)
+
+    def watch(self, pid):
+        """
+        Watch a child, it can be called from any thread
+
+        Parameters:
+            - pid : pid of the child
+        """
+        with self._mutex:
+            if self._pending is not None:
+                # Not attached yet
+                self._pending.append(pid)
+                return
+        self._loop.call_soon_threadsafe(self._register, pid)
+
+    def watching(self):
+        """
+        Return the number of children watched
+        """
+        return len(self._fds)
+
+    def mode(self):
+        """
+        Return the mechanism used: pidfd or sigchld
+        """
+        return "pidfd" if self._pidfd else "sigchld"
+
+    def close(self):
+        """
+        Stop watching the children
+        """
+        if self._loop is None:
+            return
+        for pid in list(self._fds):
+            fd = self._fds.pop(pid)
+            if fd is not None:
+                self._loop.remove_reader(fd)
+                os.close(fd)
+        if not self._pidfd:
+            self._loop.remove_signal_handler(signal.SIGCHLD)
+        self._loop = None
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed. It measures the time between
+    # the end of a child and its notification
+    import sys
+    import asyncio
+    import subprocess
+    from time import perf_counter
+
+    async def test(pidfd, n=20):
+        loop = asyncio.get_running_loop()
+        done = asyncio.Queue()
+        watcher = ChildWatcher(pidfd)
+        watcher.attach(loop, lambda pid, code, ru: done.put_nowait(
+            (perf_counter(), code, ru)))
+        latency = []
+        for _ in range(0, n):
+            # The child writes when it is about to finish
+            r, w = os.pipe()
+            proc = subprocess.Popen([sys.executable, "-c", "import os; "
+                "os.write({}, b'x'); os._exit(0)".format(w)], pass_fds=(w,))
+            os.close(w)
+            watcher.watch(proc.pid)
+            wrote = loop.create_future()
+            loop.add_reader(r, lambda: wrote.done() or wrote.set_result(
+                perf_counter()))
+            t = await wrote
+            loop.remove_reader(r)
+            end, code, ru = await done.get()
+            latency.append(end - t)
+            proc.returncode = code
+            os.close(r)
+        watcher.close()
+        latency.sort()
+        print("{}: exit {} p50 {:.1f} us max {:.1f} us".format(
+            watcher.mode(), code, latency[n // 2] * 1e6, latency[-1] * 1e6))
+
+    for pidfd in ((True, False) if pidfdSupported() else (False,)):
+        asyncio.run(test(pidfd))
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+Controller of Balancer built on one asyncio event loop.
+
+The epoch sampling, the L3 occupancy multiplexing, the watchdogs and the
+notification of the finished jobs (childWatcher) share the same loop instead
+of threads with their own sleeps. The periodic tasks use deadlines (start +
+k * period), so the time spent in a task does not delay the next one and the
+epochs do not drift. The blocking calls (MSR reads/writes, PQOS, /proc reads
+and job launches) run in a small thread pool.
+
+Every epoch starts when the previous one finishes: the counters are read
+once at each deadline and the same snapshot is the end of an epoch and the
+beginning of the next one.
+
+The lateness of every task (time between its deadline and when it really
+runs) is measured, see report().
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import sys
+import asyncio
+import utilities
+import epochScheduler
+from concurrent.futures import ThreadPoolExecutor
+
+class Controller:
+    """
+    Class to run the controller tasks in an asyncio event loop
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _prc = None
+    _alg = None
+    _cores = None
+    _sched = None # Length of the epochs (epochScheduler)
+    _param = None # Periods of the tasks
+    _onEpoch = None # Function called with the data of every epoch
+    _executor = None
+    _loop = None
+    _late = None # Lateness of each task (name -> [count, sum, max, missed])
+    _epochs = 0
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, prc, alg, cores, tepoch, onEpoch=None, workers=2,
+            timeCPU=.02, timeProcess=5., reap=True, scheduler=None):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - prc : process object
+            - alg : algorithms.Algorithm object
+            - cores : list of the managed cores
+            - tepoch : epoch time (seconds), length of the first epoch if
+                    a scheduler is given
+            - onEpoch : (optional) function called with the complex events of
+                    every epoch after the algorithm step
+            - workers : threads of the pool for the blocking calls
+            - timeCPU : period of the CPU watchdog (seconds, 0 to disable)
+            - timeProcess : period of the Process watchdog (seconds, 0 to
+                    disable)
+            - reap : notify the finished jobs (Process.childWatcher) and
+                    launch the next ones
+            - scheduler : (optional) epochScheduler.EpochScheduler that
+                    adapts the length of the epochs to the urgent events of
+                    the algorithm (Algorithm.urgent), fixed epochs by default
+        """
+        self._prc = prc
+        self._alg = alg
+        self._cores = cores
+        self._sched = epochScheduler.EpochScheduler(tepoch) if \
+                scheduler is None else scheduler
+        self._onEpoch = onEpoch
+        self._param = {'workers': workers, 'timeCPU': timeCPU,
+                'timeProcess': timeProcess, 'reap': reap}
+        self._late = {}
+        self._epochs = 0
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _call(self, fn, *args):
+        """
+        Run a blocking function in the thread pool
+        """
+        return self._loop.run_in_executor(self._executor, fn, *args)
+
+    async def _sleepUntil(self, name, deadline):
+        """
+        Sleep until the deadline and account the lateness of the task
+
+        Parameters:
+            - name : name of the task
+            - deadline : loop time to wake up
+
+        Return : the time when the task woke up
+        """
+        delay = deadline - self._loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        now = self._loop.time()
+        late = self._late.setdefault(name, [0, 0., 0., 0])
+        late[0] += 1
+        late[1] += now - deadline
+        late[2] = max(late[2], now - deadline)
+        return now
+
+    def _next(self, name, deadline, period, now):
+        """
+        Return the next deadline of a periodic task, the periods already lost
+        are skipped (and accounted as missed)
+        """
+        deadline += period
+        if deadline < now:
+            missed = int((now - deadline) / period) + 1
+            self._late[name][3] += missed
+            deadline += missed * period
+        return deadline
+
+    async def _epoch(self):
+        """
+        Epoch task: read the counters at every deadline and run the algorithm.
+        The next deadline is set by the epoch scheduler after every step.
+        """
+        old = await self._call(utilities.getHWC, self._prc, self._cores)
+        tepoch = self._sched.length()
+        deadline = self._loop.time() + tepoch
+        while not self._prc.isEnd():
+            now = await self._sleepUntil('epoch', deadline)
+            new = await self._call(self._prc.snapshot, self._cores)
+            data = await self._call(utilities.getComplexEvent, self._prc,
+                    self._cores, old, new)
+            await self._call(self._alg.step, data)
+            if self._onEpoch is not None:
+                self._onEpoch(data)
+            old = new
+            self._epochs += 1
+            tepoch = self._sched.next(self._alg.urgent())
+            deadline = self._next('epoch', deadline, tepoch,
+                    self._loop.time())
+
+    async def _l3Monitor(self):
+        """
+        L3 occupancy multiplexing task, one thread of each CCX (selected by
+        the multiplexer) is sampled at every tick. The MBM counters of every
+        thread are read in the same tick. That re-selects the monitor event
+        of every thread on every tick, so the sampled threads pay an
+        occupancy re-enable and its settle time on every tick.
+        """
+        mux = self._prc.l3Multiplexer()
+        period = 1 / mux.rate()
+        deadline = self._loop.time() + period
+        while not self._prc.isEnd():
+            await self._sleepUntil('l3', deadline)
+            threads, enable = mux.pick()
+            if len(enable) > 0:
+                await self._call(self._prc.l3MonitorEnable, enable)
+                await asyncio.sleep(mux.settle())
+            await self._call(self._prc.l3MonitorPublish, threads)
+            await self._call(self._prc.l3MonitorMBM, threads)
+            deadline = self._next('l3', deadline, period, self._loop.time())
+
+    async def _periodic(self, name, period, fn):
+        """
+        Run a blocking function every period seconds
+
+        Parameters:
+            - name : name of the task
+            - period : seconds
+            - fn : function
+        """
+        deadline = self._loop.time() + period
+        while not self._prc.isEnd():
+            await self._sleepUntil(name, deadline)
+            await self._call(fn)
+            deadline = self._next(name, deadline, period, self._loop.time())
+
+    def _exited(self, pid, code, rusage):
+        """
+        A job finished (called by the child watcher in the loop thread)
+        """
+        future = self._call(self._prc.jobExit, pid, code, rusage)
+        future.add_done_callback(self._check)
+
+    def _check(self, future):
+        """
+        Finish the experiment if a job exit could not be handled
+        """
+        if future.exception() is not None:
+            sys.stderr.write("Job exit failed: {}\n".format(
+                future.exception()))
+            sys.stderr.flush()
+            self._prc.stop()
+
+    async def _main(self):
+        """
+        Start all the tasks and wait until the end of the experiment
+        """
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(self._param['workers'])
+
+        tasks = [self._epoch(), self._l3Monitor()]
+        if self._param['timeCPU'] > 0:
+            tasks.append(self._periodic('watchdog cpu',
+                self._param['timeCPU'], lambda: self._prc.checkCPU(
+                    reap=not self._param['reap'])))
+        if self._param['timeProcess'] > 0:
+            tasks.append(self._periodic('watchdog process',
+                self._param['timeProcess'], self._prc.checkProcess))
+        if self._param['reap']:
+            self._prc.childWatcher().attach(self._loop, self._exited)
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Any error finishes the experiment
+            self._prc.stop()
+            if self._param['reap']:
+                self._prc.childWatcher().close()
+            self._executor.shutdown(wait=True)
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def run(self):
+        """
+        Run the controller until the end of the experiment
+        """
+        sys.stderr.write("Start controller\n")
+        sys.stderr.flush()
+        asyncio.run(self._main())
+        sys.stderr.write("Finish controller\n")
+        sys.stderr.flush()
+
+    def epochs(self):
+        """
+        Return the number of epochs done
+        """
+        return self._epochs
+
+    def lateness(self, name):
+        """
+        Return the lateness statistics of a task: (wake ups, mean seconds,
+        max seconds, periods missed)
+
+        Parameters:
+            - name : epoch, l3, watchdog cpu or watchdog process
+        """
+        count, total, maxx, missed = self._late.get(name, [0, 0., 0., 0])
+        return count, total / count if count > 0 else 0., maxx, missed
+
+    def scheduler(self):
+        """
+        Return the epochScheduler.EpochScheduler object
+        """
+        return self._sched
+
+    def report(self):
+        """
+        Return a string with the lateness of every task (one per line) and
+        the length of the epochs
+        """
+        epochs, mean, urgent = self._sched.stats()
+        lines = ["Epochs: {} mean {:.3f} s urgent {}".format(epochs, mean,
+            urgent)]
+        for name in sorted(self._late):
+            count, mean, maxx, missed = self.lateness(name)
+            lines.append("Task {}: runs {} late mean {:.3f} ms max {:.3f} ms "\
+                    "missed {}".format(name, count, mean * 1000, maxx * 1000,
+                        missed))
+        return '\n'.join(lines)
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+"""
+Background sampler of the utilization of every cpu from /proc/stat.
+
+A daemon thread reads /proc/stat every period and keeps the last samples of
+the busy and total time of each cpu in a ring. The busy fraction over the
+window (the oldest and the newest samples of the ring) is published in an
+array that is replaced as a whole, so the readers never block nor sleep:
+the launch of a job and the CPU watchdog only index the last array.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import threading
+import numpy as np
+from time import monotonic
+
+def readStat(f, ncpu):
+    """
+    Read the busy and total time (ticks) of every cpu
+
+    Parameters:
+        - f : /proc/stat opened in binary mode
+        - ncpu : size of the arrays
+
+    Return : (busy, total) int64 arrays indexed by cpu id, 0 for the cpus that
+        are not in the file (offline)
+    """
+    f.seek(0)
+    busy = np.zeros(ncpu, dtype=np.int64)
+    total = np.zeros(ncpu, dtype=np.int64)
+    for line in f.read().split(b'\n')[1:]:
+        if not line.startswith(b'cpu'):
+            # The cpus are the first lines
+            break
+        fields = line.split()
+        cpu = int(fields[0][3:])
+        if cpu >= ncpu:
+            continue
+        # user nice system idle iowait irq softirq steal (guest is already
+        # accounted in user)
+        ticks = [int(i) for i in fields[1:9]]
+        total[cpu] = sum(ticks)
+        busy[cpu] = total[cpu] - ticks[3] - ticks[4]
+    return busy, total
+
+class CPUSampler:
+    """
+    Class that keeps the busy fraction of every cpu up to date
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _path = None
+    _period = None # Seconds between two samples
+    _ncpu = None
+    _ts = None # Time of the samples in the ring
+    _busy = None # Busy ticks in the ring (samples x cpus)
+    _total = None # Total ticks in the ring (samples x cpus)
+    _pos = 0 # Next position of the ring
+    _n = 0 # Samples in the ring
+    _util = None # Busy fraction over the window (NaN without two samples)
+    _mutex = None
+    _stop = None
+    _thread = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, period=.05, window=.2, path="/proc/stat"):
+        """
+        Constructor of the class, the sampling starts with start()
+
+        Parameters:
+            - period : seconds between two reads of /proc/stat
+            - window : seconds of the busy fraction
+            - path : stat file
+        """
+        self._path = path
+        self._period = period
+        size = max(int(round(window / period)), 1) + 1
+        with open(path, 'rb') as f:
+            ids = [int(i.split()[0][3:]) for i in f.read().split(b'\n')[1:]
+                    if i.startswith(b'cpu')]
+        self._ncpu = max([os.cpu_count()] + [i + 1 for i in ids])
+        self._ts = np.zeros(size, dtype=np.float64)
+        self._busy = np.zeros((size, self._ncpu), dtype=np.int64)
+        self._total = np.zeros((size, self._ncpu), dtype=np.int64)
+        self._pos = 0
+        self._n = 0
+        self._util = np.full(self._ncpu, np.nan)
+        self._mutex = threading.Lock()
+        self._stop = threading.Event()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _fraction(self, old, new):
+        """
+        Busy fraction between two positions of the ring
+        """
+        total = self._total[new] - self._total[old]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, (self._busy[new] - self._busy[old]) /
+                    total, np.nan)
+
+    def _sample(self, f):
+        """
+        Add one sample to the ring and publish the new busy fractions
+        """
+        busy, total = readStat(f, self._ncpu)
+        size = len(self._ts)
+        with (self._mutex):
+            pos = self._pos
+            self._ts[pos] = monotonic()
+            self._busy[pos] = busy
+            self._total[pos] = total
+            self._pos = (pos + 1) % size
+            self._n = min(self._n + 1, size)
+            if self._n > 1:
+                # Oldest sample of the ring
+                old = (self._pos - self._n) % size
+                self._util = self._fraction(old, pos)
+
+    def _run(self):
+        """
+        Sampling thread
+        """
+        with open(self._path, 'rb') as f:
+            deadline = monotonic()
+            while True:
+                self._sample(f)
+                deadline += self._period
+                delay = deadline - monotonic()
+                if delay < 0:
+                    # Too late, skip the lost periods
+                    deadline = monotonic()
+                    delay = 0
+                if self._stop.wait(delay):
+                    break
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def start(self):
+        """
+        Start the sampling thread
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the sampling thread
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def utilization(self):
+        """
+        Return the busy fraction (0 to 1) of every cpu over the window, the
+        array is indexed by cpu id and must not be modified. The values are
+        NaN until there are two samples.
+        """
+        return self._util
+
+    def busy(self, cpu, since=None):
+        """
+        Return the busy fraction of a cpu
+
+        Parameters:
+            - cpu : cpu id
+            - since : (optional) monotonic time, only the samples taken after
+                    it are used (e.g. the end of the last job of the cpu)
+
+        Return : busy fraction (0 to 1) or NaN if there are not two samples
+            (or the cpu does not exist)
+        """
+        if cpu >= self._ncpu:
+            return np.nan
+        if since is None:
+            return self._util[cpu]
+        size = len(self._ts)
+        with (self._mutex):
+            new = (self._pos - 1) % size
+            for i in range(self._n, 1, -1):
+                # From the oldest sample
+                old = (self._pos - i) % size
+                if self._ts[old] >= since:
+                    total = self._total[new, cpu] - self._total[old, cpu]
+                    if total <= 0:
+                        return np.nan
+                    return (self._busy[new, cpu] - self._busy[old, cpu]) /\
+                            total
+        return np.nan
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    from time import sleep, perf_counter
+    sampler = CPUSampler()
+    sampler.start()
+    t = monotonic()
+    # Busy cpu for half a second
+    while monotonic() - t < .5:
+        pass
+    cpu = os.sched_getaffinity(0)
+    print("Busy: {}".format(np.round(sampler.utilization()[sorted(cpu)], 2)))
+    sleep(.5)
+    t = perf_counter()
+    for _ in range(0, 10000):
+        sampler.utilization()[min(cpu)]
+    print("Idle: {} read {:.3f} us".format(np.round(sampler.utilization()[
+        sorted(cpu)], 2), (perf_counter() - t) / 10000 * 1e6))
+    print("Since: {}".format(sampler.busy(min(cpu), since=monotonic() - .1)))
+    sampler.stop()
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+"""
+Trace of the decisions of the algorithm (one record per epoch)
+
+Every record has, for each managed core, the phase change flag, the limit
+state (None, LLC, BW or LLCBW) and the BW limit. The control loop only copies
+the values into a preallocated ring buffer; a background thread drains the
+ring and writes the records, so the control loop never formats strings nor
+blocks in I/O. If the writer is so late that the ring is full, the new
+records are dropped (and counted).
+
+Output formats:
+    * jsonl : one JSON object per line, the first line has the cores.
+    * bin : one JSON header line followed by the raw records (see load).
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import sys
+import json
+import threading
+import numpy as np
+from time import time
+
+# Limit states (index in the record)
+LIMITS = ('None', 'LLC', 'BW', 'LLCBW')
+NO_VALUE = -1 # Phase/limit of a core without information
+
+def recordType(n):
+    """
+    Return the numpy dtype of a record with n cores
+    """
+    return np.dtype([('epoch', np.int64), ('time', np.float64),
+        ('phase', np.int8, (n,)), ('limit', np.int8, (n,)),
+        ('bw', np.float32, (n,))])
+
+def load(path):
+    """
+    Load a trace file
+
+    Parameters:
+        - path : trace file (jsonl or bin)
+
+    Return : (list of cores, numpy structured array with the records)
+    """
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        cores = header['cores']
+        dtype = recordType(len(cores))
+        if header.get('format') == 'bin':
+            return cores, np.frombuffer(f.read(), dtype=dtype)
+
+        lines = [json.loads(i) for i in f.read().splitlines() if i]
+    records = np.zeros(len(lines), dtype=dtype)
+    for idx, i in enumerate(lines):
+        records[idx]['epoch'] = i['epoch']
+        records[idx]['time'] = i['time']
+        records[idx]['phase'] = i['phase']
+        records[idx]['limit'] = [LIMITS.index(j) if j is not None else \
+                NO_VALUE for j in i['limit']]
+        records[idx]['bw'] = [j if j is not None else np.nan for j in \
+                i['bw']]
+    return cores, records
+
+class DecisionTrace:
+    """
+    Ring buffer of decision records drained by a background writer
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _cores = None # Cores (column order of the records)
+    _ring = None # Preallocated records
+    _head = 0 # Records pushed
+    _tail = 0 # Records written
+    _dropped = 0 # Records dropped because the ring was full
+    _epoch = 0
+    _file = None
+    _fmt = None
+    _interval = None # Seconds between drains
+    _end = None
+    _writer = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, cores, path=None, fmt='jsonl', size=1024,
+            interval=.5):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - cores : list of the managed cores
+            - path : output file, None to write in stderr (only jsonl)
+            - fmt : output format, 'jsonl' or 'bin'
+            - size : records of the ring buffer
+            - interval : seconds between two drains of the ring
+        """
+        if fmt not in ('jsonl', 'bin'):
+            raise ValueError("Unknown trace format {}".format(fmt))
+        if path is None and fmt == 'bin':
+            raise ValueError("The bin trace format needs a file")
+
+        self._cores = list(cores)
+        self._ring = np.zeros(size, dtype=recordType(len(self._cores)))
+        self._head = 0
+        self._tail = 0
+        self._dropped = 0
+        self._epoch = 0
+        self._fmt = fmt
+        self._interval = interval
+        if path is None:
+            self._file = sys.stderr
+        else:
+            self._file = open(path, 'w' if fmt == 'jsonl' else 'wb')
+
+        header = json.dumps({'cores': self._cores, 'format': fmt}) + '\n'
+        self._file.write(header if fmt == 'jsonl' else header.encode())
+
+        self._end = threading.Event()
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _run(self):
+        """
+        Background writer, drains the ring every interval seconds
+        """
+        while not self._end.wait(self._interval):
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        """
+        Write all the records pushed and not written yet
+        """
+        head = self._head
+        if head == self._tail:
+            return
+        size = len(self._ring)
+        idx = np.arange(self._tail, head) % size
+        # Copy the records, after moving the tail the slots can be reused
+        records = self._ring[idx]
+        self._tail = head
+
+        if self._fmt == 'bin':
+            self._file.write(records.tobytes())
+        else:
+            lines = []
+            for i in records:
+                lines.append(json.dumps({
+                    'epoch': int(i['epoch']),
+                    'time': float(i['time']),
+                    'phase': i['phase'].tolist(),
+                    'limit': [LIMITS[j] if j != NO_VALUE else None for j in \
+                            i['limit'].tolist()],
+                    'bw': [None if np.isnan(j) else j for j in \
+                            i['bw'].tolist()],
+                    }))
+            self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def cores(self):
+        """
+        Return the cores (column order of the records)
+        """
+        return self._cores
+
+    def record(self):
+        """
+        Return the next free record of the ring (its phase, limit and bw
+        arrays can be filled in place), or None if the ring is full. The
+        record is not written until push is called.
+        """
+        if self._head - self._tail >= len(self._ring):
+            return None
+        return self._ring[self._head % len(self._ring)]
+
+    def push(self):
+        """
+        Publish the record returned by record()
+        """
+        rec = self._ring[self._head % len(self._ring)]
+        rec['epoch'] = self._epoch
+        rec['time'] = time()
+        self._epoch += 1
+        self._head += 1
+
+    def drop(self):
+        """
+        Account an epoch whose record could not be stored
+        """
+        self._epoch += 1
+        self._dropped += 1
+
+    def dropped(self):
+        """
+        Return the number of records dropped
+        """
+        return self._dropped
+
+    def close(self):
+        """
+        Write the pending records and stop the writer
+        """
+        self._end.set()
+        self._writer.join()
+        if self._file is not sys.stderr:
+            self._file.close()
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ('jsonl', 'bin'):
+            path = os.path.join(tmp, "trace." + fmt)
+            tr = DecisionTrace([0, 1, 2], path, fmt=fmt, size=4,
+                    interval=.01)
+            for epoch in range(0, 10):
+                rec = tr.record()
+                if rec is None:
+                    tr.drop()
+                    continue
+                rec['phase'] = [epoch % 2, 0, NO_VALUE]
+                rec['limit'] = [1, 0, 3]
+                rec['bw'] = [np.nan, 2.5, 2.25]
+                tr.push()
+            tr.close()
+            cores, records = load(path)
+            print(fmt, cores, len(records), tr.dropped(), records[-1])
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Adaptive length of the epochs.
+
+Short epochs react fast to the phase changes but their measures are noisy,
+long epochs are accurate but slow. The length of the next epoch is:
+    * shrink times the last one when the algorithm reports an urgent event
+      (phase change or latency spike, see Algorithm.urgent).
+    * grow times the last one otherwise (steady state).
+and it is always between the min and max bounds. With min == max the epochs
+have a fixed length.
+
+The metrics are rates normalized by the elapsed time of every epoch and the
+rolling averages of the algorithm are weighted by it, so epochs of different
+lengths can be mixed.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+
+class EpochScheduler:
+    """
+    Class that decides the length of the next epoch
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _length = None # Length of the next epoch (seconds)
+    _min = None
+    _max = None
+    _shrink = None
+    _grow = None
+    _epochs = 0
+    _urgent = 0 # Epochs shortened by an urgent event
+    _time = 0. # Sum of the lengths
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, tepoch, tmin=None, tmax=None, shrink=.5, grow=1.25):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - tepoch : length of the first epoch (seconds)
+            - tmin : (optional) minimum length, tepoch by default
+            - tmax : (optional) maximum length, tepoch by default
+            - shrink : factor applied after an urgent event (< 1)
+            - grow : factor applied in steady state (> 1)
+        """
+        self._min = tepoch if tmin is None else tmin
+        self._max = tepoch if tmax is None else tmax
+        if self._min > self._max:
+            raise ValueError("Minimum epoch {} is greater than the maximum {}"\
+                    .format(self._min, self._max))
+        self._length = min(max(tepoch, self._min), self._max)
+        self._shrink = shrink
+        self._grow = grow
+        self._epochs = 0
+        self._urgent = 0
+        self._time = 0.
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def length(self):
+        """
+        Return the length of the next epoch (seconds)
+        """
+        return self._length
+
+    def next(self, urgent):
+        """
+        Account the epoch that finished and return the length of the next one
+
+        Parameters:
+            - urgent : true if the algorithm detected an urgent event in the
+                    epoch
+        """
+        self._epochs += 1
+        self._time += self._length
+        if urgent:
+            self._urgent += 1
+            length = self._length * self._shrink
+        else:
+            length = self._length * self._grow
+        self._length = min(max(length, self._min), self._max)
+        return self._length
+
+    def stats(self):
+        """
+        Return (epochs, mean length in seconds, urgent epochs)
+        """
+        mean = self._time / self._epochs if self._epochs > 0 else self._length
+        return self._epochs, mean, self._urgent
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    sched = EpochScheduler(1, tmin=.1, tmax=2)
+    lengths = [sched.next(i in (10, 11, 30)) for i in range(0, 40)]
+    print(["{:.2f}".format(i) for i in lengths])
+    print(sched.stats())
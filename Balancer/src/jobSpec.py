@@ -0,0 +1,259 @@
+#!/usr/bin/python3
+"""
+Parse the command of a job (a line of the commands file) into the arguments
+to spawn it without a shell.
+
+Supported syntax (the usual in benchmark run scripts):
+    * Leading "cd DIR &&" : working directory of the job.
+    * Leading NAME=VALUE assignments : environment variables of the job.
+    * Redirections: < file, > file, >> file, 2> file, 2>> file, &> file and
+      2>&1 (also without space, e.g. >out.txt).
+    * Quotes and backslashes as in sh. A quoted operator is an argument
+      (e.g. grep ">" file).
+Other shell syntax (pipes, lists, variables, globs, ...) can not be run
+without a shell, those commands (and any word with an unquoted shell
+metacharacter that is not a redirection, e.g. a&&b) are run with
+/bin/bash -c (SHELL), like the taskset ... bash -c of the old launcher: sh is
+dash in Debian and Ubuntu and it reads bash syntax such as "cmd &> out" as
+"cmd &" and "> out".
+
+spawn() runs the job pinned to one cpu in a new session. The affinity is set
+on the spawning thread (sched_setaffinity of the thread) and inherited by the
+child, so the job never runs on another cpu and no taskset is needed.
+posix_spawn can not change the working directory, so subprocess (that uses
+vfork/posix_spawn when no preexec_fn is given) is used.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import re
+import subprocess
+
+REDIRECT = re.compile(r'^(\d|&)?(>>|>|<)(&1)?(.*)$')
+ASSIGN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+META_CHARS = set('|&;()<>')
+SHELL_CHARS = set('$`*?[{~')
+# Shell of the commands that can not be run without one
+SHELL = '/bin/bash'
+
+def _split(command):
+    """
+    Split a command in words as sh does
+
+    Parameters:
+        - command : command line
+
+    Return : list of (word, unquoted) where unquoted is the set of shell
+        characters (META_CHARS and SHELL_CHARS) of the word that were not
+        quoted ($ and ` also inside double quotes, sh expands them)
+
+    Raise : ValueError if a quote is not closed
+    """
+    words = []
+    word, unquoted, inword = [], set(), False
+    idx = 0
+    while idx < len(command):
+        c = command[idx]
+        idx += 1
+        if c in ' \t\n':
+            if inword:
+                words.append((''.join(word), unquoted))
+                word, unquoted, inword = [], set(), False
+            continue
+        inword = True
+        if c == '\\':
+            if idx == len(command):
+                raise ValueError("Escape at the end of the command")
+            word.append(command[idx])
+            idx += 1
+        elif c == "'":
+            end = command.find("'", idx)
+            if end < 0:
+                raise ValueError("Single quote not closed")
+            word.append(command[idx:end])
+            idx = end + 1
+        elif c == '"':
+            while True:
+                if idx == len(command):
+                    raise ValueError("Double quote not closed")
+                c = command[idx]
+                idx += 1
+                if c == '"':
+                    break
+                if c == '\\' and idx < len(command) and \
+                        command[idx] in '\\"$`\n':
+                    c = command[idx]
+                    idx += 1
+                elif c in '$`':
+                    unquoted.add(c)
+                word.append(c)
+        else:
+            if c in META_CHARS or c in SHELL_CHARS:
+                unquoted.add(c)
+            word.append(c)
+    if inword:
+        words.append((''.join(word), unquoted))
+    return words
+
+def _shell(command):
+    """
+    Return the spec of a command that must be run by a shell
+    """
+    return {'argv': [SHELL, '-c', command], 'env': {}, 'cwd': None,
+            'stdin': None, 'stdout': None, 'stderr': None, 'shell': True}
+
+def parse(command):
+    """
+    Parse the command of a job
+
+    Parameters:
+        - command : command line (sh syntax)
+
+    Return : dictionary with:
+        * argv : list of arguments
+        * env : environment variables to add
+        * cwd : working directory (None to keep the current one)
+        * stdin : file to read (None for /dev/null)
+        * stdout, stderr : (file, append) or None for /dev/null. stderr can
+                be 'stdout' (2>&1).
+        * shell : true if the command is run with SHELL -c
+    """
+    try:
+        tokens = _split(command)
+    except ValueError:
+        return _shell(command)
+
+    spec = {'argv': [], 'env': {}, 'cwd': None, 'stdin': None,
+            'stdout': None, 'stderr': None, 'shell': False}
+
+    # cd DIR && ...
+    if len(tokens) >= 3 and tokens[0] == ('cd', set()) and \
+            tokens[2] == ('&&', {'&'}) and len(tokens[1][1]) == 0:
+        spec['cwd'] = tokens[1][0]
+        tokens = tokens[3:]
+
+    # NAME=VALUE ...
+    while len(tokens) > 0 and len(tokens[0][1]) == 0 and \
+            ASSIGN.match(tokens[0][0]):
+        name, value = tokens.pop(0)[0].split('=', 1)
+        spec['env'][name] = value
+
+    idx = 0
+    while idx < len(tokens):
+        token, unquoted = tokens[idx]
+        idx += 1
+        if len(SHELL_CHARS & unquoted) > 0:
+            return _shell(command)
+
+        match = REDIRECT.match(token) if len(unquoted) > 0 else None
+        if match is None:
+            if len(unquoted) > 0:
+                # Operator or a word with an operator (e.g. a&&b)
+                return _shell(command)
+            spec['argv'].append(token)
+            continue
+        if len(META_CHARS & set(match.group(4))) > 0:
+            # e.g. >a|b
+            return _shell(command)
+
+        fd, op, dup, target = match.groups()
+        if dup is not None:
+            # 2>&1
+            if fd != '2' or op != '>' or target != '':
+                return _shell(command)
+            spec['stderr'] = 'stdout'
+            continue
+        if target == '':
+            if idx == len(tokens) or len(tokens[idx][1]) > 0:
+                return _shell(command)
+            target = tokens[idx][0]
+            idx += 1
+
+        if op == '<':
+            if fd not in (None, '0'):
+                return _shell(command)
+            spec['stdin'] = target
+        elif fd in (None, '1'):
+            spec['stdout'] = (target, op == '>>')
+        elif fd == '2':
+            spec['stderr'] = (target, op == '>>')
+        elif fd == '&':
+            spec['stdout'] = (target, op == '>>')
+            spec['stderr'] = 'stdout'
+        else:
+            return _shell(command)
+
+    if len(spec['argv']) == 0:
+        return _shell(command)
+    return spec
+
+def _open(name, cwd, mode):
+    """
+    Open a redirection file, relative to the working directory of the job
+    """
+    if cwd is not None:
+        name = os.path.join(cwd, name)
+    return open(name, mode)
+
+def spawn(spec, cpu):
+    """
+    Spawn a job pinned to a cpu in a new session (process group)
+
+    Parameters:
+        - spec : job spec (see parse)
+        - cpu : logical cpu of the job
+
+    Return : subprocess.Popen object, its pid is the pid of the job
+    """
+    env = None
+    if len(spec['env']) > 0:
+        env = dict(os.environ)
+        env.update(spec['env'])
+
+    files = []
+    try:
+        stdin = subprocess.DEVNULL
+        if spec['stdin'] is not None:
+            stdin = _open(spec['stdin'], spec['cwd'], 'rb')
+            files.append(stdin)
+        stdout = subprocess.DEVNULL
+        if spec['stdout'] is not None:
+            name, append = spec['stdout']
+            stdout = _open(name, spec['cwd'], 'ab' if append else 'wb')
+            files.append(stdout)
+        stderr = subprocess.DEVNULL
+        if spec['stderr'] == 'stdout':
+            stderr = subprocess.STDOUT
+        elif spec['stderr'] is not None:
+            name, append = spec['stderr']
+            stderr = _open(name, spec['cwd'], 'ab' if append else 'wb')
+            files.append(stderr)
+
+        # Only this thread changes its affinity, the child inherits it
+        mask = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, [cpu])
+        try:
+            return subprocess.Popen(spec['argv'], stdin=stdin, stdout=stdout,
+                    stderr=stderr, cwd=spec['cwd'], env=env,
+                    start_new_session=True)
+        finally:
+            os.sched_setaffinity(0, mask)
+    finally:
+        for f in files:
+            f.close()
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    for i in ["/usr/bin/ls -l", "cd /tmp && OMP_NUM_THREADS=1 ./mcf_r "
+            "inp.in > inp.out 2>> inp.err", "./lbm <in.txt &>out.txt",
+            "echo 'a b' 2>&1", "ls | wc -l", "echo $HOME", 'grep ">" in.txt',
+            "a&&b", "echo '$HOME' \\> \"x y\""]:
+        print(i, '->', parse(i))
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = spawn(parse("cd {} && LC_ALL=C grep Cpus_allowed_list "
+            "/proc/self/status > out.txt".format(tmp)), 0)
+        print(proc.pid, proc.wait(), open(os.path.join(tmp, "out.txt"))\
+                .read().strip())
@@ -15,6 +15,13 @@ import rollingAVG
 import algorithms
 import utilities
 import process
+import msr
+import timedLock
+import simMSR
+import decisionTrace
+import telemetry
+import controller
+import epochScheduler
 
 # General imports
 import threading
@@ -70,14 +77,14 @@ def log(f, prc, cores, hwcg, ttime, llc):
 
     f.write("{}\n".format(time()))
     for i in cores:
-        if hwcg[i]['bwl'] is not None:
-            #cpig.append(hwcg[i]['cpi'])
-            bwg += hwcg[i]['bwl']
-            str_ = "Core: {} CPI: {:.2f}".format(i, hwcg[i]['cpi'])
-            str_ += " HpMO: {:.2f}".format(hwcg[i]['hpmo'])
-            str_ += " DMPKI3: {:.2f}".format(hwcg[i]['dmpki3'])
-            str_ += " BW Local (GB/s): {:.1f}".format(hwcg[i]['bwl'])
-            str_ += " Lat L3: {:.0f}\n".format(hwcg[i]['lat'] )
+        if hwcg.get(i, 'bw') is not None:
+            #cpig.append(hwcg.get(i, 'cpi'))
+            bwg += hwcg.get(i, 'bw')
+            str_ = "Core: {} CPI: {:.2f}".format(i, hwcg.get(i, 'cpi'))
+            str_ += " HpMO: {:.2f}".format(hwcg.get(i, 'hpmo'))
+            str_ += " DMPKI3: {:.2f}".format(hwcg.get(i, 'dmpki3'))
+            str_ += " BW Local (GB/s): {:.1f}".format(hwcg.get(i, 'bw'))
+            str_ += " Lat L3: {:.0f}\n".format(hwcg.get(i, 'lat'))
         else:
             str_ = ""
         f.write(str_)
@@ -87,13 +94,36 @@ def log(f, prc, cores, hwcg, ttime, llc):
 
     return hwcg, bwg
 
-def alg(flog, prc, config):
+def record(rec, prc, alg, data):
     """
-    Run the management algorithm every tepoch
+    Append the telemetry of one epoch: hw counter increments, elapsed time,
+    complex events (occupancy included) and masks applied
+
+    Parameters :
+        - rec : telemetry.Recorder object
+        - prc : process object of the process class
+        - alg : algorithm object
+        - data : complex events of the epoch
+    """
+    values = {'time': time(), 'elapsed': data.elapsed()}
+    delta = data.delta()
+    for name, idx in prc.hwcIndex().items():
+        values['delta.{}'.format(name)] = delta[:, idx]
+    values.update(data.metrics())
+    values['llc_mask'], values['bw_mask'], values['cos'] = \
+            alg.masks(data.cores())
+    rec.append(values)
+
+def alg(prc, config):
+    """
+    Create the management algorithm and run it every tepoch in the
+    controller event loop
 
     Parameters :
         - prc: process object
         - config : configuration file
+
+    Return : controller.Controller object (already finished)
     """
     # Create function to call the algorithm
     parameters = {}
@@ -112,15 +142,52 @@ def alg(flog, prc, config):
         parameters['hpmo_limit'] = config['hpmo_limit']
     if 'allocation' in config:
         parameters['allocation'] = config['allocation']
+    if 'profiles' in config:
+        parameters['profiles'] = config['profiles']
+    if 'profile_triads' in config:
+        parameters['profile_triads'] = config['profile_triads']
+    if 'lat_spike' in config:
+        parameters['lat_spike'] = config['lat_spike']
+    # Graded LLC allocation (optional)
+    for key in ('llc_alloc', 'llc_layout', 'llc_step', 'llc_hyst',
+            'llc_settle', 'llc_ipc_loss', 'llc_hold'):
+        if key in config:
+            parameters[key] = config[key]
     parameters['prc'] = prc
+    # Decisions of every epoch (stderr by default)
+    trace = decisionTrace.DecisionTrace(config['threads'],
+            config.get('trace', None), fmt=config.get('trace_format', 'jsonl'))
+    parameters['trace'] = trace
+    # Telemetry of every epoch (optional)
+    rec = None
+    onEpoch = None
+    if 'telemetry' in config:
+        rec = telemetry.Recorder(config['telemetry'], config['threads'])
     # Create algorithm class
     alg = algorithms.Algorithm(config['alg'], parameters)
-    hwc = utilities.getHWC(prc, config['threads'])
-
-    while not prc.isEnd():
-        # Do epoch
-        data = utilities.doEpoch(prc, config['threads'], config['tepoch'])
-        alg.step(data)
+    if rec is not None:
+        onEpoch = lambda data: record(rec, prc, alg, data)
+
+    # Length of the epochs, between tepoch_min and tepoch_max (fixed by
+    # default)
+    sched = epochScheduler.EpochScheduler(config['tepoch'],
+            tmin=config.get('tepoch_min', None),
+            tmax=config.get('tepoch_max', None))
+
+    # Epochs, L3 occupancy multiplexing, watchdogs and finished jobs
+    ctrl = controller.Controller(prc, alg, config['threads'],
+            config['tepoch'], onEpoch=onEpoch,
+            workers=config.get('workers', 2), scheduler=sched)
+    ctrl.run()
+
+    trace.close()
+    if rec is not None:
+        rec.close()
+    if trace.dropped() > 0:
+        sys.stderr.write("Trace records dropped: {}\n".format(
+            trace.dropped()))
+        sys.stderr.flush()
+    return ctrl
 
 def loop(config, runCore):
     """
@@ -137,10 +204,16 @@ def loop(config, runCore):
     #   'cmd': 'command file with the applications to run',
     #   'alg': 'management algorithm to use,
     #   'tepoch': 'time epoch',
+    #   'msr': 'dev' (/dev/cpu/*/msr) or 'sim' (simulated device),
     # }
+    if config.get('msr', 'dev') == 'sim':
+        # Simulated MSR device, Balancer can run without the hardware
+        msr.setBackend(simMSR.SimMSR(config['threads'] + [runCore],
+            ccx=config.get('ccx_size', 4),
+            workloads={runCore: simMSR.SimWorkload.idle()}))
+
     cmd = readCMD(config['cmd'])
     tepoch = config['tepoch']
-    flog = config['file_log']
     hwcg = {}
 
     # Start class
@@ -148,7 +221,8 @@ def loop(config, runCore):
 
     # Allocate 0 ways to the management core to avoid pollute another running
     # process
-    prc.pqos().l3Allocation(True, 5, 0x0, runCore)
+    runCOS = prc.topology().cos(runCore)
+    prc.pqos().l3Allocation(True, runCOS, 0x0, runCore)
 
     for core in config['threads']:
         # Configure and launch the processes
@@ -156,23 +230,8 @@ def loop(config, runCore):
         prc.launch(core, init=True)
         hwcg[core] = prc.readHWC(core)
 
-    # Start watchdogs
-    watchdog = threading.Thread(target=prc.startWatchdog)
-    watchdog.start()
-    # Start watchdog l3 monitor
-    watchdog_l3 = threading.Thread(target=prc._updateL3Monitor)
-    watchdog_l3.start()
-    # Start management algorithm
-    algTh = threading.Thread(target=alg, args=(open(flog, 'w+'), prc, config,))
-    algTh.start()
-
-    while not prc.isEnd():
-        # Wait until the process end and launch the next process
-        (pid, _) = os.wait()
-
-        core = prc.printInfo(pid)
-        if core != -1:
-            prc.launch(core) 
+    # Run the controller until the experiment finishes
+    ctrl = alg(prc, config)
 
     sys.stderr.write("End main program\n")
     sys.stderr.flush()
@@ -182,9 +241,31 @@ def loop(config, runCore):
         prc.pqos().reset(core)
 
     # Remove constrain of schedule core
-    prc.pqos().l3Allocation(False, 1, 0x0, runCore)
+    prc.pqos().l3Allocation(False, runCOS, 0x0, runCore)
+
+    prc.pqos().close()
+
+    stats = prc.pqos().stats()
+    sys.stderr.write("PQOS writes: {} elided: {} commits: {}\n".format(
+        stats['writes'], stats['elided'], stats['commits']))
+    sys.stderr.write("{}\n".format(timedLock.report()))
+    sys.stderr.write("{}\n".format(ctrl.report()))
+    l3 = prc.l3Multiplexer().stats()
+    sys.stderr.write("L3 occupancy samples: {} empty: {} switches: {}\n"\
+            .format(l3['samples'], l3['empty'], l3['switches']))
+    count, mean, maxx = prc.launchLatency()
+    sys.stderr.write("Launches: {} spawn mean {:.3f} ms max {:.3f} ms\n"\
+            .format(count, mean * 1000, maxx * 1000))
+    sys.stderr.flush()
+
+    # Close the MSR devices
+    msr.close()
 
 if __name__ == "__main__":
+    if sys.version_info < (3, 7):
+        # asyncio.run (controller)
+        sys.stderr.write("Balancer needs Python 3.7 or newer\n")
+        exit(1)
     if len(sys.argv) < 3:
         # Arguments to launch the scheduler
         sys.stderr.write("main.py [config file] [schedule core]") 
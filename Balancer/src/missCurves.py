@@ -0,0 +1,281 @@
+#!/usr/bin/python3
+"""
+Sensitivity curves of the benchmarks to the LLC ways, from the outputs of the
+Characterization sweeps (Characterization/LLC and Characterization/BW).
+
+Every sweep point is a <mask>.out (LLC) or <mask>-Triads_<k>.out (BW) file in
+the directory of its benchmark (e.g. out/505.mcf_r.1/0xFF00-Triads_0.out)
+with the "name: value" lines of lib/py/hwCounters.py. The curves of each
+benchmark are indexed by the number of ways of the mask (0 to WAYS):
+    * ipc : instructions per cycle
+    * mpki : L3 misses per kilo instruction
+    * mpkc : L3 misses per kilo cycle (mpki * ipc), the misses of the job in
+            the same time at every allocation
+The ways that were not measured are interpolated. The curves can also be
+loaded from a database of profileDB (a file instead of a directory).
+
+A running job is matched to a curve by the name of its executable (e.g.
+"./mcf_r inp.in" is 505.mcf_r, the curves of all its inputs are averaged) or,
+when no benchmark matches, by the closest MPKI at the ways that it has
+(fit). lookahead() splits the ways of a CCX among its jobs with the
+lookahead algorithm of UCP (Qureshi and Patt, MICRO 2006).
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import numpy as np
+import jobSpec
+import profileDB
+
+def lookahead(curves, ways, minWays=1):
+    """
+    Split the ways among several jobs minimizing the misses (UCP lookahead):
+    while there are free ways, the job with the highest marginal utility
+    (misses saved per way over any number of extra ways) gets the ways of
+    its best step.
+
+    Parameters:
+        - curves : list with the miss curve of each job (misses indexed by
+                ways, 0 to ways) or None for the jobs without curve (they
+                only get minWays)
+        - ways : ways to split
+        - minWays : ways of every job at least
+
+    Return : list with the ways of each job
+    """
+    alloc = [minWays] * len(curves)
+    free = ways - minWays * len(curves)
+    while free > 0:
+        best, winner, step = 0., None, 0
+        for i, curve in enumerate(curves):
+            if curve is None:
+                continue
+            for k in range(1, free + 1):
+                mu = (curve[alloc[i]] - curve[alloc[i] + k]) / k
+                if mu > best:
+                    best, winner, step = mu, i, k
+        if winner is None:
+            # Nobody saves misses with more ways
+            break
+        alloc[winner] += step
+        free -= step
+    if free > 0 and len(curves) > 0:
+        # The unused ways go to the job that misses more
+        last = lambda i: curves[i][alloc[i]] if curves[i] is not None else 0
+        alloc[max(range(0, len(curves)), key=last)] += free
+    return alloc
+
+class MissCurves:
+    """
+    Class with the curves of the characterized benchmarks
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _ways = None # Ways of the LLC
+    _ipc = None # IPC curve of each benchmark (name -> array)
+    _mpki = None # MPKI curve of each benchmark (name -> array)
+    _byExe = None # Benchmarks of each executable (exe -> names)
+    _cache = None # Match of each command (command -> benchmarks)
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, path=None, ways=16, triads=0):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - path : (optional) directory with the outputs of the sweeps
+            - ways : ways of the LLC
+            - triads : interference level (Triads_<k>) of the BW sweeps
+        """
+        self._ways = ways
+        self._ipc = {}
+        self._mpki = {}
+        self._byExe = {}
+        self._cache = {}
+        if path is not None:
+            self.load(path, triads=triads)
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _interpolate(self, points):
+        """
+        Return the curve (0 to ways) of a list of (ways, value), NaN if there
+        are no points
+        """
+        curve = np.full(self._ways + 1, np.nan)
+        if len(points) == 0:
+            return curve
+        points = sorted(points)
+        x = np.array([i for i, _ in points], dtype=np.float64)
+        y = np.array([i for _, i in points], dtype=np.float64)
+        return np.interp(np.arange(0, self._ways + 1), x, y)
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def add(self, name, ipc, mpki):
+        """
+        Add the curves of a benchmark
+
+        Parameters:
+            - name : benchmark (<number>.<exe>.<input>, e.g. 505.mcf_r.1)
+            - ipc : list of (ways, IPC)
+            - mpki : list of (ways, MPKI)
+        """
+        self._ipc[name] = self._interpolate(ipc)
+        self._mpki[name] = self._interpolate(mpki)
+        parts = name.split('.')
+        exe = parts[1] if len(parts) > 1 else parts[0]
+        self._byExe.setdefault(exe, [])
+        if name not in self._byExe[exe]:
+            self._byExe[exe].append(name)
+        self._cache = {}
+
+    def loadDB(self, db, triads=0):
+        """
+        Load the curves of a profile database
+
+        Parameters:
+            - db : profileDB.ProfileDB object
+            - triads : interference level of the BW sweeps
+        """
+        for bench, inp in db.benchmarks():
+            ways, ipc = db.ipcVsWays(bench, inp, triads=triads)
+            mways, mpki = db.mpkiVsWays(bench, inp, triads=triads)
+            valid = (ways > 0) & (ways <= self._ways)
+            mvalid = (mways > 0) & (mways <= self._ways)
+            if np.any(valid):
+                self.add("{}.{}".format(bench, inp), list(zip(ways[valid],
+                    ipc[valid])), list(zip(mways[mvalid], mpki[mvalid])))
+
+    def load(self, path, triads=0):
+        """
+        Load the outputs of the sweeps of a directory tree or a profile
+        database
+
+        Parameters:
+            - path : directory (out of the LLC or BW sweeps) or database
+            - triads : interference level of the BW sweeps
+        """
+        if os.path.isfile(path):
+            db = profileDB.ProfileDB(path)
+            try:
+                self.loadDB(db, triads=triads)
+            finally:
+                db.close()
+            return
+        for root, _, files in os.walk(path):
+            ipc, mpki = [], []
+            for name in files:
+                match = profileDB.OUTFILE.match(name)
+                if match is None:
+                    continue
+                if match.group(2) is not None and int(match.group(2)) != \
+                        triads:
+                    continue
+                ways = bin(int(match.group(1), 16)).count('1')
+                if ways == 0 or ways > self._ways:
+                    # Without allocation
+                    continue
+                values = profileDB.parseOut(os.path.join(root, name))
+                ins = values.get('Instr Retired', 0)
+                cyc = values.get('Cycles', 0)
+                if ins <= 0 or cyc <= 0:
+                    continue
+                ipc.append((ways, ins / cyc))
+                if 'L3Miss' in values:
+                    mpki.append((ways, values['L3Miss'] / (ins / 1000)))
+            if len(ipc) > 0:
+                self.add(os.path.basename(root), ipc, mpki)
+
+    def names(self):
+        """
+        Return the list of benchmarks
+        """
+        return sorted(self._ipc)
+
+    def curve(self, name, metric='mpki'):
+        """
+        Return the curve (0 to ways) of a benchmark
+
+        Parameters:
+            - name : benchmark
+            - metric : ipc, mpki or mpkc
+        """
+        if metric == 'mpkc':
+            return self._mpki[name] * self._ipc[name]
+        return self._mpki[name] if metric == 'mpki' else self._ipc[name]
+
+    def match(self, command):
+        """
+        Return the curves that match the executable of a command, a list of
+        benchmarks (empty if none matches)
+
+        Parameters:
+            - command : command of the job (sh syntax)
+        """
+        if command not in self._cache:
+            spec = jobSpec.parse(command)
+            argv = spec['argv']
+            if spec['shell']:
+                # Shell command, its first word
+                argv = argv[2].split()
+            exe = os.path.basename(argv[0]) if len(argv) > 0 else ''
+            self._cache[command] = list(self._byExe.get(exe, []))
+        return self._cache[command]
+
+    def matchCurve(self, command, metric='mpki'):
+        """
+        Return the average curve of the benchmarks that match a command,
+        None if none matches
+
+        Parameters:
+            - command : command of the job
+            - metric : ipc, mpki or mpkc
+        """
+        names = self.match(command)
+        if len(names) == 0:
+            return None
+        return np.nanmean([self.curve(i, metric) for i in names], axis=0)
+
+    def fit(self, ways, mpki):
+        """
+        Return the benchmark with the closest MPKI (logarithmic distance) at
+        the given ways, None if there are no curves
+
+        Parameters:
+            - ways : ways of the job
+            - mpki : MPKI measured
+        """
+        best, dist = None, float('inf')
+        value = np.log(max(mpki, 1e-3))
+        for name in self._mpki:
+            ref = self._mpki[name][ways]
+            if np.isnan(ref):
+                continue
+            d = abs(np.log(max(ref, 1e-3)) - value)
+            if d < dist:
+                best, dist = name, d
+        return best
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed. A streaming job, a cache
+    # friendly job and a job that does not use the cache share a CCX.
+    curves = MissCurves()
+    w = range(1, 17)
+    curves.add('470.lbm.1', [(i, .5) for i in w], [(i, 30.) for i in w])
+    curves.add('429.mcf.1', [(i, .2 + .05 * i) for i in w],
+            [(i, 40. / i) for i in w])
+    curves.add('999.tiny.1', [(i, 2.) for i in w], [(i, .1) for i in w])
+    print(curves.names(), curves.match("./mcf inp.in > out 2>&1"),
+            curves.match("cd /tmp && ./lbm 3000 reference.dat"))
+    print("Fit 12 MPKI at 4 ways: {}".format(curves.fit(4, 12.)))
+    jobs = [curves.matchCurve(i) for i in ["./lbm", "./mcf inp.in", "./tiny",
+        "./unknown"]]
+    print("Ways: {}".format(lookahead(jobs, 16)))
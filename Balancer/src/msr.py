@@ -5,6 +5,11 @@ API function to read / write MSR Register.
 This API is tested to work on GNU/Linux using msr. Please, install and load
 msr module to use it.
 
+The MSR device of every CPU is opened only once (the first time that the CPU
+is accessed) and the file descriptor is kept open until close() is called.
+Reads and writes use positional I/O (pread/pwrite), so every access costs
+only one syscall instead of open + lseek + read/write + close.
+
 More information can be found at:
 * MAN pages
 * Ubuntu Manuals (https://manpages.ubuntu.com/manpages/trusty/man4/msr.4.html)
@@ -14,53 +19,141 @@ More information can be found at:
 @EMAIL: agusnt (at) unizar (dot) es
 @DATE: 21/04/2020
 @UPDATES:
+    Persistent file descriptor pool with pread/pwrite
+    Reads of many registers into NumPy buffers (readMany)
+    Pluggable backends (setBackend), see simMSR.py for a simulated device
 """
 import os
 import struct
+import atexit
+import numpy as np
+from threading import Lock
+
+# Path of the MSR device, {} is replaced by the cpu number
+MSR_DEV = "/dev/cpu/{}/msr"
+
+# Pool of open file descriptors (cpu -> fd)
+_fds = {}
+_mutex = Lock()
+
+def _getFD(cpu):
+    """
+    Return the file descriptor of the MSR device of the given CPU, the device
+    is opened the first time that the CPU is accessed.
+
+    Parameters :
+        cpu : cpu number
+
+    Return :
+        File descriptor
+    """
+    fd = _fds.get(cpu)
+    if fd is None:
+        with (_mutex):
+            # Other thread can open the device while we wait for the mutex
+            fd = _fds.get(cpu)
+            if fd is None:
+                fd = os.open(MSR_DEV.format(cpu), os.O_RDWR)
+                _fds[cpu] = fd
+    return fd
 
 def readMSR (cpu, reg):
     """
     Read the given MSR in the given CPU.
 
-    Parameters : 
+    Parameters :
         cpu : cpu number
         reg : msr register
 
     Return :
         Reading value
     """
-    dmsr = "/dev/cpu/{}/msr".format(cpu)
-    # Open the MSR interface
-    f = os.open(dmsr, os.O_RDONLY)
-    # Seek the MSR register
-    os.lseek(f, reg, os.SEEK_SET)
-    # Read the register
-    value = struct.unpack('Q', os.read(f, 8))[0]
-    # Close file descriptor
-    os.close(f)
-
-    return value
+    return struct.unpack('Q', os.pread(_getFD(cpu), 8, reg))[0]
 
 def writeMSR (cpu, reg, value):
     """
     Write the given MSR in the given CPU.
 
-    Parameters : 
+    Parameters :
         cpu : cpu number
         reg : msr register
         value : value to write into the msr
     """
-    dmsr = "/dev/cpu/{}/msr".format(cpu)
-    # Open the MSR interface
-    f = os.open(dmsr, os.O_WRONLY)
-    # Seek the MSR register
-    os.lseek(f, reg, os.SEEK_SET)
-    # Read the register
-    os.write(f, struct.pack('Q', value))
-    # Close file descriptor
-    os.close(f)
-
-    return 
+    os.pwrite(_getFD(cpu), struct.pack('Q', value), reg)
+
+    return
+
+def readMany(cpus, regs, out=None):
+    """
+    Read a set of MSRs in a set of CPUs. The values are written directly into
+    a NumPy buffer, so no Python integer is created for each read value.
+
+    NOTE: it is not a batched read, there is still one pread per value. The
+    msr driver reads only one register per call (a read of more than 8 bytes
+    returns the same register again) and it has no batch ioctl, so registers
+    can not be grouped. It only saves the int object and the struct.unpack of
+    each value, the raw values are copied to the buffer at once.
+
+    Parameters :
+        cpus : list of cpu numbers
+        regs : msr registers to read, a list (the same registers in all the
+            cpus) or a matrix with one row of registers per cpu
+        out : (optional) preallocated uint64 matrix (cpus x registers) where
+            the values are written
+
+    Return :
+        uint64 matrix (cpus x registers) with the values read
+    """
+    regs = np.asarray(regs, dtype=np.uint64)
+    if regs.ndim == 1:
+        regs = np.broadcast_to(regs, (len(cpus), regs.shape[0]))
+    if out is None:
+        out = np.empty(regs.shape, dtype=np.uint64)
+
+    raw = []
+    for row, cpu in enumerate(cpus):
+        fd = _getFD(cpu)
+        raw.extend([os.pread(fd, 8, reg) for reg in regs[row].tolist()])
+    out.reshape(-1)[:] = np.frombuffer(b''.join(raw), dtype=np.uint64)
+
+    return out
+
+def close():
+    """
+    Close all the open MSR devices. The devices will be opened again if they
+    are accessed after this call.
+    """
+    with (_mutex):
+        for cpu in list(_fds):
+            os.close(_fds.pop(cpu))
+
+# Do not leak file descriptors if the user forgets to call close
+atexit.register(close)
+
+# Functions of the /dev/cpu/*/msr backend
+_DEVICE = (readMSR, writeMSR, readMany, close)
+
+def setBackend(backend=None):
+    """
+    Replace the functions of this module with the ones of the given backend.
+    Every module that uses msr.readMSR, msr.writeMSR, msr.readMany or
+    msr.close is redirected to the backend, so the rest of Balancer does not
+    need to know which one is used.
+
+    Parameters :
+        backend : object with readMSR, writeMSR, readMany and close methods
+            (same signature than the functions of this module). None restores
+            the /dev/cpu/*/msr backend.
+    """
+    global readMSR, writeMSR, readMany, close
+
+    if backend is None:
+        readMSR, writeMSR, readMany, close = _DEVICE
+    else:
+        readMSR = backend.readMSR
+        writeMSR = backend.writeMSR
+        readMany = backend.readMany
+        close = backend.close
 
 if __name__ == '__main__':
     # NOTE: An small test, ad-hoc developed. So there is high probabilities that
@@ -71,3 +164,4 @@ if __name__ == '__main__':
     print("Write 0x5300c0")
     writeMSR(0, 0xC0010202, 0x5300c0)
     print("2st Read 0x{:02x}".format(readMSR(0, 0xC0010202)))
+    close()
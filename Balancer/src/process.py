@@ -2,24 +2,27 @@
 """
 Function to control process flow in an easy way
 
-Requirements:
-    - psutil library
-
 @AUTHOR: Navarro Torres, Agustín
 @EMAIL: agusnt (at) unizar (dot) es
 @DATE: 23/06/2020
 @UPDATES:
 """
 import HWCounters
-import subprocess
-import psutil
+import timedLock
+import topology
+import snapshot
+import numpy as np
 import PQOS
+import resctrl
+import childWatcher
+import jobSpec
+import cpuSampler
+import watchdog
+import l3Multiplexer
 import sys
-import os
-from time import time, sleep
-from threading import Lock
+from time import time, sleep, monotonic, perf_counter
 from pprint import pprint
-from math import gcd
+from math import gcd, sqrt
 
 class Process:
     """
@@ -27,8 +30,12 @@ class Process:
     Also it works as a watchdog to monitor if any core has no job or is shared 
     among multiple jobs.
 
-    One lock is used to ensure mutual exclusion and that no interferences arise
-    between the watchdogs and the other process.
+    Locks are fine-grained so the counter sampling, the occupancy multiplexing
+    and the job launches do not serialize against each other:
+        * _jobMutex : jobs bookkeeping (_dicPid, _endCores, _limits and the
+                global L3 misses).
+        * _ccxMutex : one per CCX, L3 occupancy values of its cores.
+    The hardware counters are read without any lock.
 
     """
     ###########################################################################
@@ -37,6 +44,7 @@ class Process:
     _th = None
     _cmd = None
     _hwc = None
+    _topo = None
     _end = False
     _pqos = None
     _watchdog = None
@@ -46,8 +54,25 @@ class Process:
     _l3Iter = None
     _l3Occupancy = None
     _endCores = None
-    _mutex = None
+    _jobMutex = None
+    _ccxMutex = None
+    _ccxOf = None
+    _gen = None
+    _ccxGen = None
+    _genStart = None
+    _ccxStart = None # Time when the shared counters of each CCX were reset
     _limits = None
+    _watcher = None # Notification of the end of the jobs
+    _procs = None # Popen object of each job (pid -> Popen)
+    _specs = None # Parsed command of each core (jobSpec.parse)
+    _launchLat = None # Spawn latency: [count, sum, max] (seconds)
+    _cpuLoad = None # Busy fraction of the cpus (cpuSampler)
+    _jobEnd = None # Time of the end of the last job of each core
+    _jobStat = None # /proc/<pid>/stat of each job (pid -> watchdog.JobStat)
+    _freq = None # Effective frequency of the threads (watchdog.FreqMeter)
+    _l3Mux = None # Scheduler of the L3 occupancy monitors
+    _ccxs = None # Threads of each CCX
+    _mbm = None # Read MBM counters (None if disabled)
 
     ###########################################################################
     # Not override functions
@@ -55,29 +80,87 @@ class Process:
     def __init__(self, cmd, config):
         self._cmd = cmd
         self._th = config['threads']
-        self._hwc = HWCounters.HWCounters(config['hwCounters'])
-        self._pqos = PQOS.PQOS()
+        # The simulated MSR device uses the fallback layout (CCXs of
+        # ccx_size consecutive cpus)
+        sysfs = None if config.get('msr', 'dev') == 'sim' else \
+                config.get('sysfs', '/sys/devices/system/cpu')
+        self._topo = topology.Topology(sysfs,
+                ccxSize=config.get('ccx_size', 4),
+                ccxPerCcd=config.get('ccx_per_ccd', None))
+        self._hwc = HWCounters.HWCounters(config['hwCounters'], cpus=self._th,
+                topo=self._topo)
+        if config.get('pqos', 'msr') == 'resctrl':
+            # PQOS through the resctrl filesystem
+            self._pqos = resctrl.Resctrl(config.get('resctrl_dir',
+                '/sys/fs/resctrl'), topo=self._topo)
+        else:
+            self._pqos = PQOS.PQOS(mbmWidth=config.get('mbm_width', 24),
+                    topo=self._topo, mbmPeak=config.get('mbm_peak', 8))
         self._gMPKI3 = {}
         self._mMPKI3 = {}
         self._dicPid = {}
         self._l3Iter = {}
         self._l3Occupancy = {}
-        self._endCores = []
-        self._mutex = Lock()
+        self._endCores = {}
+        self._jobMutex = timedLock.TimedLock("jobs")
+        self._ccxMutex = []
+        self._ccxOf = {}
+        # Job generation of each core and of the shared counters of each CCX.
+        # They are odd while the counters are being reset.
+        self._gen = {}
+        self._ccxGen = []
+        self._genStart = {}
+        self._ccxStart = []
         self._lastL3 = {}
         self._lastL3Iter = {}
+        self._lastL3M2 = {}
         self._limits = {}
+        self._procs = {}
+        self._specs = {}
+        self._launchLat = [0, 0., 0.]
+        self._jobEnd = {}
+        # The load of the cpus is sampled in background, nobody sleeps to
+        # measure it
+        self._cpuLoad = cpuSampler.CPUSampler(period=config.get('cpu_period',
+            .05), window=config.get('cpu_window', .2))
+        self._cpuLoad.start()
+        self._jobStat = {}
+        self._freq = watchdog.FreqMeter(self._th, base=config.get('base_freq',
+            2000))
+        # The jobs are watched since their launch, the controller attaches
+        # the watcher to its event loop
+        self._watcher = childWatcher.ChildWatcher()
+
+        # One lock per CCX
+        ccxs = [cpus for _, cpus in self._topo.group(self._th, 'ccx')]
+        self._ccxs = ccxs
+        for cpus in ccxs:
+            for i in cpus:
+                self._ccxOf[i] = len(self._ccxMutex)
+            self._ccxMutex.append(timedLock.TimedLock("ccx"))
+            self._ccxGen.append(0)
+            self._ccxStart.append(monotonic())
+        self._l3Mux = l3Multiplexer.L3Multiplexer(ccxs,
+                rate=config.get('l3_rate', 10),
+                settle=config.get('l3_settle', .0005))
+        # Last two reads (time, total bytes, local bytes) of the MBM
+        # counters of each thread
+        if config.get('mbm', True):
+            self._mbm = {i: [] for i in self._th}
 
         # Initialize structures to measure global MPKI3
         for i in self._th:
+            self._gen[i] = 0
+            self._genStart[i] = monotonic()
             self._hwc.start(i)
-            self._endCores.append(False)
+            self._endCores[i] = False
             self._gMPKI3[i] = {}
             self._mMPKI3[i] = {}
             self._l3Occupancy[i] = 0
             self._l3Iter[i] = 1
             self._lastL3[i] = 0
             self._lastL3Iter[i] = 1
+            self._lastL3M2[i] = 0
             self._pqos.reset(i)
             self._limits[i] = {'None': 0, 'LLC': 0, 'BW': 0, 'LLCBW': 0, 
                     'Total': 0}
@@ -97,46 +180,47 @@ class Process:
             - minFreq : minimal cpu frequenc, below this value a failure is 
                     detected.
         """
-        freq = psutil.cpu_freq(percpu=True)
-        with (self._mutex):
-            # Test that they are not two or more process running in the same 
-            # logical thread
-            for i in self._dicPid:
-                try:
-                    # Get the PID of the process
-                    p = psutil.Process(i).children(recursive = True)[-1]
-                    # Get the CPU utilization of the process
-                    cpu = p.cpu_percent(interval=.001) 
-                    # Get the affinity of the core
-                    affinity = p.cpu_affinity() 
-
-                    if cpu > 10 and cpu < 70:
-                        # We set that a thread is sharing its logical thread if is
-                        # using less than 70% of CPU. This script is developed to
-                        # launch CPU-intensive workloads.
-                        sys.stderr.write("({:.2f}) [Watchdog Process] {} -- {}\n"\
-                                .format(time(), affinity, cpu))
-                        sys.stderr.flush()
-                        pass
-
-                except:
-                    # A process can be in the dictionary but die before get its
-                    # information. If that happen an exception will be raise.
-                    pass
-
-            # We get the frequency of all cores and compare it with the base
-            # frequency of the process. If an signification amount of logical
-            # threads have a low freq (three o more time consecutively) we can
-            # assume that something happens and the script is not launched 
-            # process to that core.
-            #
-            # Q: One warning means that there is a problem?
-            # A: No, because we can measure the frequency in a bad moment like 
-            # when a process die and we does not launch a new one.
-            for i in self._th:
-                if freq[i][0] < minFreq:
-                    sys.stderr.write("({:.2f}) [Watchdog Freq] {} -- {} MHz\n"\
-                            .format(time(), i, freq[i][0]))
+        with (self._jobMutex):
+            jobs = [(self._dicPid[i][0], self._jobStat[i]) for i in \
+                    self._dicPid if i in self._jobStat]
+
+        # Test that they are not two or more process running in the same 
+        # logical thread
+        for core, stat in jobs:
+            # CPU utilization of the job since the last watchdog and the cpu
+            # where it ran last (None if it already finished)
+            value = stat.sample()
+            if value is None:
+                continue
+            cpu, last = value
+
+            if cpu > .1 and cpu < .7:
+                # We set that a thread is sharing its logical thread if is
+                # using less than 70% of CPU. This script is developed to
+                # launch CPU-intensive workloads.
+                sys.stderr.write("({:.2f}) [Watchdog Process] {} -- {:.0f}\n"\
+                        .format(time(), core, cpu * 100))
+                sys.stderr.flush()
+            if last != core:
+                # The job is not in its thread (affinity changed)
+                sys.stderr.write("({:.2f}) [Watchdog Process] {} -- running "\
+                        "in {}\n".format(time(), core, last))
+                sys.stderr.flush()
+
+        # We get the frequency of all cores and compare it with the base
+        # frequency of the process. If an signification amount of logical
+        # threads have a low freq (three o more time consecutively) we can
+        # assume that something happens and the script is not launched 
+        # process to that core.
+        #
+        # Q: One warning means that there is a problem?
+        # A: No, because we can measure the frequency in a bad moment like 
+        # when a process die and we does not launch a new one.
+        freq = self._freq.read()
+        for i, f in zip(self._th, freq):
+            if f < minFreq:
+                sys.stderr.write("({:.2f}) [Watchdog Freq] {} -- {:.0f} MHz\n"\
+                        .format(time(), i, f))
                 sys.stderr.flush()
 
     def _watchdogCPU(self):
@@ -146,15 +230,16 @@ class Process:
         multiple error in a short-term time (example 3 notifications in 5
         seconds) you should assume that the schedule is not working well.
         """
-        with (self._mutex):
-            utility = psutil.cpu_percent(interval=.05, percpu=True)
+        with (self._jobMutex):
             for i in self._th:
                 # Iterate over all the logical cores and test if each one of them is
                 # loaded. In the wort case it's take less than 1 second to detect
-                # a dead logical core. Because of cpu_percent function we don't have
-                # to do an sleep, this function already block and sleep
+                # a dead logical core. The load is the one sampled since the
+                # launch of the job (at most the sampler window), it is read
+                # without sleeping.
+                utility = self._cpuLoad.busy(i, since=self._genStart[i])
 
-                if (utility[i] < 50):
+                if (utility < .5):
                     # One logical thread is no used
                     #sys.stderr.write("({:.2f}) [Watchdog CPU] {}\n"\
                     #        .format(time(), i))
@@ -168,61 +253,30 @@ class Process:
                         return False, i
             return None
 
-    def _updateL3Monitor(self, tsleep=0.0005, tsleep_middle=.2):
+    def _updateL3Monitor(self):
         """
         Read L3 Occupancy of all cores.
 
         Because the AMD Rome only allows to measure the LLC occupancy of one 
-        CCX core at time, we must to multiplex the hw counter.
-
-        Parameters : 
-            - tsleep: seconds to wait before change the hardware counter from one 
-                    CCX Core to another.
-            - tsleep_middle: seconds to sleep between llc updates. The hardware
-                    counters return the actual occupancy value. S
+        CCX core at time, we must to multiplex the hw counter. The thread
+        sampled in each CCX is selected by the l3Multiplexer, at its rate.
         """
 
         sys.stderr.write("Init updater L3\n")
         sys.stderr.flush()
+        period = 1 / self._l3Mux.rate()
         while not self._end:
-            sleep(tsleep_middle)
-            with (self._mutex):
-                for idx in range(0, 4):
-                    for jdx in range(0, len(self._th), 4):
-                        # Get the thread to monitor each CCX
-                        thread = self._th[idx + jdx]
-                        # Enable L3 Counter on the CCX
-                        self._pqos.l3Occupancy(True, thread)
-
-                    # Sleep before readint the value
-                    sleep(tsleep)
-
-                    for jdx in range(0, len(self._th), 4):
-                        thread = self._th[idx + jdx]
-
-                        # Read the actual L3 occupancy
-                        value = 0
-                        retry = 0
-                        while value == 0 and retry < 10:
-                            value = (self._pqos.l3OccupancyRead(thread))
-                            retry += 1
-
-                        # Calculate the mean using Welford's Method in order to 
-                        # avoid using big data structures in memory
-
-                        # L3 Occupancy of the instances' live
-                        self._l3Occupancy[thread] = self._l3Occupancy[thread] \
-                                + ((value - self._l3Occupancy[thread]) \
-                                / self._l3Iter[thread])
-
-                        # L3 occupancy that can be reset by the user
-                        self._lastL3[thread] = self._lastL3[thread] \
-                                + ((value - self._lastL3[thread]) \
-                                / self._lastL3Iter[thread])
-
-                        # Increase number of iteration used
-                        self._lastL3Iter[thread] += 1
-                        self._l3Iter[thread] += 1
+            sleep(period)
+            threads, enable = self._l3Mux.pick()
+            if len(enable) > 0:
+                # Enable L3 Counter on the CCXs that change its thread
+                self.l3MonitorEnable(enable)
+
+                # Sleep before readint the value (without any lock held)
+                sleep(self._l3Mux.settle())
+
+            self.l3MonitorPublish(threads)
+            self.l3MonitorMBM(threads)
 
         sys.stderr.write("Finish Update L3\n")
         sys.stderr.flush()
@@ -230,8 +284,8 @@ class Process:
     def _readHWC(self, core, l3g=False):
         """
         Read all hw counters and return their value in a dictionary. This
-        function doesn't acquire/release mutex, so you must be careful when use
-        it.
+        function doesn't acquire/release mutex, if l3g is true the caller must
+        hold _jobMutex.
 
         Parameters :
             - core : core where the application is executed
@@ -242,9 +296,9 @@ class Process:
         accMPKI3 = 0
 
         if l3g:
+            idx = self._hwc.index('L3Miss')
             for i in self._th:
-                dicHWC = self._hwc.readValues(i)
-                value = dicHWC['L3Miss']
+                value = self._hwc.readCounter(i, idx)
 
                 if i != core:
                     # MPKI3 from another core
@@ -261,7 +315,8 @@ class Process:
                     accMPKI3 += value
 
             dicHWCRes['L3Miss Global'] = accMPKI3
-        dicHWCRes['L3Occupancy (KB)'] = self._l3Occupancy[core] / 1024 
+        with (self._ccxMutex[self._ccxOf[core]]):
+            dicHWCRes['L3Occupancy (KB)'] = self._l3Occupancy[core] / 1024 
 
         return dicHWCRes
 
@@ -274,6 +329,13 @@ class Process:
         """
         return self._end
 
+    def stop(self):
+        """
+        Finish the watchdogs, the L3 monitor and the cpu load sampler
+        """
+        self._end = True
+        self._cpuLoad.stop()
+
     def startWatchdog(self, timeCPU=20, timeProcess=5000):
         """
         Function to manage watchdog in one function with sleeps
@@ -294,27 +356,182 @@ class Process:
             sleep(div / 1000)
             if ((t[0] * div) == timeCPU):
                 # Launch CPU watchdog
-                value = self._watchdogCPU()
-                if value:
-                    # A CPU is not running a process
-                    val, pid = value
-                    if val:
-                        # Print end information of the death instance
-                        core = self.printInfo(pid)
-                        if core >= 0:
-                            # Launch a new process in the given core
-                            self.launch(core)
-                    else:
-                        self.launch(pid) # pid == core (special case)
+                self.checkCPU()
                 t = (0, t[1])
             if ((t[1] * div)) == timeProcess:
                 # Launch Process Watchdog
-                pid = self._watchdogProcess()
+                self.checkProcess()
                 t = (t[0], 0)
             t = (t[0] + 1, t[1] + 1)
         sys.stderr.write("Finish Watchdog\n")
         sys.stderr.flush()
 
+    def checkCPU(self, reap=True):
+        """
+        Run the CPU watchdog once and launch a new job in the cores without
+        one
+
+        Parameters :
+            - reap : assume that the job of an idle core finished and launch
+                    the next one. Without it (the end of the jobs is notified
+                    by the child watcher) only a warning is written.
+        """
+        value = self._watchdogCPU()
+        if value:
+            # A CPU is not running a process
+            val, pid = value
+            if val and not reap:
+                sys.stderr.write("({:.2f}) [Watchdog CPU] {} idle\n"\
+                        .format(time(), pid))
+                sys.stderr.flush()
+            elif val:
+                # Print end information of the death instance
+                core = self.printInfo(pid)
+                if core >= 0:
+                    # Launch a new process in the given core
+                    self.launch(core)
+            else:
+                self.launch(pid) # pid == core (special case)
+
+    def checkProcess(self):
+        """
+        Run the Process watchdog once
+        """
+        self._watchdogProcess()
+
+    def jobExit(self, pid, code=None, rusage=None):
+        """
+        A child finished: print its information and launch the next job in
+        its core
+
+        Parameters :
+            - pid : pid of the finished child
+            - code : (optional) exit code of the child
+            - rusage : (optional) resource usage of the child
+        """
+        core = self.printInfo(pid, code, rusage)
+        if core != -1:
+            self.launch(core)
+
+    def childWatcher(self):
+        """
+        Return the childWatcher.ChildWatcher object with the launched jobs
+        """
+        return self._watcher
+
+    def l3MonitorMBM(self, current):
+        """
+        Read the MBM counters (total and local) of every thread, each
+        counter must be read before it wraps (1 GiB with 24 bits).
+
+        Parameters :
+            - current : threads with the L3 occupancy monitor enabled, it is
+                    enabled again if their MBM counters are read
+        """
+        if self._mbm is None:
+            return
+        for cpus in self._ccxs:
+            for thread in cpus:
+                total = self._pqos.mbmRead(thread)
+                local = self._pqos.mbmRead(thread, local=True)
+                t = monotonic()
+                if thread in current:
+                    self._pqos.l3Occupancy(True, thread)
+
+                with (self._ccxMutex[self._ccxOf[thread]]):
+                    if total is None or local is None:
+                        # No MBM support or the counter could have wrapped
+                        # since the last read
+                        self._mbm[thread] = []
+                    else:
+                        self._mbm[thread] = self._mbm[thread][-1:] + [(t,
+                            total, local)]
+
+    def getMBM(self, cores):
+        """
+        Get the memory bandwidth (GiB/s) of the cores between their two last
+        reads of the MBM counters
+
+        Parameters :
+            - cores : list of cores
+
+        Return : dictionary core -> (total, local), NaN if there are not two
+            reads since the launch of the job (or MBM is disabled)
+        """
+        values = {}
+        for i in cores:
+            values[i] = (float('nan'), float('nan'))
+            if self._mbm is None:
+                continue
+            with(self._ccxMutex[self._ccxOf[i]]):
+                samples = self._mbm[i]
+                if len(samples) == 2 and samples[1][0] > samples[0][0]:
+                    (t0, tot0, loc0), (t1, tot1, loc1) = samples
+                    values[i] = ((tot1 - tot0) / (1 << 30) / (t1 - t0),
+                            (loc1 - loc0) / (1 << 30) / (t1 - t0))
+        return values
+
+    def l3Multiplexer(self):
+        """
+        Return the l3Multiplexer.L3Multiplexer object that schedules the L3
+        occupancy monitors
+        """
+        return self._l3Mux
+
+    def l3Focus(self, cores):
+        """
+        Sample more often the L3 occupancy of the given cores (their next
+        constraint decision depends on it)
+
+        Parameters :
+            - cores : list of cores
+        """
+        self._l3Mux.focus(cores)
+
+    def l3MonitorEnable(self, threads):
+        """
+        Enable the L3 occupancy monitor of the given threads (one per CCX)
+        """
+        for thread in threads:
+            self._pqos.l3Occupancy(True, thread)
+
+    def l3MonitorPublish(self, threads):
+        """
+        Read the L3 occupancy of the given threads (enabled by
+        l3MonitorEnable) and update their averages
+
+        Parameters :
+            - threads : threads to read (one per CCX)
+        """
+        for thread in threads:
+            # Read the actual L3 occupancy, without data (0) the sample is
+            # discarded and the multiplexer keeps the thread first
+            value = (self._pqos.l3OccupancyRead(thread))
+            self._l3Mux.update(thread, value)
+            if value == 0:
+                continue
+
+            # Publish the new value, only this CCX is locked
+            with (self._ccxMutex[self._ccxOf[thread]]):
+                # Calculate the mean using Welford's Method in order 
+                # to avoid using big data structures in memory
+
+                # L3 Occupancy of the instances' live
+                self._l3Occupancy[thread] = self._l3Occupancy[thread] \
+                        + ((value - self._l3Occupancy[thread]) \
+                        / self._l3Iter[thread])
+
+                # L3 occupancy that can be reset by the user (and its sum
+                # of squares for the confidence interval)
+                delta = value - self._lastL3[thread]
+                self._lastL3[thread] = self._lastL3[thread] \
+                        + (delta / self._lastL3Iter[thread])
+                self._lastL3M2[thread] += delta * (value - self._lastL3[thread])
+
+                # Increase number of iteration used
+                self._lastL3Iter[thread] += 1
+                self._l3Iter[thread] += 1
+
     def launch(self, cpu, init=False):
         """
         Launch the giving command to the CPU.
@@ -328,52 +545,94 @@ class Process:
     
         Exception : raise an exception if the core is unavailable to run a process.
         """
-        with (self._mutex):
-            # Get the mutex
-            t = .01
+        since = None
 
+        with (self._jobMutex):
             if not init:
-                # This launch is because an instance already finish
-                t = .2
+                # This launch is because an instance already finish, only
+                # the load after its end is considered
+                since = self._jobEnd.get(cpu, None)
                 # Indicate that this core already complete at least one job
                 self._endCores[cpu] = True
 
-                if all(self._endCores):
+                if all(self._endCores.values()):
                     # All CPU complete at least one job, so we can finish the
                     # program because the experiment is already done.
                     self._end = True
                     return -1
 
-            if (psutil.cpu_percent(interval=t, percpu=True)[cpu] > 50):
-                # The core is already running a instance (the load during more
-                # than 0.2 seconds is above 50%). So we don not have to launch
-                # another job in the cpu.
-                return -2
-            else:
-                # Get the complete command line to launch the program
-                # TODO: remove the taskset command for a psutil function that
-                # change the core affinity of the process
-                arg = " ".join(["taskset", "-c", str(cpu), "bash", "-c", "\""] +\
-                        self._cmd[cpu].split(' ') + ["\""])
- 
-                # Launch process
-                proc = subprocess.Popen(arg, stdout = subprocess.DEVNULL, \
-                    stderr = subprocess.DEVNULL, preexec_fn = os.setsid, \
-                    shell=True)
-
-                # Reset hardware counters
-                self._hwc.reset(cpu)
-                self._l3Occupancy[cpu] = 0
-                self._l3Iter[cpu] = 1
-                self._lastL3[cpu] = 0
-                self._lastL3Iter[cpu] = 1
-                self._limits[cpu] = {'None': 0, 'LLC': 0, 'BW': 0, 'LLCBW': 0, 
-                    'Total': 0}
-
-                # Save the information about the processes
-                self._dicPid[proc.pid] = (cpu, self._cmd[cpu], time())
+        # Sampled load of the core (NaN, so the job is launched, while there
+        # are not samples enough)
+        if (self._cpuLoad.busy(cpu, since=since) > .5):
+            # The core is already running a instance (the load is above 50%).
+            # So we don not have to launch another job in the cpu.
+            return -2
+
+        # Parse the command once per core
+        spec = self._specs.get(cpu)
+        if spec is None:
+            spec = jobSpec.parse(self._cmd[cpu])
+            self._specs[cpu] = spec
+            if spec['shell']:
+                sys.stderr.write("Core {}: command run with {}\n"\
+                        .format(cpu, jobSpec.SHELL))
+                sys.stderr.flush()
 
-            return 0
+        # Launch the job pinned to the cpu in its own session
+        t = perf_counter()
+        proc = jobSpec.spawn(spec, cpu)
+        t = perf_counter() - t
+
+        # Reset hardware counters, the generations are odd meanwhile so the
+        # readers know that the counters are not consistent
+        ccx = self._ccxOf[cpu]
+        with (self._ccxMutex[ccx]):
+            self._gen[cpu] += 1
+            self._ccxGen[ccx] += 1
+            self._hwc.reset(cpu)
+            self._genStart[cpu] = monotonic()
+            self._ccxStart[ccx] = self._genStart[cpu]
+            self._ccxGen[ccx] += 1
+            self._gen[cpu] += 1
+
+            self._l3Occupancy[cpu] = 0
+            self._l3Iter[cpu] = 1
+            self._lastL3[cpu] = 0
+            self._lastL3Iter[cpu] = 1
+            self._lastL3M2[cpu] = 0
+            if self._mbm is not None:
+                self._mbm[cpu] = []
+        self._l3Mux.reset(cpu)
+
+        with (self._jobMutex):
+            self._limits[cpu] = {'None': 0, 'LLC': 0, 'BW': 0, 'LLCBW': 0, 
+                'Total': 0}
+            self._launchLat[0] += 1
+            self._launchLat[1] += t
+            self._launchLat[2] = max(self._launchLat[2], t)
+
+            # Save the information about the processes
+            self._dicPid[proc.pid] = (cpu, self._cmd[cpu], time())
+            try:
+                self._jobStat[proc.pid] = watchdog.JobStat(proc.pid)
+            except OSError:
+                # Already finished and reaped
+                pass
+            # Keep the Popen object, subprocess reaps the children of the
+            # Popen objects that are destroyed
+            self._procs[proc.pid] = proc
+        self._watcher.watch(proc.pid)
+
+        return 0
+
+    def launchLatency(self):
+        """
+        Return the spawn latency of the jobs: (jobs launched, mean seconds,
+        max seconds)
+        """
+        with (self._jobMutex):
+            count, total, maxx = self._launchLat
+        return count, total / count if count > 0 else 0., maxx
 
     def readHWC(self, core, l3g=False):
         """
@@ -383,7 +642,9 @@ class Process:
             - core : core where the application is executed
             - l3g : return also the global L3 misses
         """
-        with(self._mutex):
+        if not l3g:
+            return self._readHWC(core)
+        with(self._jobMutex):
             return self._readHWC(core, l3g=l3g)
 
     def readAllHWC(self, cores, l3g=False):
@@ -395,25 +656,119 @@ class Process:
             - l3g : return also the global L3 misses
         """
         aux = {}
-        with(self._mutex):
-            for core in cores:
-                aux[core] = self._readHWC(core, l3g=l3g)
+        for core in cores:
+            aux[core] = self.readHWC(core, l3g=l3g)
         return aux
 
-    def getL3Monitor(self, cores):
+    def readHWCMatrix(self, cores, out=None):
+        """
+        Read all hw counters of the given cores in one call
+
+        Parameters :
+            - cores : list of cores
+            - out : (optional) preallocated uint64 matrix (cores x counters)
+
+        Return : uint64 matrix with one row per core, see hwcIndex for the
+            column order
+        """
+        # Counters are read without lock, they only change their value
+        return self._hwc.readMany(cores, out=out)
+
+    def snapshot(self, cores):
+        """
+        Read all hw counters of the given cores with the time of the read and
+        the job generation of each core
+
+        Parameters :
+            - cores : list of cores
+
+        Return : Snapshot object
+        """
+        n = len(cores)
+        values = np.empty((n, len(self._hwc.names())), dtype=np.uint64)
+        ts = np.empty(n, dtype=np.float64)
+        gen = np.empty(n, dtype=np.int64)
+        ccxGen = np.empty(n, dtype=np.int64)
+        start = np.empty(n, dtype=np.float64)
+        ccxStart = np.empty(n, dtype=np.float64)
+
+        for row, core in enumerate(cores):
+            ccx = self._ccxOf[core]
+            while True:
+                g0 = self._gen[core]
+                c0 = self._ccxGen[ccx]
+                t0 = monotonic()
+                self._hwc.readArray(core, out=values[row])
+                t1 = monotonic()
+                g1 = self._gen[core]
+                c1 = self._ccxGen[ccx]
+                if g0 == g1 and c0 == c1 and g0 % 2 == 0 and c0 % 2 == 0:
+                    break
+                # A job is being launched in this core or CCX, read again
+                sleep(0)
+
+            ts[row] = (t0 + t1) / 2
+            gen[row] = g1
+            ccxGen[row] = c1
+            start[row] = self._genStart[core]
+            ccxStart[row] = self._ccxStart[ccx]
+
+        return snapshot.Snapshot(cores, values, ts, gen, ccxGen, start,
+                ccxStart)
+
+    def hwcShared(self):
+        """
+        Return the boolean array that flags the hw counters shared by the
+        threads of a CCX (column order of readHWCMatrix)
+        """
+        return self._hwc.isShared()
+
+    def hwcIndex(self):
+        """
+        Return a dictionary with the column of each hw counter in the matrix
+        returned by readHWCMatrix
+        """
+        return {name: idx for idx, name in enumerate(self._hwc.names())}
+
+    def getL3Occupancy(self, cores):
+        """
+        Get the L3 occupancy (KiB) of the cores since their job was launched
+
+        Parameters :
+            - cores : list of cores
+        """
+        values = {}
+        for i in cores:
+            with(self._ccxMutex[self._ccxOf[i]]):
+                values[i] = self._l3Occupancy[i] / 1024
+        return values
+
+    def getL3Monitor(self, cores, ci=False):
         """
         Get L3 Monitor since last read
 
         Parameters :
             - core : core where the application is executed
+            - ci : return also the half width of the 95% confidence interval
+                    of each mean (KiB, NaN with less than two samples)
+
+        Return : dictionary core -> mean (KiB), and the dictionary core ->
+            half width if ci is true
         """
         values = {}
-        with(self._mutex):
-            for i in cores:
+        width = {}
+        for i in cores:
+            with(self._ccxMutex[self._ccxOf[i]]):
                 # Return the value on KiB to easy human read
                 values[i] = self._lastL3[i] / 1024
+                n = self._lastL3Iter[i] - 1
+                width[i] = 1.96 * sqrt(self._lastL3M2[i] / (n - 1) / n) / \
+                        1024 if n > 1 else float('nan')
                 self._lastL3[i] = 0
                 self._lastL3Iter[i] = 1
+                self._lastL3M2[i] = 0
+        if ci:
+            return values, width
         return values
 
     def pqos(self):
@@ -422,19 +777,51 @@ class Process:
         """
         return self._pqos
 
-    def printInfo(self, pid):
+    def cpuLoad(self):
+        """
+        Return the cpuSampler.CPUSampler object with the load of the cpus
+        """
+        return self._cpuLoad
+
+    def command(self, core):
+        """
+        Return the command of the jobs of a core, None if the core has no
+        jobs
+
+        Parameters:
+            - core : core
+        """
+        return self._cmd.get(core)
+
+    def topology(self):
+        """
+        Return the topology.Topology object
+        """
+        return self._topo
+
+    def printInfo(self, pid, code=None, rusage=None):
         """
         Print information about an execution
 
         Parameters :
             - pid : pid of the process to measure
+            - code : (optional) exit code of the process
+            - rusage : (optional) resource usage of the process
         """
-        with(self._mutex):
+        with(self._jobMutex):
             core = -1
+            proc = self._procs.pop(pid, None)
+            stat = self._jobStat.pop(pid, None)
+            if stat is not None:
+                stat.close()
+            if proc is not None and code is not None:
+                # Already reaped, the Popen object must not wait for it
+                proc.returncode = code
 
             # Get info about the execution
             if (pid in self._dicPid): 
                 core, cmd, tini = (self._dicPid[pid])
+                self._jobEnd[core] = monotonic()
 
                 # Print the info about the finish thread
                 print("TH: {}".format(core))
@@ -442,6 +829,14 @@ class Process:
                 print("Time Init: {}".format(tini))
                 print("Time End: {}".format(time()))
                 print("Time (s): {}".format(time() - tini))
+                if code is not None:
+                    print("Exit code: {}".format(code))
+                if rusage is not None:
+                    print("User time (s): {}".format(rusage.ru_utime))
+                    print("System time (s): {}".format(rusage.ru_stime))
+                    print("Max RSS (KB): {}".format(rusage.ru_maxrss))
+                    print("Context switches: {} voluntary {} involuntary"\
+                            .format(rusage.ru_nvcsw, rusage.ru_nivcsw))
 
                 # Read hardware counters and print its information
                 dicHWC = self._readHWC(core, l3g=True)
@@ -460,12 +855,13 @@ class Process:
         """
         Update the number of epochs with restriction
         """
-        for i in dic:
-            lllc, lbw = dic[i]
-            if lllc and not lbw:
-                self._limits[i]['LLC'] += 1
-            elif not lllc and lbw:
-                self._limits[i]['BW'] += 1
-            elif lllc and lbw:
-                self._limits[i]['LLCBW'] += 1
-            self._limits[i]['Total'] += 1
+        with(self._jobMutex):
+            for i in dic:
+                lllc, lbw = dic[i]
+                if lllc and not lbw:
+                    self._limits[i]['LLC'] += 1
+                elif not lllc and lbw:
+                    self._limits[i]['BW'] += 1
+                elif lllc and lbw:
+                    self._limits[i]['LLCBW'] += 1
+                self._limits[i]['Total'] += 1
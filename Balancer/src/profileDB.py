@@ -0,0 +1,337 @@
+#!/usr/bin/python3
+"""
+Indexed database (SQLite) of the outputs of the Characterization sweeps.
+
+The sweeps write one <mask>.out (LLC) or <mask>-Triads_<k>.out (BW) file per
+point in the directory of the benchmark (out/<bench>.<input>/), with the
+"name: value" lines of lib/py/hwCounters.py. ingest() parses a whole tree in
+parallel (one process per cpu) and stores every point once, keyed by:
+    * bench, input : e.g. 505.mcf_r and 1 for out/505.mcf_r.1
+    * llc_mask, ways : LLC mask of the point and its number of ways
+    * bw_mask : BW mask of the point (0 without constrain)
+    * triads : interference level (number of triad instances, 0 in the LLC
+            sweeps)
+    * prefetch, turbo : state of the prefetchers and of the turbo. The
+            outputs do not record them, they come from the directories of
+            the path (pf, nopf, turbo, noturbo, e.g. out/pf-2k17) or from
+            the defaults of ingest (the sweeps enable the prefetchers and
+            disable the turbo)
+The counters of each point are in a second table. A file is only parsed again
+when its size or modification time changed, so the tree can be ingested
+again while the sweeps are running.
+
+Usage: profileDB.py [database] [output directory ...] [-j workers]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import re
+import sys
+import sqlite3
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+OUTFILE = re.compile(r'^(0x[0-9A-Fa-f]+)(?:-Triads_(\d+))?\.out$')
+KEYS = ('bench', 'input', 'llc_mask', 'ways', 'bw_mask', 'triads',
+        'prefetch', 'turbo')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    bench TEXT NOT NULL,
+    input TEXT NOT NULL,
+    llc_mask INTEGER NOT NULL,
+    ways INTEGER NOT NULL,
+    bw_mask INTEGER NOT NULL,
+    triads INTEGER NOT NULL,
+    prefetch INTEGER NOT NULL,
+    turbo INTEGER NOT NULL,
+    ins REAL,
+    cycles REAL,
+    l3miss REAL,
+    time REAL,
+    bw REAL
+);
+CREATE INDEX IF NOT EXISTS points_key ON points (bench, input, prefetch,
+    turbo, triads, bw_mask, ways);
+CREATE TABLE IF NOT EXISTS counters (
+    point INTEGER NOT NULL REFERENCES points(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (point, name)
+) WITHOUT ROWID;
+"""
+
+def parseOut(path):
+    """
+    Read the counters of an output of hwCounters.py
+
+    Parameters:
+        - path : output file
+
+    Return : dictionary name -> value (float, NaN if it is not a number),
+        the lines without "name: value" are skipped
+    """
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, sep, value = line.rpartition(':')
+            if sep == '' or name.strip() == '':
+                continue
+            try:
+                values[name.strip()] = float(value)
+            except ValueError:
+                continue
+    return values
+
+def pathKey(path, prefetch=1, turbo=0, bwMask=0):
+    """
+    Return the key of an output file (see KEYS), None if the name of the file
+    is not the one of a sweep point
+
+    Parameters:
+        - path : output file
+        - prefetch, turbo, bwMask : values when the path does not say them
+    """
+    match = OUTFILE.match(os.path.basename(path))
+    if match is None:
+        return None
+    bench = os.path.basename(os.path.dirname(path))
+    name, _, inp = bench.rpartition('.')
+    if name == '' or not inp.isdigit():
+        # Without input number
+        name, inp = bench, '1'
+    for part in os.path.dirname(path).split(os.sep):
+        for word in re.split(r'[-_.]', part.lower()):
+            if word in ('pf', 'nopf'):
+                prefetch = int(word == 'pf')
+            elif word in ('turbo', 'noturbo'):
+                turbo = int(word == 'turbo')
+    mask = int(match.group(1), 16)
+    triads = int(match.group(2)) if match.group(2) is not None else 0
+    return (name, inp, mask, bin(mask).count('1'), bwMask, triads, prefetch,
+            turbo)
+
+def _parse(path):
+    """
+    Parse one file in a worker process
+    """
+    try:
+        return path, parseOut(path)
+    except (OSError, UnicodeDecodeError):
+        return path, None
+
+class ProfileDB:
+    """
+    Class to ingest and query the outputs of the sweeps
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _path = None
+    _db = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, path):
+        """
+        Constructor of the class, the database is created if it does not
+        exist
+
+        Parameters:
+            - path : SQLite file
+        """
+        self._path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(SCHEMA)
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _where(self, bench, input, **keys):
+        """
+        Return the WHERE clause and its arguments of a query, the keys with
+        value None are not filtered
+        """
+        keys['bench'] = bench
+        keys['input'] = input
+        cond, args = [], []
+        for key in KEYS:
+            if keys.get(key) is not None:
+                cond.append("{} = ?".format(key))
+                args.append(keys[key])
+        return " AND ".join(cond) if len(cond) > 0 else "1", args
+
+    def _series(self, x, y, where, args):
+        """
+        Return the arrays (x values, mean of y) of a query grouped by x
+        """
+        rows = self._db.execute("SELECT {x}, AVG({y}) FROM points WHERE {w} "
+                "AND {y} IS NOT NULL GROUP BY {x} ORDER BY {x}".format(x=x,
+                    y=y, w=where), args).fetchall()
+        return np.array([i for i, _ in rows]), np.array([i for _, i in rows],
+                dtype=np.float64)
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def close(self):
+        """
+        Close the database
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def ingest(self, root, workers=None, prefetch=1, turbo=0, bwMask=0):
+        """
+        Parse the new and modified outputs of a directory tree
+
+        Parameters:
+            - root : directory with the outputs
+            - workers : (optional) parser processes, one per cpu by default
+            - prefetch, turbo, bwMask : key of the points when the path does
+                    not say them
+
+        Return : (parsed files, unchanged files, files that can not be
+            read)
+        """
+        known = {path: (mtime, size) for path, mtime, size in
+                self._db.execute("SELECT path, mtime, size FROM points")}
+        todo, same = {}, 0
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                path = os.path.abspath(os.path.join(dirpath, name))
+                key = pathKey(path, prefetch, turbo, bwMask)
+                if key is None:
+                    continue
+                st = os.stat(path)
+                if known.get(path) == (st.st_mtime, st.st_size):
+                    same += 1
+                    continue
+                todo[path] = (key, st.st_mtime, st.st_size)
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool, self._db:
+            for path, values in pool.map(_parse, sorted(todo),
+                    chunksize=64):
+                if values is None:
+                    failed += 1
+                    continue
+                key, mtime, size = todo[path]
+                self._db.execute("DELETE FROM points WHERE path = ?", (path,))
+                cur = self._db.execute("INSERT INTO points (path, mtime, size, "
+                        "{}, ins, cycles, l3miss, time, bw) VALUES ({})".format(
+                            ", ".join(KEYS), ", ".join(["?"] * 16)),
+                        (path, mtime, size) + key + (
+                            values.get('Instr Retired'), values.get('Cycles'),
+                            values.get('L3Miss'), values.get('Time (s)'),
+                            values.get('BW (MB/s)')))
+                self._db.executemany("INSERT INTO counters (point, name, "
+                        "value) VALUES (?, ?, ?)", [(cur.lastrowid, i,
+                            values[i]) for i in values])
+        return len(todo) - failed, same, failed
+
+    def benchmarks(self):
+        """
+        Return the list of (bench, input) of the database
+        """
+        return self._db.execute("SELECT DISTINCT bench, input FROM points "
+                "ORDER BY bench, input").fetchall()
+
+    def points(self, bench=None, input=None, **keys):
+        """
+        Return the points that match a key as a list of dictionaries with the
+        key and the counters
+
+        Parameters:
+            - bench, input : (optional) benchmark and input
+            - keys : (optional) other values of the key (see KEYS)
+        """
+        where, args = self._where(bench, input, **keys)
+        rows = self._db.execute("SELECT id, {} FROM points WHERE {} ORDER BY "
+                "{}".format(", ".join(KEYS), where, ", ".join(KEYS)),
+                args).fetchall()
+        points = []
+        for row in rows:
+            point = dict(zip(KEYS, row[1:]))
+            point.update(self._db.execute("SELECT name, value FROM counters "
+                "WHERE point = ?", (row[0],)).fetchall())
+            points.append(point)
+        return points
+
+    def ipcVsWays(self, bench, input=None, triads=0, bw_mask=0, prefetch=1,
+            turbo=0):
+        """
+        Return the IPC of a benchmark with every number of ways measured
+
+        Parameters:
+            - bench : benchmark (e.g. 505.mcf_r)
+            - input : (optional) input, the inputs are averaged by default
+            - triads, bw_mask, prefetch, turbo : rest of the key
+
+        Return : (ways, IPC) arrays
+        """
+        where, args = self._where(bench, input, triads=triads,
+                bw_mask=bw_mask, prefetch=prefetch, turbo=turbo)
+        return self._series('ways', 'ins / cycles', where, args)
+
+    def mpkiVsWays(self, bench, input=None, triads=0, bw_mask=0, prefetch=1,
+            turbo=0):
+        """
+        Return the L3 MPKI of a benchmark with every number of ways measured
+
+        Parameters: the ones of ipcVsWays
+
+        Return : (ways, MPKI) arrays
+        """
+        where, args = self._where(bench, input, triads=triads,
+                bw_mask=bw_mask, prefetch=prefetch, turbo=turbo)
+        return self._series('ways', 'l3miss * 1000 / ins', where, args)
+
+    def ipcVsBW(self, bench, input=None, ways=16, bw_mask=0, prefetch=1,
+            turbo=0):
+        """
+        Return the IPC of a benchmark with every interference level measured
+
+        Parameters:
+            - bench : benchmark (e.g. 505.mcf_r)
+            - input : (optional) input, the inputs are averaged by default
+            - ways, bw_mask, prefetch, turbo : rest of the key
+
+        Return : (triads, BW of the benchmark in MB/s or NaN if it was not
+            measured, IPC) arrays
+        """
+        where, args = self._where(bench, input, ways=ways, bw_mask=bw_mask,
+                prefetch=prefetch, turbo=turbo)
+        rows = self._db.execute("SELECT triads, AVG(bw), AVG(ins / cycles) "
+                "FROM points WHERE {} AND ins / cycles IS NOT NULL GROUP BY "
+                "triads ORDER BY triads".format(where), args).fetchall()
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        return rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2]
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: profileDB.py [database] [output directory ...] "
+                "[-j workers]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    workers = None
+    if '-j' in args:
+        idx = args.index('-j')
+        workers = int(args[idx + 1])
+        args = args[:idx] + args[idx + 2:]
+    db = ProfileDB(sys.argv[1])
+    for root in args:
+        parsed, same, failed = db.ingest(root, workers=workers)
+        print("{}: parsed {} unchanged {} failed {}".format(root, parsed,
+            same, failed))
+    print("Benchmarks: {}".format(len(db.benchmarks())))
+    db.close()
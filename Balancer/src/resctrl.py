@@ -0,0 +1,474 @@
+#!/usr/bin/python3
+"""
+PQOS backend built on the Linux resctrl filesystem (/sys/fs/resctrl).
+
+It has the same API than PQOS.PQOS, so Balancer can use it instead of
+programming the MSRs directly and it does not race with other users of
+RDT/PQoS in the host. Every COS is mapped to a resctrl group:
+    * COS 0 is the default (root) group.
+    * COS N is the group balancer_cosN, created the first time it is used.
+A cpu is associated to a COS writing its cpus_list. To measure the L3
+occupancy and the bandwidth of a cpu a monitor group (mon_groups/cpuN) with
+only that cpu is created inside its group. Every monitor group takes a RMID,
+so only one cpu of each L3 domain (the one picked by the L3 multiplexer) has
+a monitor group: it is removed when another cpu of the domain is monitored
+and in close(). The MBM counters are only available for that cpu.
+
+The L3 and MB schemata lines of a group are written in one write. Inside a
+transaction (begin/commit) all the changes of a group are written together
+and the moves of cpus between groups are staged too: the schemata are
+written first and then the cpus_list of every group that changes, once.
+
+Requirements: resctrl mounted (mount -t resctrl resctrl /sys/fs/resctrl)
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import errno
+import shutil
+import timedLock
+import topology
+from threading import local
+from contextlib import contextmanager
+
+class Resctrl:
+    """
+    Class to manage PQOS through resctrl with mutual exclusion.
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _root = None # resctrl mount point
+    _topo = None # CPU topology
+    _mutex = None
+    _cbm = None # Mask with all the ways
+    _mbMax = None # BW value without limit
+    _group = None # Group of each cpu (cpu -> cos)
+    _cpus = None # Cpus of each group (cos -> set)
+    _schemata = None # Last schemata written (cos -> {(resource, domain): value})
+    _staged = None # Schemata and cpu moves of the open transaction (by
+                   # thread)
+    _monitored = None # Cpu with a monitor group of each L3 domain
+    _stats = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, root="/sys/fs/resctrl", topo=None):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - root : resctrl mount point
+            - topo : (optional) topology.Topology of the machine, used to
+                    know the L3 domain of each cpu. By default it is read from
+                    sysfs.
+        """
+        self._root = root
+        self._topo = topo if topo is not None else topology.Topology()
+        self._mutex = timedLock.TimedLock("resctrl")
+        self._group = {}
+        self._cpus = {0: set()}
+        self._schemata = {}
+        self._staged = local()
+        self._monitored = {}
+        self._stats = {'writes': 0, 'elided': 0, 'commits': 0}
+
+        self._cbm = int(self._readFile(os.path.join(root, "info", "L3",
+            "cbm_mask"), "ffff"), 16)
+        self._mbMax = 2048
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _readFile(self, path, default=None):
+        """
+        Return the content of a file, or default if it does not exist
+        """
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return default
+
+    def _writeFile(self, path, data):
+        """
+        Write data in a file with only one write
+        """
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            os.write(fd, data.encode())
+        finally:
+            os.close(fd)
+
+    def _removeDir(self, path):
+        """
+        Remove a group directory, resctrl removes its files
+        """
+        try:
+            os.rmdir(path)
+        except OSError as err:
+            if err.errno != errno.ENOTEMPTY:
+                raise
+            # A regular directory that mimics resctrl (e.g. tests)
+            shutil.rmtree(path)
+
+    def _getDomain(self, cpu):
+        """
+        Return the L3 domain of the given cpu
+        """
+        return self._topo.ccx(cpu)
+
+    def _groupDir(self, cos):
+        """
+        Return the directory of the group of the given COS (created if it
+        does not exist)
+        """
+        if cos == 0:
+            return self._root
+        path = os.path.join(self._root, "balancer_cos{}".format(cos))
+        if cos not in self._cpus:
+            os.makedirs(path, exist_ok=True)
+            self._cpus[cos] = set()
+        return path
+
+    def _monDir(self, cpu):
+        """
+        Return the monitor group directory of the given cpu
+        """
+        return os.path.join(self._groupDir(self._group.get(cpu, 0)),
+                "mon_groups", "cpu{}".format(cpu))
+
+    def _cpuList(self, cpus):
+        """
+        Return the cpus_list string of a set of cpus
+        """
+        return "{}\n".format(','.join([str(i) for i in sorted(cpus)]))
+
+    def _assign(self, cpu, cos):
+        """
+        Move the given cpu to the group of the given COS. Inside a
+        transaction the move is staged. The mutex must be held by the caller.
+        """
+        moves = getattr(self._staged, 'moves', None)
+        if moves is not None:
+            if cpu in moves:
+                self._stats['elided'] += 1
+            moves[cpu] = cos
+        else:
+            self._move({cpu: cos})
+
+    def _move(self, moves):
+        """
+        Move cpus between groups, the cpus_list of every group that changes
+        is written once. The mutex must be held by the caller.
+
+        Parameters:
+            - moves : cpu -> cos
+        """
+        left, joined, monitored = set(), set(), []
+        for cpu in sorted(moves):
+            cos = moves[cpu]
+            old = self._group.get(cpu, 0)
+            if old == cos and cpu in self._cpus[cos]:
+                self._stats['elided'] += 1
+                continue
+
+            # The monitor group belongs to the old group
+            mon = self._monDir(cpu)
+            if os.path.isdir(mon):
+                self._removeDir(mon)
+                monitored.append(cpu)
+
+            self._groupDir(cos)
+            self._cpus[old].discard(cpu)
+            self._cpus[cos].add(cpu)
+            if cos != 0:
+                # The cpu leaves its old group
+                joined.add(cos)
+            elif old != 0:
+                # Cpus removed from a group return to the default group
+                left.add(old)
+            self._group[cpu] = cos
+
+        for cos in sorted(left - joined) + sorted(joined):
+            self._writeFile(os.path.join(self._groupDir(cos), "cpus_list"),
+                    self._cpuList(self._cpus[cos]))
+            self._stats['writes'] += 1
+
+        for cpu in monitored:
+            self._monitor(cpu)
+
+    def _monitor(self, cpu):
+        """
+        Create the monitor group of the given cpu, the monitor group of the
+        previous cpu of its L3 domain is removed. The mutex must be held by
+        the caller.
+        """
+        domain = self._getDomain(cpu)
+        last = self._monitored.get(domain)
+        if last is not None and last != cpu:
+            self._unmonitor(last)
+        mon = self._monDir(cpu)
+        os.makedirs(mon, exist_ok=True)
+        self._writeFile(os.path.join(mon, "cpus_list"), self._cpuList([cpu]))
+        self._monitored[domain] = cpu
+
+    def _unmonitor(self, cpu):
+        """
+        Remove the monitor group of the given cpu (its RMID is released). The
+        mutex must be held by the caller.
+        """
+        mon = self._monDir(cpu)
+        if os.path.isdir(mon):
+            self._removeDir(mon)
+        domain = self._getDomain(cpu)
+        if self._monitored.get(domain) == cpu:
+            del self._monitored[domain]
+
+    def _set(self, cos, resource, cpu, value):
+        """
+        Set the schemata value of a resource (L3 or MB) of a group in the L3
+        domain of the given cpu. Inside a transaction the value is staged.
+        The mutex must be held by the caller.
+        """
+        key = (resource, self._getDomain(cpu))
+        staged = getattr(self._staged, 'schemata', None)
+        if staged is not None:
+            if cos not in staged:
+                staged[cos] = {}
+            if key in staged[cos]:
+                self._stats['elided'] += 1
+            staged[cos][key] = value
+        else:
+            self._flush({cos: {key: value}})
+
+    def _flush(self, schemata):
+        """
+        Write the schemata values that change, one write per group. The mutex
+        must be held by the caller.
+
+        Parameters:
+            - schemata : cos -> {(resource, domain): value}
+        """
+        for cos in schemata:
+            shadow = self._schemata.setdefault(cos, {})
+            lines = {}
+            for key in sorted(schemata[cos]):
+                value = schemata[cos][key]
+                if shadow.get(key) == value:
+                    self._stats['elided'] += 1
+                    continue
+                resource, domain = key
+                fmt = "{}={:x}" if resource == "L3" else "{}={}"
+                lines.setdefault(resource, []).append(fmt.format(domain,
+                    value))
+                shadow[key] = value
+
+            if len(lines) > 0:
+                data = ''.join(["{}:{}\n".format(i, ';'.join(lines[i])) for \
+                        i in lines])
+                self._writeFile(os.path.join(self._groupDir(cos),
+                    "schemata"), data)
+                self._stats['writes'] += 1
+
+    def _readMon(self, cpu, event):
+        """
+        Read a monitoring event of the given cpu (0 if it is not available)
+        """
+        value = self._readFile(os.path.join(self._monDir(cpu), "mon_data",
+            "mon_L3_{:02d}".format(self._getDomain(cpu)), event), "0")
+        return int(value) if value.isdigit() else 0
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def begin(self):
+        """
+        Open a transaction, the schemata changes and the cpu moves of this
+        thread are staged until commit is called
+        """
+        if getattr(self._staged, 'schemata', None) is None:
+            self._staged.schemata = {}
+            self._staged.moves = {}
+
+    def commit(self):
+        """
+        Write the staged schemata (one write per group), then move the staged
+        cpus (one cpus_list write per group) and close the transaction
+        """
+        staged = getattr(self._staged, 'schemata', None)
+        moves = getattr(self._staged, 'moves', None)
+        self._staged.schemata = None
+        self._staged.moves = None
+        if staged is None:
+            return
+
+        with(self._mutex):
+            # The schemata of a group is set before its new cpus join it
+            self._flush(staged)
+            self._move(moves)
+            self._stats['commits'] += 1
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager of a transaction (begin and commit), the transaction
+        is committed even if the block raises an exception so it is never
+        left open in the thread
+        """
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def invalidate(self, cpu=None):
+        """
+        Forget the last schemata written (e.g. if another program modifies
+        them)
+
+        Parameters:
+            - cpu : not used, the schemata are shared by all the cpus
+        """
+        with(self._mutex):
+            self._schemata = {}
+
+    def stats(self):
+        """
+        Return a dictionary with the number of writes done, elided and
+        transactions committed
+        """
+        return dict(self._stats)
+
+    def l3Occupancy(self, on, cpu):
+        """
+        Set/Unset the L3 occupancy monitor.
+
+        Parameters :
+            on -> if true set the monitor, if off unset it
+            cpu -> cpu
+        """
+        with(self._mutex):
+            if on:
+                if not os.path.isdir(self._monDir(cpu)):
+                    self._monitor(cpu)
+            else:
+                self._unmonitor(cpu)
+
+    def l3OccupancyRead(self, cpu):
+        """
+        Read the L3 occupancy
+
+        Parameters :
+            - cpu : cpu
+
+        Return :
+            - Occupancy in bytes
+        """
+        with(self._mutex):
+            return self._readMon(cpu, "llc_occupancy")
+
+    def mbmRead(self, cpu, local=False):
+        """
+        Read the memory bandwidth counter
+
+        Parameters :
+            - cpu : cpu
+            - local : read the local bandwidth instead of the total
+
+        Return :
+            - Bytes transferred since the monitor group was created, None if
+              the value is not available (e.g. the L3 occupancy of the cpu is
+              not monitored, so it has no monitor group)
+        """
+        with(self._mutex):
+            value = self._readFile(os.path.join(self._monDir(cpu),
+                "mon_data", "mon_L3_{:02d}".format(self._getDomain(cpu)),
+                "mbm_local_bytes" if local else "mbm_total_bytes"), "")
+        return int(value) if value.isdigit() else None
+
+    def l3Allocation(self, on, cos, mask, cpu):
+        """
+        L3 Allocation enforcement
+
+        Parameters :
+            - on : if true set the monitor, if off unset it
+            - cos : mask to associate
+            - mask : ways/amount of cache to the givin core
+            - cpu : cpu
+        """
+        with(self._mutex):
+            if on:
+                self._assign(cpu, cos)
+                self._set(cos, "L3", cpu, mask)
+            else:
+                self._assign(cpu, 0)
+                self._set(cos, "L3", cpu, self._cbm)
+
+    def bwAllocation(self, on, cos, mask, cpu):
+        """
+        Bandwidth Allocation enforcement
+
+        Parameters :
+            - on : if true set the monitor, if off unset it
+            - cos : mask to associate
+            - mask : max amount of bw to the given core (1/8 GB/s)
+            - cpu : cpu to enforce the allocation
+        """
+        with(self._mutex):
+            if on:
+                self._assign(cpu, cos)
+                self._set(cos, "MB", cpu, mask)
+            else:
+                self._assign(cpu, 0)
+                self._set(cos, "MB", cpu, self._mbMax)
+
+    def close(self):
+        """
+        Remove the monitor groups (their RMIDs are released), the groups of
+        the COS are kept
+        """
+        with(self._mutex):
+            for cpu in list(self._monitored.values()):
+                self._unmonitor(cpu)
+
+    def reset(self, cpu):
+        """
+        Reset all configuration
+
+        Parameters :
+            - cpu : cpu
+        """
+        self.l3Occupancy(False, cpu)
+        self.bwAllocation(False, 0, self._mbMax, cpu)
+        self.l3Allocation(False, 0, self._cbm, cpu)
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed. It uses a temporal directory
+    # that mimics resctrl, so it can be run without root
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "info", "L3"))
+        with open(os.path.join(tmp, "info", "L3", "cbm_mask"), "w") as f:
+            f.write("ffff\n")
+
+        pqos = Resctrl(tmp, topo=topology.Topology(None))
+        pqos.begin()
+        pqos.l3Allocation(True, 1, 0x1, 0)
+        pqos.bwAllocation(True, 1, 20, 0)
+        pqos.l3Allocation(True, 2, 0xFF00, 5)
+        pqos.commit()
+        print(open(os.path.join(tmp, "balancer_cos1", "schemata")).read())
+        print(open(os.path.join(tmp, "balancer_cos2", "schemata")).read())
+
+        pqos.l3Occupancy(True, 0)
+        mon = os.path.join(tmp, "balancer_cos1", "mon_groups", "cpu0",
+                "mon_data", "mon_L3_00")
+        os.makedirs(mon)
+        with open(os.path.join(mon, "llc_occupancy"), "w") as f:
+            f.write("1048576\n")
+        print("Occupancy: {}".format(pqos.l3OccupancyRead(0)))
+        print(pqos.stats())
@@ -2,14 +2,20 @@
 """
 Class to manage a rolling average
 
+The values are kept in a fixed size ring buffer and the sum is updated
+incrementally (Kahan compensated), so add, avg and reset are O(1).
+BatchRollingAVG keeps many rolling averages (e.g. cores x metrics) in one
+NumPy array and updates all of them in one vectorized step.
+
 Requirements: numpy library
 
 @AUTHOR: Navarro Torres, Agustín
 @DATE: 13/12/2020
 @EMAIL: agusnt (at) unizar (dot) es
 @UPDATES:
+    Ring buffer with running sum and batched version
 """
-from numpy import mean
+import numpy as np
 
 class RollingAVG:
     ###########################################################################
@@ -17,13 +23,30 @@ class RollingAVG:
     ###########################################################################
     _list = None
     _max = None
+    _pos = 0 # Position of the next element
+    _n = 0 # Number of elements
+    _sum = 0. # Sum of the elements
+    _c = 0. # Kahan compensation of the sum
 
     ###########################################################################
     # Not override functions
     ###########################################################################
     def __init__(self, maxx):
         self._max = maxx
-        self._list = []
+        self._list = [0.] * maxx
+        self.reset()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _sumAdd(self, value):
+        """
+        Add a value to the sum (Kahan summation)
+        """
+        y = value - self._c
+        t = self._sum + y
+        self._c = (t - self._sum) - y
+        self._sum = t
 
     ###########################################################################
     # API functions
@@ -35,21 +58,175 @@ class RollingAVG:
         Parameters:
             - elem : new element to add
         """
-        if len(self._list) >= self._max:
-            self._list.pop(0)
-        self._list.append(elem)
+        if self._n >= self._max:
+            # Remove the oldest element
+            self._sumAdd(elem - self._list[self._pos])
+        else:
+            self._sumAdd(elem)
+            self._n += 1
+        self._list[self._pos] = elem
+        self._pos = (self._pos + 1) % self._max
 
     def avg(self):
         """
         Return the average of the numbers
         """
-        return mean(self._list)
-    
+        if self._n == 0:
+            return np.nan
+        return self._sum / self._n
+
+    def reset(self):
+        """
+        Remove all the elements
+        """
+        self._pos = 0
+        self._n = 0
+        self._sum = 0.
+        self._c = 0.
+
     def nElements(self):
         """
         Return the current number of elements of the list
         """
-        return len(self._list)
+        return self._n
+
+    def max(self):
+        """
+        Return elements to calculate the rolling average
+        """
+        return self._max
+
+class BatchRollingAVG:
+    """
+    Set of rolling averages with the same size updated at once. The values
+    are kept in a (shape x window) array, e.g. (cores x metrics x window).
+    The elements can have a weight (e.g. the length of the epoch), the
+    average is then sum(w * v) / sum(w).
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _buf = None
+    _max = None
+    _pos = 0 # Position of the next element (shared by all the averages)
+    _n = None # Number of elements of each average
+    _sum = None # Sum of each average
+    _c = None # Kahan compensation of each sum
+    _wbuf = None # Weights of the elements
+    _wsum = None # Sum of the weights of each average
+    _wc = None # Kahan compensation of each sum of weights
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, shape, maxx):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - shape : shape of the set of averages (e.g. (cores, metrics))
+            - maxx : elements of each rolling average
+        """
+        self._max = maxx
+        self._buf = np.zeros(tuple(shape) + (maxx,), dtype=np.float64)
+        self._pos = 0
+        self._n = np.zeros(shape, dtype=np.int64)
+        self._sum = np.zeros(shape, dtype=np.float64)
+        self._c = np.zeros(shape, dtype=np.float64)
+        self._wbuf = np.zeros(tuple(shape) + (maxx,), dtype=np.float64)
+        self._wsum = np.zeros(shape, dtype=np.float64)
+        self._wc = np.zeros(shape, dtype=np.float64)
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _add(self, total, comp, new, old, full):
+        """
+        Add new and remove old (in the full averages) from a sum with Kahan
+        summation
+
+        Return : (new sum, new compensation)
+        """
+        y = np.where(full, new - old, new) - comp
+        t = total + y
+        return t, (t - total) - y
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def update(self, values, valid=None, weights=None):
+        """
+        Add one element to every average. The averages with a non valid value
+        are reset.
+
+        Parameters:
+            - values : array with the new elements (same shape than the set)
+            - valid : (optional) boolean array, by default every value that is
+                    a number is valid
+            - weights : (optional) weight of the new elements (an array that
+                    can be broadcast to the shape of the set), 1 by default
+        """
+        if valid is None:
+            valid = ~np.isnan(values)
+        weights = np.broadcast_to(1. if weights is None else weights,
+                self._n.shape)
+        weights = np.where(valid, weights, 0.)
+        values = np.where(valid, values, 0.) * weights
+
+        # Remove the oldest element of the full averages (Kahan summation)
+        full = self._n >= self._max
+        self._sum, self._c = self._add(self._sum, self._c, values,
+                self._buf[..., self._pos], full)
+        self._wsum, self._wc = self._add(self._wsum, self._wc, weights,
+                self._wbuf[..., self._pos], full)
+        self._n = np.minimum(self._n + 1, self._max)
+
+        # Reset the non valid averages
+        self._sum[~valid] = 0.
+        self._c[~valid] = 0.
+        self._wsum[~valid] = 0.
+        self._wc[~valid] = 0.
+        self._n[~valid] = 0
+
+        self._buf[..., self._pos] = values
+        self._wbuf[..., self._pos] = weights
+        self._pos = (self._pos + 1) % self._max
+
+    def avg(self):
+        """
+        Return the averages (NaN if an average has no elements)
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where((self._n > 0) & (self._wsum > 0), self._sum /
+                    self._wsum, np.nan)
+
+    def full(self):
+        """
+        Return a boolean array, true if the average has max() elements
+        """
+        return self._n == self._max
+
+    def reset(self, mask=None):
+        """
+        Remove all the elements of the averages
+
+        Parameters:
+            - mask : (optional) boolean array with the averages to reset, all
+                    of them by default
+        """
+        if mask is None:
+            mask = np.ones(self._n.shape, dtype=bool)
+        self._sum[mask] = 0.
+        self._c[mask] = 0.
+        self._wsum[mask] = 0.
+        self._wc[mask] = 0.
+        self._n[mask] = 0
+
+    def nElements(self):
+        """
+        Return the current number of elements of each average
+        """
+        return self._n
 
     def max(self):
         """
@@ -0,0 +1,459 @@
+#!/usr/bin/python3
+"""
+Simulated MSR device of an AMD Rome processor.
+
+This backend keeps all the registers in memory, so Balancer can be run,
+profiled and tested on any GNU/Linux machine. To use it:
+
+    msr.setBackend(simMSR.SimMSR(threads))
+
+The following registers are modeled:
+    * Core PMCs (0xC0010200 + 2 * i, counter at + 1), six per thread.
+    * L3 PMCs (0xC0010230 + 2 * i, counter at + 1), six per CCX. The thread
+      mask (bits 56-63) selects the threads that are counted.
+    * PQR_ASSOC (0xC8F), RMID in the lower bits and COS in bits 32-63.
+    * QM_EVTSEL (0xC8D) and QM_CTR (0xC8E) for L3 occupancy (event 1) and
+      memory bandwidth (events 2 and 3, 24 bits counters).
+    * L3 masks (0xC90 + cos) and BW limits (0xC0000200 + cos), per CCX.
+    * MPERF (0xE7) and APERF (0xE8), the threads never halt and run at the
+      base frequency.
+Any other register is stored and returned without side effects.
+
+Counters advance according to a synthetic workload model (SimWorkload) that
+depends on the LLC ways and the bandwidth given to each thread.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import numpy as np
+from time import monotonic
+from random import Random
+from threading import Lock
+
+class SimWorkload:
+    """
+    Synthetic workload running on one thread. A workload has one or more
+    phases, each one is a dictionary with:
+        * ipc : IPC without LLC misses
+        * apki : L3 accesses per kilo instruction
+        * footprint : LLC footprint in bytes
+        * pf : fraction of the L3 hits due to prefetches
+    The workload moves to the next phase every phaseLen seconds.
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _phases = None
+    _phaseLen = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, phases, phaseLen=30):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - phases : list of dictionaries with the phases parameters
+            - phaseLen : seconds of every phase
+        """
+        self._phases = phases
+        self._phaseLen = phaseLen
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def phase(self, t):
+        """
+        Return the phase parameters at the given time
+
+        Parameters:
+            - t : seconds since the simulation start
+        """
+        return self._phases[int(t / self._phaseLen) % len(self._phases)]
+
+    @staticmethod
+    def random(rnd):
+        """
+        Return a random workload (cache friendly, streaming or cache
+        sensitive)
+
+        Parameters:
+            - rnd : random.Random object
+        """
+        phases = []
+        for _ in range(0, rnd.randint(1, 3)):
+            kind = rnd.choice(['friendly', 'streaming', 'sensitive'])
+            if kind == 'friendly':
+                phases.append({'ipc': rnd.uniform(1.5, 2.5),
+                    'apki': rnd.uniform(0.5, 2), 'footprint': 1 << 20,
+                    'pf': 0.2})
+            elif kind == 'streaming':
+                phases.append({'ipc': rnd.uniform(1, 2),
+                    'apki': rnd.uniform(20, 40), 'footprint': 256 << 20,
+                    'pf': 0.6})
+            else:
+                phases.append({'ipc': rnd.uniform(1, 2),
+                    'apki': rnd.uniform(5, 15),
+                    'footprint': rnd.randint(4, 12) << 20, 'pf': 0.3})
+        return SimWorkload(phases, phaseLen=rnd.uniform(10, 60))
+
+    @staticmethod
+    def idle():
+        """
+        Return a workload that does not use the LLC (e.g. the thread where
+        Balancer runs)
+        """
+        return SimWorkload([{'ipc': 1, 'apki': 0, 'footprint': 1, 'pf': 0}])
+
+class SimMSR:
+    """
+    In-memory MSR device. It implements the msr backend interface (readMSR,
+    writeMSR, readMany and close).
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    PMC_BASE = 0xC0010200
+    PMC_NUM = 6
+    L3_PMC_BASE = 0xC0010230
+    L3_PMC_NUM = 6
+    PQR_ASSOC = 0xC8F
+    QM_EVTSEL = 0xC8D
+    QM_CTR = 0xC8E
+    L3_MASK_BASE = 0xC90
+    BW_MASK_BASE = 0xC0000200
+    NUM_COS = 16
+    MPERF = 0xE7
+    APERF = 0xE8
+    PMC_WIDTH = 48
+    MBM_WIDTH = 24
+
+    # (event, umask) -> quantity of the workload model
+    CORE_EVENTS = {(0xC0, 0x00): 'ins', (0x76, 0x00): 'cyc',
+            (0x43, 0x12): 'l3hit', (0x43, 0x48): 'l3missdc',
+            (0x5A, 0x12): 'l3hitpf', (0x71, 0x3F): 'l3hitpfl2'}
+    L3_EVENTS = {(0x06, 0x01): 'l3miss', (0x90, 0x00): 'lat1',
+            (0x9A, 0x1B): 'lat2', (0x01, 0x80): 'access',
+            (0x06, 0xFF): 'access'}
+
+    _clock = None
+    _resolution = None
+    _start = None
+    _ccx = None
+    _ways = None
+    _waySize = None
+    _freq = None
+    _workload = None
+    _acc = None
+    _last = None
+    _regs = None
+    _pmc = None
+    _l3pmc = None
+    _l3mask = None
+    _bwmask = None
+    _mutex = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, threads, ccx=4, ways=16, l3Size=16 << 20, freq=2e9,
+            workloads=None, seed=0, clock=monotonic, resolution=1e-3):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - threads : list of the simulated threads
+            - ccx : threads per CCX
+            - ways : LLC ways per CCX
+            - l3Size : LLC size (bytes) per CCX
+            - freq : frequency (Hz) of the threads
+            - workloads : (optional) dictionary thread -> SimWorkload, by
+                    default a random workload is used for each thread
+            - seed : seed of the random workloads
+            - clock : function that returns the current time in seconds
+            - resolution : seconds between updates of the workload model
+        """
+        rnd = Random(seed)
+        self._clock = clock
+        self._resolution = resolution
+        self._start = clock()
+        self._ccx = ccx
+        self._ways = ways
+        self._waySize = l3Size / ways
+        self._freq = freq
+        self._workload = {}
+        self._acc = {}
+        self._last = {}
+        self._regs = {}
+        self._pmc = {}
+        self._l3pmc = {}
+        self._l3mask = {}
+        self._bwmask = {}
+        self._mutex = Lock()
+
+        for i in threads:
+            if workloads is not None and i in workloads:
+                self._workload[i] = workloads[i]
+            else:
+                self._workload[i] = SimWorkload.random(rnd)
+            self._acc[i] = {'ins': 0., 'cyc': 0., 'l3hit': 0., 'l3missdc': 0.,
+                    'l3hitpf': 0., 'l3hitpfl2': 0., 'l3miss': 0., 'lat1': 0.,
+                    'lat2': 0., 'access': 0., 'bytes': 0., 'occupancy': 0.,
+                    'rate': 0.}
+            self._last[i] = self._start
+            self._regs[i] = {}
+            self._pmc[i] = [[0, 0, 0.] for _ in range(0, self.PMC_NUM)]
+            ccx = i // self._ccx
+            if ccx not in self._l3pmc:
+                self._l3pmc[ccx] = [[0, 0, 0.] for _ in \
+                        range(0, self.L3_PMC_NUM)]
+                self._l3mask[ccx] = [(1 << ways) - 1] * self.NUM_COS
+                self._bwmask[ccx] = [2048] * self.NUM_COS
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _cos(self, cpu):
+        """
+        Return the COS associated to the given cpu
+        """
+        return self._regs[cpu].get(self.PQR_ASSOC, 0) >> 32
+
+    def _rmid(self, cpu):
+        """
+        Return the RMID associated to the given cpu
+        """
+        return self._regs[cpu].get(self.PQR_ASSOC, 0) & 0xFFFFFFFF
+
+    def _ccxThreads(self, cpu):
+        """
+        Return the simulated threads in the CCX of the given cpu
+        """
+        ccx = cpu // self._ccx
+        return [i for i in range(ccx * self._ccx, (ccx + 1) * self._ccx) \
+                if i in self._workload]
+
+    def _advance(self, cpu):
+        """
+        Advance the accumulated events of the given cpu until now
+        """
+        now = self._clock()
+        dt = now - self._last[cpu]
+        if dt <= 0 or dt < self._resolution:
+            return
+        self._last[cpu] = now
+        phase = self._workload[cpu].phase(now - self._start)
+
+        # LLC capacity: allocated ways shared with the other threads of the
+        # CCX that have overlapping masks
+        ccx = cpu // self._ccx
+        mask = self._l3mask[ccx][self._cos(cpu)]
+        sharers = sum([1 for i in self._ccxThreads(cpu) if \
+                self._l3mask[ccx][self._cos(i)] & mask])
+        capacity = bin(mask).count('1') * self._waySize / max(1, sharers)
+        occupancy = min(phase['footprint'], capacity)
+        # There are always compulsory misses
+        hr = min(0.99, (occupancy / phase['footprint']) ** 0.5)
+
+        # Performance: every miss stalls the core, the latency grows with the
+        # memory traffic of the CCX
+        latency = 250 + 150 * sum([self._acc[i]['rate'] for i in \
+                self._ccxThreads(cpu)]) / (1 << 30)
+        mpi = (phase['apki'] / 1000) * (1 - hr)
+        cpi = (1 / phase['ipc']) + mpi * latency
+        ins = (self._freq * dt) / cpi
+
+        # Bandwidth limit (1/8 GB/s units)
+        limit = self._bwmask[ccx][self._cos(cpu)] / 8 * (1 << 30) * dt
+        if ins * mpi * 64 > limit > 0:
+            ins = limit / (mpi * 64)
+
+        acc = self._acc[cpu]
+        access = ins * phase['apki'] / 1000
+        misses = access * (1 - hr)
+        acc['ins'] += ins
+        acc['cyc'] += self._freq * dt
+        acc['access'] += access
+        acc['l3miss'] += misses
+        acc['l3missdc'] += misses * (1 - phase['pf'])
+        acc['l3hit'] += access * hr * (1 - phase['pf'])
+        acc['l3hitpf'] += access * hr * phase['pf'] / 2
+        acc['l3hitpfl2'] += access * hr * phase['pf'] / 2
+        acc['lat2'] += misses
+        acc['lat1'] += misses * latency / 16
+        acc['bytes'] += misses * 64
+        acc['occupancy'] = occupancy
+        acc['rate'] = misses * 64 / dt
+
+    def _l3Threads(self, cpu, sel):
+        """
+        Return the threads counted by a L3 PMC with the given select value
+        """
+        if (sel >> 56) == 0xFF:
+            # All the threads (also in CCXs of more than 4 cores)
+            return self._ccxThreads(cpu)
+        threads = []
+        for i in self._ccxThreads(cpu):
+            k = i % self._ccx
+            if (sel >> (56 + 2 * k)) & 0x3:
+                threads.append(i)
+        return threads
+
+    def _total(self, cpu, idx, l3):
+        """
+        Return the accumulated events of one PMC
+
+        Parameters:
+            - cpu : cpu
+            - idx : PMC index
+            - l3 : true if is a L3 PMC
+        """
+        if l3:
+            sel, _, _ = self._l3pmc[cpu // self._ccx][idx]
+            event = self.L3_EVENTS.get((sel & 0xFF, (sel >> 8) & 0xFF))
+            threads = self._l3Threads(cpu, sel)
+        else:
+            sel, _, _ = self._pmc[cpu][idx]
+            event = self.CORE_EVENTS.get((sel & 0xFF, (sel >> 8) & 0xFF))
+            threads = [cpu]
+
+        if event is None or not (sel >> 22) & 0x1:
+            # Unknown event or disabled counter
+            return 0.
+        total = 0.
+        for i in threads:
+            self._advance(i)
+            total += self._acc[i][event]
+        return total
+
+    def _pmcRead(self, cpu, idx, l3):
+        """
+        Return the value of one PMC
+        """
+        pmc = self._l3pmc[cpu // self._ccx] if l3 else self._pmc[cpu]
+        _, value, base = pmc[idx]
+        value += int(self._total(cpu, idx, l3) - base)
+        return value & ((1 << self.PMC_WIDTH) - 1)
+
+    def _qmRead(self, cpu):
+        """
+        Return the value of QM_CTR for the event selected in QM_EVTSEL
+        """
+        evtsel = self._regs[cpu].get(self.QM_EVTSEL, 0)
+        event = evtsel & 0xFF
+        rmid = evtsel >> 32
+        threads = [i for i in self._ccxThreads(cpu) if self._rmid(i) == rmid]
+        for i in threads:
+            self._advance(i)
+
+        if event == 1:
+            # L3 occupancy (64 bytes units)
+            return int(sum([self._acc[i]['occupancy'] for i in threads]) / 64)
+        elif event in (2, 3):
+            # Memory bandwidth (64 bytes units)
+            value = int(sum([self._acc[i]['bytes'] for i in threads]) / 64)
+            return value & ((1 << self.MBM_WIDTH) - 1)
+        return 0
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def readMSR(self, cpu, reg):
+        """
+        Read the given MSR in the given CPU.
+
+        Parameters :
+            cpu : cpu number
+            reg : msr register
+
+        Return :
+            Reading value
+        """
+        with (self._mutex):
+            ccx = cpu // self._ccx
+            if self.PMC_BASE <= reg < self.PMC_BASE + 2 * self.PMC_NUM:
+                idx = (reg - self.PMC_BASE) // 2
+                if reg % 2:
+                    return self._pmcRead(cpu, idx, False)
+                return self._pmc[cpu][idx][0]
+            elif self.L3_PMC_BASE <= reg < self.L3_PMC_BASE + \
+                    2 * self.L3_PMC_NUM:
+                idx = (reg - self.L3_PMC_BASE) // 2
+                if reg % 2:
+                    return self._pmcRead(cpu, idx, True)
+                return self._l3pmc[ccx][idx][0]
+            elif reg == self.QM_CTR:
+                return self._qmRead(cpu)
+            elif reg in (self.MPERF, self.APERF):
+                return int(self._freq * (self._clock() - self._start)) & \
+                        ((1 << 64) - 1)
+            elif self.L3_MASK_BASE <= reg < self.L3_MASK_BASE + self.NUM_COS:
+                return self._l3mask[ccx][reg - self.L3_MASK_BASE]
+            elif self.BW_MASK_BASE <= reg < self.BW_MASK_BASE + self.NUM_COS:
+                return self._bwmask[ccx][reg - self.BW_MASK_BASE]
+            return self._regs[cpu].get(reg, 0)
+
+    def writeMSR(self, cpu, reg, value):
+        """
+        Write the given MSR in the given CPU.
+
+        Parameters :
+            cpu : cpu number
+            reg : msr register
+            value : value to write into the msr
+        """
+        with (self._mutex):
+            ccx = cpu // self._ccx
+            if self.PMC_BASE <= reg < self.PMC_BASE + 2 * self.PMC_NUM or \
+                    self.L3_PMC_BASE <= reg < self.L3_PMC_BASE + \
+                    2 * self.L3_PMC_NUM:
+                l3 = reg >= self.L3_PMC_BASE
+                pmc = self._l3pmc[ccx] if l3 else self._pmc[cpu]
+                idx = (reg - (self.L3_PMC_BASE if l3 else self.PMC_BASE)) // 2
+                if reg % 2:
+                    # Counter: start counting from the written value
+                    pmc[idx][1] = value
+                    pmc[idx][2] = self._total(cpu, idx, l3)
+                else:
+                    # Select: keep the counter value and change the event
+                    pmc[idx][1] = self._pmcRead(cpu, idx, l3)
+                    pmc[idx][0] = value
+                    pmc[idx][2] = self._total(cpu, idx, l3)
+                return
+
+            if reg == self.PQR_ASSOC or \
+                    self.L3_MASK_BASE <= reg < self.L3_MASK_BASE + \
+                    self.NUM_COS or \
+                    self.BW_MASK_BASE <= reg < self.BW_MASK_BASE + self.NUM_COS:
+                # The allocation of the CCX changes, account the old one
+                for i in self._ccxThreads(cpu):
+                    self._advance(i)
+
+            if self.L3_MASK_BASE <= reg < self.L3_MASK_BASE + self.NUM_COS:
+                self._l3mask[ccx][reg - self.L3_MASK_BASE] = value
+            elif self.BW_MASK_BASE <= reg < self.BW_MASK_BASE + self.NUM_COS:
+                self._bwmask[ccx][reg - self.BW_MASK_BASE] = value
+            else:
+                self._regs[cpu][reg] = value
+
+    def readMany(self, cpus, regs, out=None):
+        """
+        Read a set of MSRs in a set of CPUs, see msr.readMany
+        """
+        regs = np.asarray(regs, dtype=np.uint64)
+        if regs.ndim == 1:
+            regs = np.broadcast_to(regs, (len(cpus), regs.shape[0]))
+        if out is None:
+            out = np.empty(regs.shape, dtype=np.uint64)
+        for row, cpu in enumerate(cpus):
+            for col, reg in enumerate(regs[row].tolist()):
+                out[row, col] = self.readMSR(cpu, reg)
+        return out
+
+    def close(self):
+        """
+        Nothing to close, the device is in memory
+        """
+        return
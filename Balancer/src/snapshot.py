@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Timestamped snapshot of the hardware counters of a set of cores
+
+Every row of the snapshot (one core) has the monotonic time when it was read
+and the generation of the job that was running in the core. The generation
+changes every time that a job is launched (and its counters are reset), so
+the difference between two snapshots knows when the counters started again
+from zero. Counters are 48 bits, the difference is computed modulo 2^48 to
+survive wraparounds.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import numpy as np
+
+class Snapshot:
+    """
+    Hardware counters of a set of cores read at a given time
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    PMC_MASK = np.uint64((1 << 48) - 1)
+
+    _cores = None # List of cores (row order)
+    _values = None # Counter values (cores x counters)
+    _time = None # Monotonic time of the read of each core
+    _gen = None # Job generation of each core
+    _ccxGen = None # Generation of the CCX shared counters of each core
+    _start = None # Monotonic time when the current job of each core started
+    _ccxStart = None # Monotonic time when the CCX shared counters of each
+                     # core were reset
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, cores, values, time, gen, ccxGen, start, ccxStart):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - cores : list of cores
+            - values : uint64 matrix with the counters (cores x counters)
+            - time : array with the time of the read of each core
+            - gen : array with the job generation of each core
+            - ccxGen : array with the generation of the CCX shared counters
+            - start : array with the time when the job of each core started
+            - ccxStart : array with the time when the CCX shared counters of
+                    each core were reset
+        """
+        self._cores = cores
+        self._values = values
+        self._time = time
+        self._gen = gen
+        self._ccxGen = ccxGen
+        self._start = start
+        self._ccxStart = ccxStart
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def cores(self):
+        """
+        Return the list of cores
+        """
+        return self._cores
+
+    def values(self):
+        """
+        Return the counter values (cores x counters)
+        """
+        return self._values
+
+    def time(self):
+        """
+        Return the time of the read of each core
+        """
+        return self._time
+
+    def delta(self, old, shared):
+        """
+        Return the counter increments and the elapsed time of each core since
+        an older snapshot of the same cores.
+
+        If a job was launched in a core between both snapshots, its counters
+        were reset, so the increment is the new value and the elapsed time
+        starts when the job was launched. The shared (CCX) counters do the
+        same when any job of the CCX was launched, so the elapsed time of
+        every core of that CCX starts at the launch (its own counters are
+        not reset, but the shared ones are used as rates).
+
+        Parameters:
+            - old : older snapshot
+            - shared : boolean array that flags the CCX shared counters
+
+        Return : (float64 matrix with the increments, float64 array with the
+            elapsed seconds of each core)
+        """
+        # Modulo 2^48 difference (the uint64 subtraction wraps at 2^64)
+        delta = (self._values - old._values) & self.PMC_MASK
+        dt = self._time - old._time
+
+        # Cores with a new job
+        newJob = self._gen != old._gen
+        if newJob.any():
+            cols = ~shared
+            delta[np.ix_(newJob, cols)] = self._values[np.ix_(newJob, cols)]
+            dt[newJob] = self._time[newJob] - self._start[newJob]
+
+        # CCXs where a job was launched
+        newCCX = self._ccxGen != old._ccxGen
+        if newCCX.any() and shared.any():
+            delta[np.ix_(newCCX, shared)] = self._values[np.ix_(newCCX,
+                shared)]
+            dt[newCCX] = np.minimum(dt[newCCX], self._time[newCCX] -
+                    self._ccxStart[newCCX])
+
+        return delta.astype(np.float64), dt
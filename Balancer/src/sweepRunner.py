@@ -0,0 +1,407 @@
+#!/usr/bin/python3
+"""
+Parallel and resumable runner of the Characterization sweeps.
+
+The scripts of Characterization/LLC and Characterization/BW run every point
+(LLC mask x benchmark x interference level) one after the other on cpu 0.
+This runner has one slot per CCX (the first of its threads in the config,
+the rest of the CCX is left idle) and runs one point in every slot at the
+same time:
+    * The job of a point runs pinned to the cpu of its slot with the LLC mask
+      of the point in the COS of the cpu (PQOS). The LLC is private to the
+      CCX, so the jobs of different slots do not share cache and the L3
+      counters of the CCX only count the job.
+    * The interference levels are run one after the other: the triad
+      instances of a level run on their cpus (their CCXs are not used as
+      slots) while all the points of the level are run. The DRAM is shared
+      by all the slots, the number of jobs running at the end of each point
+      is in its output (Slots) so the points can be filtered or the sweep
+      can be run with fewer slots.
+    * Every point writes the <mask>.out (without levels) or
+      <mask>-Triads_<k>.out file of the scripts (the "name: value" lines of
+      lib/py/hwCounters.py, see profileDB) and is appended to a journal
+      (sweep.jsonl in the output directory). A new run skips the points of
+      the journal, so a sweep that crashed resumes where it stopped. The
+      jobs that fail or time out are also in the journal and they are only
+      run again up to attempts times.
+    * The MBM counter of the slot is read every mbm_period seconds while the
+      job runs, so its wraps are accounted (BW).
+    * At the end, the throughput and the utilization of each slot are
+      reported.
+
+Config file:
+{
+    "threads": [0, 4, 8, 12], # Cpus that can be used (one slot per CCX)
+    "hwCounters": {...}, # Hardware counters (as in Balancer)
+    "out": "out", # Output directory
+    "benchmarks": { # Name (<number>.<exe>.<input>) -> command (see jobSpec)
+        "505.mcf_r.1": "cd /spec/505.mcf_r && ./mcf_r inp.in"
+    },
+    "llc_masks": ["0x1000", "0xFFFF"], # (optional) 17 masks of the scripts
+    "triads": {"0": [], "3": [8, 16, 24]}, # (optional) Level -> triad cpus
+    "triad_cmd": "../../Characterization/BW/c/triad", # Triad kernel
+    "timeout": 10800, # (optional) Seconds of a job before it is killed
+    "attempts": 2, # (optional) Runs of a failed point (resumes included)
+    "mbm_period": 0.05, # (optional) Seconds between two MBM reads, the
+                        # counter must not wrap (1 GiB with 24 bits)
+    "mbm_peak": 8, # (optional) Peak bandwidth (GiB/s) of a thread, the BW of
+                   # a point is NaN if two MBM reads are more apart than
+                   # 2^mbm_width * 64 bytes / mbm_peak
+    "msr": "dev" # dev or sim
+}
+
+Usage: sweepRunner.py [config file]
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import sys
+import json
+import queue
+import signal
+import subprocess
+import threading
+from time import monotonic, sleep
+
+import msr
+import simMSR
+import PQOS
+import HWCounters
+import topology
+import jobSpec
+
+# Masks of Characterization/LLC/sh/*.sh
+LLC_MASKS = ["0x0",
+        "0x1000", "0x3000", "0x7000", "0xF000",
+        "0xF100", "0xF300", "0xF700", "0xFF00",
+        "0xFF10", "0xFF30", "0xFF70", "0xFFF0",
+        "0xFFF1", "0xFFF3", "0xFFF7", "0xFFFF"]
+JOURNAL = "sweep.jsonl"
+
+class SweepRunner:
+    """
+    Class to run the points of a sweep in parallel
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _config = None
+    _out = None # Output directory
+    _topo = None
+    _hwc = None
+    _pqos = None
+    _slots = None # Cpu of each slot
+    _levels = None # Interference level -> triad cpus (None without levels)
+    _done = None # Points of the journal (level, mask, benchmark)
+    _failed = None # Failed runs of each point in the journal
+    _journal = None # Journal file
+    _running = 0 # Jobs running
+    _stats = None # Points, failed points and busy seconds of each slot
+    _mutex = None
+    _stop = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, config):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - config : dictionary with the configuration (see the header)
+        """
+        self._config = config
+        self._out = config.get('out', 'out')
+        sysfs = None if config.get('msr', 'dev') == 'sim' else \
+                config.get('sysfs', '/sys/devices/system/cpu')
+        self._topo = topology.Topology(sysfs,
+                ccxSize=config.get('ccx_size', 4),
+                ccxPerCcd=config.get('ccx_per_ccd', None))
+        self._hwc = HWCounters.HWCounters(config['hwCounters'],
+                cpus=config['threads'], topo=self._topo)
+        self._pqos = PQOS.PQOS(mbmWidth=config.get('mbm_width', 24),
+                topo=self._topo, mbmPeak=config.get('mbm_peak', 8))
+        self._levels = None
+        if 'triads' in config:
+            self._levels = {int(i): list(config['triads'][i]) for i in
+                    config['triads']}
+
+        # One slot per CCX without triads
+        busy = set()
+        for cpus in (self._levels or {}).values():
+            busy.update([self._topo.ccx(i) for i in cpus])
+        self._slots = [cpus[0] for ccx, cpus in
+                self._topo.group(config['threads']) if ccx not in busy]
+        if len(self._slots) == 0:
+            raise ValueError("No CCX without triads in the threads")
+
+        self._done = set()
+        self._failed = {}
+        os.makedirs(self._out, exist_ok=True)
+        path = os.path.join(self._out, JOURNAL)
+        torn = False
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # Last line of a crash
+                        continue
+                    point = (rec['triads'], rec['mask'], rec['bench'])
+                    if rec.get('status', 'ok') != 'ok':
+                        self._failed[point] = self._failed.get(point, 0) + 1
+                    elif os.path.exists(rec['path']):
+                        self._done.add(point)
+                torn = f.tell() > 0 and not line.endswith("\n")
+        self._journal = open(path, 'a')
+        if torn:
+            # The next record must not be appended to the last line
+            self._journal.write("\n")
+        self._running = 0
+        self._stats = {i: [0, 0, 0.] for i in self._slots}
+        self._mutex = threading.Lock()
+        self._stop = threading.Event()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _points(self, level):
+        """
+        Return the points of a level that are not in the journal (the
+        failed points are retried until they fail attempts times)
+        """
+        masks = self._config.get('llc_masks', LLC_MASKS)
+        attempts = self._config.get('attempts', 2)
+        return [(level, mask, bench) for mask in masks for bench in
+                sorted(self._config['benchmarks']) if (level, mask, bench)
+                not in self._done and self._failed.get((level, mask, bench),
+                    0) < attempts]
+
+    def _path(self, point):
+        """
+        Return the output file of a point
+        """
+        level, mask, bench = point
+        name = mask if level is None else "{}-Triads_{}".format(mask, level)
+        return os.path.join(self._out, bench, name + ".out")
+
+    def _run(self, cpu, point):
+        """
+        Run one point in the slot of a cpu
+
+        Return : true if the job finished without errors
+        """
+        level, mask, bench = point
+        spec = jobSpec.parse(self._config['benchmarks'][bench])
+        cos = self._topo.cos(cpu)
+        self._pqos.l3Allocation(True, cos, int(mask, 16), cpu)
+        self._hwc.start(cpu)
+        mbm = self._pqos.mbmRead(cpu)
+        t = monotonic()
+        with (self._mutex):
+            self._running += 1
+        timeout = self._config.get('timeout', 10800)
+        period = self._config.get('mbm_period', .05)
+        valid = mbm is not None
+        code = None
+        try:
+            try:
+                proc = jobSpec.spawn(spec, cpu)
+            except OSError as err:
+                # e.g. the executable does not exist
+                sys.stderr.write("Point {}: {}\n".format(point, err))
+                sys.stderr.flush()
+                proc, code = None, 127
+            while code is None:
+                wait = period
+                if timeout is not None:
+                    wait = max(min(period, t + timeout - monotonic()), 0)
+                try:
+                    code = proc.wait(timeout=wait)
+                except subprocess.TimeoutExpired:
+                    # The MBM counter must be read before it wraps
+                    valid = self._pqos.mbmRead(cpu) is not None and valid
+                    if timeout is not None and monotonic() - t >= timeout:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                        proc.wait()
+                        break
+        finally:
+            elapsed = monotonic() - t
+            with (self._mutex):
+                slots = self._running
+                self._running -= 1
+        values = self._hwc.readValues(cpu)
+        last = self._pqos.mbmRead(cpu)
+        self._pqos.l3Allocation(False, cos, 0xFFFF, cpu)
+        if code != 0:
+            self._record(point, None, cpu, elapsed, 'timeout' if code is
+                    None else 'failed', code)
+            return False
+
+        bw = float('nan')
+        if valid and last is not None and elapsed > 0:
+            bw = (last - mbm) / 1024 / 1024 / elapsed
+        path = self._path(point)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'w') as f:
+            for name in values:
+                f.write("{}: {}\n".format(name, values[name]))
+            f.write("Time (s): {}\n".format(elapsed))
+            f.write("BW (MB/s): {}\n".format(bw))
+            f.write("Slots: {}\n".format(slots))
+        # A crash never leaves a partial output
+        os.replace(path + ".tmp", path)
+
+        self._record(point, path, cpu, elapsed, 'ok', code)
+        return True
+
+    def _record(self, point, path, cpu, elapsed, status, code):
+        """
+        Append a point to the journal
+
+        Parameters:
+            - point : (level, mask, benchmark)
+            - path : output file (None if the point failed)
+            - cpu : cpu of the slot
+            - elapsed : seconds of the job
+            - status : ok, failed (exit code not 0) or timeout
+            - code : exit code (None after a timeout)
+        """
+        level, mask, bench = point
+        with (self._mutex):
+            self._journal.write(json.dumps({'triads': level, 'mask': mask,
+                'bench': bench, 'path': path, 'cpu': cpu, 'time': elapsed,
+                'status': status, 'code': code}) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            if status == 'ok':
+                self._done.add(point)
+            else:
+                self._failed[point] = self._failed.get(point, 0) + 1
+
+    def _worker(self, cpu, points):
+        """
+        Run points in the slot of a cpu until there are no more
+        """
+        while not self._stop.is_set():
+            try:
+                point = points.get_nowait()
+            except queue.Empty:
+                return
+            t = monotonic()
+            ok = self._run(cpu, point)
+            with (self._mutex):
+                self._stats[cpu][0] += 1
+                self._stats[cpu][1] += not ok
+                self._stats[cpu][2] += monotonic() - t
+            if not ok:
+                sys.stderr.write("Point {} failed in cpu {}\n".format(point,
+                    cpu))
+                sys.stderr.flush()
+
+    def _level(self, level, points):
+        """
+        Run the points of an interference level
+        """
+        triads = []
+        if level is not None:
+            cmd = jobSpec.parse(self._config.get('triad_cmd',
+                "../../Characterization/BW/c/triad"))
+            triads = [jobSpec.spawn(cmd, i) for i in self._levels[level]]
+            if len(triads) > 0:
+                # Warm up of the interference
+                sleep(1)
+        try:
+            work = queue.Queue()
+            for point in points:
+                work.put(point)
+            threads = [threading.Thread(target=self._worker, args=(i, work))
+                    for i in self._slots]
+            for i in threads:
+                i.start()
+            for i in threads:
+                i.join()
+        finally:
+            for proc in triads:
+                proc.kill()
+                proc.wait()
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def slots(self):
+        """
+        Return the cpu of each slot
+        """
+        return list(self._slots)
+
+    def stop(self):
+        """
+        Stop the sweep after the points that are running
+        """
+        self._stop.set()
+
+    def run(self):
+        """
+        Run the points that are not in the journal
+
+        Return : seconds of the run
+        """
+        t = monotonic()
+        levels = [None] if self._levels is None else sorted(self._levels)
+        for level in levels:
+            points = self._points(level)
+            if len(points) > 0 and not self._stop.is_set():
+                self._level(level, points)
+        return monotonic() - t
+
+    def report(self, elapsed):
+        """
+        Return the throughput and the utilization of the slots
+
+        Parameters:
+            - elapsed : seconds of the run
+        """
+        done = sum([i[0] - i[1] for i in self._stats.values()])
+        failed = sum([i[1] for i in self._stats.values()])
+        lines = ["Points: {} failed: {} in {:.1f} s ({:.1f} points/hour), {} "
+                "in the journal".format(done, failed, elapsed, done * 3600 /
+                    elapsed if elapsed > 0 else 0, len(self._done))]
+        for cpu in self._slots:
+            points, fail, busy = self._stats[cpu]
+            lines.append("Slot cpu {}: runs {} failed {} busy {:.1f} s "
+                    "utilization {:.1%}".format(cpu, points, fail, busy,
+                        busy / elapsed if elapsed > 0 else 0))
+        return "\n".join(lines)
+
+    def close(self):
+        """
+        Close the journal and release the monitors of PQOS
+        """
+        self._pqos.close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: sweepRunner.py [config file]")
+        sys.exit(1)
+    config = json.load(open(sys.argv[1]))
+    if config.get('msr', 'dev') == 'sim':
+        # Simulated MSR device
+        msr.setBackend(simMSR.SimMSR(config['threads'],
+            ccx=config.get('ccx_size', 4)))
+    runner = SweepRunner(config)
+    # Ctrl+C finishes the points that are running, the rest are resumed by
+    # the next run
+    signal.signal(signal.SIGINT, lambda signum, frame: runner.stop())
+    sys.stderr.write("Slots: {}\n".format(runner.slots()))
+    sys.stderr.flush()
+    elapsed = runner.run()
+    print(runner.report(elapsed))
+    runner.close()
+    msr.close()
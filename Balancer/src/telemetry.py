@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+"""
+Columnar recorder of the per-epoch telemetry (counter increments, derived
+metrics, occupancy and applied masks) on memory-mapped files.
+
+A telemetry run is a directory with:
+    * header : magic (8 bytes), number of epochs written (uint64), length of
+            the description (uint64) and the description in JSON (cores and
+            columns with their file, dtype and shape).
+    * colN.bin : raw values of column N, one row per epoch (a scalar or one
+            value per core).
+The column files grow in chunks of epochs. The number of epochs is updated
+after the row is written, so a reader always sees complete epochs, even
+while the run is still being recorded.
+
+load() maps the columns as NumPy arrays without copying them, a 10 hours
+run of 128 threads is loaded in milliseconds.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b'BALTLM\x00\x01'
+HEADER = struct.Struct('<8sQQ') # magic, epochs, description length
+
+def load(path):
+    """
+    Load a telemetry run
+
+    Parameters:
+        - path : directory of the run
+
+    Return : (list of cores, dictionary column name -> read-only array with
+        one row per epoch)
+    """
+    with open(os.path.join(path, "header"), 'rb') as f:
+        magic, epochs, size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a telemetry run".format(path))
+        desc = json.loads(f.read(size))
+
+    columns = {}
+    for col in desc['columns']:
+        shape = (epochs,) + tuple(col['shape'])
+        if epochs == 0:
+            columns[col['name']] = np.empty(shape, dtype=col['dtype'])
+        else:
+            columns[col['name']] = np.memmap(os.path.join(path, col['file']),
+                    dtype=col['dtype'], mode='r', shape=shape)
+    return desc['cores'], columns
+
+class Recorder:
+    """
+    Append the telemetry of every epoch to a run directory
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _path = None
+    _cores = None
+    _chunk = None # Epochs added every time that the files grow
+    _epochs = 0 # Epochs written
+    _capacity = 0 # Epochs that fit in the files
+    _columns = None # Description of the columns (name, file, dtype, shape)
+    _maps = None # Memory maps of the columns (same order than _columns)
+    _header = None # Memory map of the header
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, path, cores, chunk=1024):
+        """
+        Constructor of the class. The columns are created by the first call
+        to append.
+
+        Parameters:
+            - path : directory of the run (created if it does not exist)
+            - cores : list of cores
+            - chunk : epochs added to the files every time that they grow
+        """
+        self._path = path
+        self._cores = list(cores)
+        self._chunk = chunk
+        self._epochs = 0
+        self._capacity = 0
+        self._columns = None
+        self._maps = []
+        os.makedirs(path, exist_ok=True)
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _create(self, values):
+        """
+        Create the header and the column files from the first epoch
+
+        Parameters:
+            - values : dictionary column name -> value of the first epoch
+        """
+        self._columns = []
+        for idx, name in enumerate(values):
+            value = np.asarray(values[name])
+            self._columns.append({'name': name, 'file': "col{}.bin"\
+                    .format(idx), 'dtype': value.dtype.str,
+                    'shape': list(value.shape)})
+
+        desc = json.dumps({'cores': self._cores,
+            'columns': self._columns}).encode()
+        with open(os.path.join(self._path, "header"), 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 0, len(desc)))
+            f.write(desc)
+        f = open(os.path.join(self._path, "header"), 'r+b')
+        self._header = mmap.mmap(f.fileno(), HEADER.size)
+        f.close()
+
+        for col in self._columns:
+            # Empty files, they grow in _grow
+            open(os.path.join(self._path, col['file']), 'wb').close()
+        self._grow()
+
+    def _grow(self):
+        """
+        Add chunk epochs to the column files and map them again
+        """
+        self._capacity += self._chunk
+        for m in self._maps:
+            m.flush()
+        self._maps = []
+        for col in self._columns:
+            shape = (self._capacity,) + tuple(col['shape'])
+            fname = os.path.join(self._path, col['file'])
+            with open(fname, 'r+b') as f:
+                f.truncate(int(np.prod(shape)) * np.dtype(col['dtype'])\
+                        .itemsize)
+            self._maps.append(np.memmap(fname, dtype=col['dtype'],
+                mode='r+', shape=shape))
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def append(self, values):
+        """
+        Append the values of one epoch
+
+        Parameters:
+            - values : dictionary column name -> value (a scalar or an array
+                    with one value per core). Every epoch must have the same
+                    columns.
+        """
+        if self._columns is None:
+            self._create(values)
+        elif self._epochs == self._capacity:
+            self._grow()
+
+        for col, m in zip(self._columns, self._maps):
+            m[self._epochs] = values[col['name']]
+        self._epochs += 1
+        # Publish the epoch once its row is complete
+        struct.pack_into('<Q', self._header, 8, self._epochs)
+
+    def epochs(self):
+        """
+        Return the number of epochs written
+        """
+        return self._epochs
+
+    def close(self):
+        """
+        Flush the files and remove the space not used
+        """
+        if self._columns is None:
+            return
+        for m in self._maps:
+            m.flush()
+        self._maps = []
+        for col in self._columns:
+            rowSize = int(np.prod(col['shape'])) * np.dtype(col['dtype'])\
+                    .itemsize
+            with open(os.path.join(self._path, col['file']), 'r+b') as f:
+                f.truncate(self._epochs * rowSize)
+        self._header.flush()
+        self._header.close()
+        self._columns = None
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    import tempfile
+    from time import perf_counter
+    with tempfile.TemporaryDirectory() as tmp:
+        cores = list(range(0, 128))
+        rec = Recorder(tmp, cores, chunk=256)
+        t = perf_counter()
+        for epoch in range(0, 1000):
+            rec.append({'time': float(epoch), 'cpi': np.full(len(cores),
+                epoch, dtype=np.float64), 'cos': np.arange(len(cores),
+                    dtype=np.uint8)})
+        t = perf_counter() - t
+        print("Append: {:.1f} us/epoch".format(t / 1000 * 1e6))
+        # The run can be read while it is recorded
+        print(load(tmp)[1]['cpi'].shape)
+        rec.close()
+        cores, columns = load(tmp)
+        print(columns['time'][-1], columns['cpi'][-1, :4], columns['cos'][0,
+            :4], columns['cpi'].shape)
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+Lock that measures the time that the threads wait to acquire it
+
+Every TimedLock is registered with a name, report() returns the statistics
+of all of them (locks with the same name, e.g. one per cpu, are added up).
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+from threading import Lock
+from time import perf_counter
+
+# All the locks created
+_locks = []
+
+class TimedLock:
+    """
+    Lock (it can be used with the with statement) that accounts the number of
+    acquisitions, how many of them had to wait and the total waiting time.
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _lock = None
+    _name = None
+    _acquired = 0
+    _contended = 0
+    _wait = 0
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, name):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - name : name of the lock in the report, locks with the same
+                    name are reported together
+        """
+        self._lock = Lock()
+        self._name = name
+        self._acquired = 0
+        self._contended = 0
+        self._wait = 0
+        _locks.append(self)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def acquire(self):
+        """
+        Acquire the lock
+        """
+        if not self._lock.acquire(blocking=False):
+            # Someone has the lock, measure the time we wait for it
+            t = perf_counter()
+            self._lock.acquire()
+            # Statistics are updated with the lock held
+            self._wait += perf_counter() - t
+            self._contended += 1
+        self._acquired += 1
+
+    def release(self):
+        """
+        Release the lock
+        """
+        self._lock.release()
+
+    def name(self):
+        """
+        Return the name of the lock
+        """
+        return self._name
+
+    def stats(self):
+        """
+        Return the statistics of the lock: (acquisitions, contended
+        acquisitions, seconds waiting)
+        """
+        return self._acquired, self._contended, self._wait
+
+def report():
+    """
+    Return a string with the statistics of all the locks (one per line)
+    """
+    group = {}
+    for lock in _locks:
+        acq, cont, wait = lock.stats()
+        n, a, c, w = group.get(lock.name(), (0, 0, 0, 0))
+        group[lock.name()] = (n + 1, a + acq, c + cont, w + wait)
+
+    lines = []
+    for name in sorted(group):
+        n, acq, cont, wait = group[name]
+        lines.append("Lock {} (x{}): acquired {} contended {} wait {:.3f} ms"\
+                .format(name, n, acq, cont, wait * 1000))
+    return '\n'.join(lines)
@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+"""
+CPU topology of the machine, read once from sysfs at startup.
+
+For every cpu (physical thread) it knows:
+    * ccx : L3 cache domain (cache/index3/shared_cpu_list and cache/index3/id)
+    * ccd : die with one or more CCXs
+    * socket : topology/physical_package_id
+    * node : NUMA node (cpuN/nodeX)
+    * core : physical core (topology/thread_siblings_list) and the position
+            of the thread inside it (smt)
+The position of a core inside its CCX is used to select the per-thread L3
+PMC and the COS of a cpu (see cos()), so Balancer does not assume a Rome CCX of 4 cores
+nor a contiguous list of threads.
+
+AMD does not export the CCD in sysfs. Rome (Zen2) has 2 CCXs per CCD, Milan
+and Genoa (Zen3/Zen4) have one CCX of 8 cores per CCD, so by default a CCD
+has 2 CCXs if the CCXs have 4 cores or less, otherwise 1.
+
+Without sysfs information (e.g. a virtual machine or the simulated MSR
+device) the cpus are grouped in CCXs of ccxSize consecutive cpus, without
+SMT, one socket and one NUMA node.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import re
+import numpy as np
+
+def parseList(value):
+    """
+    Parse a sysfs cpu list (e.g. "0-3,64-67")
+
+    Parameters:
+        - value : string with the list
+
+    Return : sorted list of cpus
+    """
+    cpus = []
+    for i in value.strip().split(','):
+        if i == '':
+            continue
+        if '-' in i:
+            start, end = i.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(i))
+    return sorted(cpus)
+
+class Topology:
+    """
+    Class with the topology of the cpus
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    LEVELS = ('ccx', 'ccd', 'socket', 'node')
+    MAX_COS = 15 # COS of a CCX without the default one (COS 0 to 15)
+
+    _sysfs = None # CPU sysfs directory (None to use the fallback layout)
+    _ccxSize = None # Cpus per CCX of the fallback layout
+    _ccxPerCcd = None # CCXs per CCD (None to guess it)
+    _info = None # Topology of each cpu (cpu -> dictionary)
+    _members = None # Cpus of each CCX (ccx -> sorted list)
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, sysfs="/sys/devices/system/cpu", ccxSize=4,
+            ccxPerCcd=None):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - sysfs : directory with the cpu information, None to use the
+                    fallback layout
+            - ccxSize : cpus per CCX of the fallback layout
+            - ccxPerCcd : CCXs per CCD, by default 2 if the CCXs have 4 cores
+                    or less (Rome), otherwise 1 (Milan/Genoa)
+        """
+        self._sysfs = sysfs
+        self._ccxSize = ccxSize
+        self._ccxPerCcd = ccxPerCcd
+        self._info = {}
+        self._members = {}
+
+        if sysfs is not None:
+            self._read()
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _readFile(self, *path):
+        """
+        Return the content of a sysfs file, or None if it does not exist
+        """
+        try:
+            with open(os.path.join(self._sysfs, *path)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _read(self):
+        """
+        Read the topology of all the cpus from sysfs. If the L3 information is
+        not available the fallback layout is used.
+        """
+        try:
+            dirs = os.listdir(self._sysfs)
+        except OSError:
+            self._sysfs = None
+            return
+        cpus = sorted([int(i[3:]) for i in dirs if re.match(r'cpu\d+$', i)])
+
+        info = {}
+        llc = {} # L3 cpu list -> ccx
+        for cpu in cpus:
+            name = "cpu{}".format(cpu)
+            shared = self._readFile(name, "cache", "index3",
+                    "shared_cpu_list")
+            if shared is None:
+                # Offline cpu or no L3 information
+                continue
+            shared = tuple(parseList(shared))
+            if shared not in llc:
+                cid = self._readFile(name, "cache", "index3", "id")
+                llc[shared] = int(cid) if cid is not None else len(llc)
+
+            siblings = self._readFile(name, "topology",
+                    "thread_siblings_list")
+            siblings = parseList(siblings) if siblings is not None else [cpu]
+            socket = self._readFile(name, "topology", "physical_package_id")
+            node = [int(i[4:]) for i in os.listdir(os.path.join(self._sysfs,
+                name)) if re.match(r'node\d+$', i)]
+
+            info[cpu] = {
+                    'ccx': llc[shared],
+                    'socket': int(socket) if socket is not None else 0,
+                    'node': node[0] if len(node) > 0 else 0,
+                    'core': siblings[0],
+                    'smt': siblings.index(cpu) if cpu in siblings else 0,
+                    }
+
+        if len(info) == 0:
+            # Without L3 information use the fallback layout
+            self._sysfs = None
+            return
+
+        for cpu in info:
+            self._add(cpu, info[cpu])
+
+    def _fallback(self, cpu):
+        """
+        Return the topology of a cpu in the fallback layout
+        """
+        ccx = cpu // self._ccxSize
+        return {'ccx': ccx, 'socket': 0, 'node': 0, 'core': cpu, 'smt': 0}
+
+    def _add(self, cpu, info):
+        """
+        Add a cpu to the topology and update the position of the cores inside
+        its CCX
+        """
+        self._info[cpu] = info
+        members = self._members.setdefault(info['ccx'], [])
+        members.append(cpu)
+        members.sort()
+
+        # Position of the physical cores inside the CCX
+        cores = sorted(set([self._info[i]['core'] for i in members]))
+        if self._ccxPerCcd is not None:
+            perCcd = self._ccxPerCcd
+        else:
+            perCcd = 2 if len(cores) <= 4 else 1
+        for i in members:
+            self._info[i]['pos'] = cores.index(self._info[i]['core'])
+            self._info[i]['ccd'] = info['ccx'] // perCcd
+
+    def _get(self, cpu):
+        """
+        Return the topology of the given cpu
+        """
+        if cpu not in self._info:
+            if self._sysfs is not None:
+                raise ValueError("cpu {} is not in {}".format(cpu,
+                    self._sysfs))
+            # Add the whole CCX so the positions do not depend on the order
+            # of the calls
+            ccx = cpu // self._ccxSize
+            for i in range(ccx * self._ccxSize, (ccx + 1) * self._ccxSize):
+                if i not in self._info:
+                    self._add(i, self._fallback(i))
+        return self._info[cpu]
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def ccx(self, cpu):
+        """
+        Return the CCX (L3 domain) of the given cpu
+        """
+        return self._get(cpu)['ccx']
+
+    def ccd(self, cpu):
+        """
+        Return the CCD of the given cpu
+        """
+        return self._get(cpu)['ccd']
+
+    def socket(self, cpu):
+        """
+        Return the socket of the given cpu
+        """
+        return self._get(cpu)['socket']
+
+    def node(self, cpu):
+        """
+        Return the NUMA node of the given cpu
+        """
+        return self._get(cpu)['node']
+
+    def core(self, cpu):
+        """
+        Return the physical core (its first thread) of the given cpu
+        """
+        return self._get(cpu)['core']
+
+    def smt(self, cpu):
+        """
+        Return the position of the given cpu inside its physical core
+        """
+        return self._get(cpu)['smt']
+
+    def position(self, cpu):
+        """
+        Return the position of the physical core of the given cpu inside its
+        CCX (0 for the first core of the CCX)
+        """
+        return self._get(cpu)['pos']
+
+    def ccxCpus(self, cpu):
+        """
+        Return all the cpus of the CCX of the given cpu
+        """
+        return list(self._members[self._get(cpu)['ccx']])
+
+    def cos(self, cpu):
+        """
+        Return the COS of the given cpu (COS 0 is the default one). Each cpu
+        of a CCX has its own COS if the CCX has MAX_COS threads or less (e.g.
+        Rome, 4 cores with SMT), otherwise the SMT siblings of a core share
+        the COS of the core (e.g. Milan and Genoa, 8 cores with SMT).
+
+        Raise : ValueError if the CCX has more than MAX_COS cores
+        """
+        members = self.ccxCpus(cpu)
+        if len(members) <= self.MAX_COS:
+            return members.index(cpu) + 1
+        if self.position(cpu) >= self.MAX_COS:
+            raise ValueError("CCX {} has more than {} cores, there are not "
+                    "enough COS".format(self.ccx(cpu), self.MAX_COS))
+        return self.position(cpu) + 1
+
+    def group(self, cpus, level='ccx'):
+        """
+        Group the given cpus by a topology level. The groups and the cpus
+        inside a group keep the order of the given list.
+
+        Parameters:
+            - cpus : list of cpus
+            - level : 'ccx', 'ccd', 'socket' or 'node'
+
+        Return : list of (id, [cpus])
+        """
+        groups = {}
+        for cpu in cpus:
+            groups.setdefault(self._get(cpu)[level], []).append(cpu)
+        return list(groups.items())
+
+    def arrays(self, cpus):
+        """
+        Return the topology of the given cpus as index arrays
+
+        Parameters:
+            - cpus : list of cpus
+
+        Return : dictionary level -> int64 array (one value per cpu)
+        """
+        return {level: np.array([self._get(i)[level] for i in cpus],
+            dtype=np.int64) for level in self.LEVELS}
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    topo = Topology()
+    cpus = sorted(topo._info) if topo._sysfs is not None else list(range(8))
+    for cpu in cpus:
+        print("cpu {} ccx {} ccd {} socket {} node {} core {} smt {} cos {}"\
+                .format(cpu, topo.ccx(cpu), topo.ccd(cpu), topo.socket(cpu),
+                    topo.node(cpu), topo.core(cpu), topo.smt(cpu),
+                    topo.cos(cpu)))
+    print(topo.group(cpus, 'ccd'))
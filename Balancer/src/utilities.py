@@ -25,69 +25,186 @@ from time import time, sleep
 from random import choice as choice
 from random import randrange as rnd
 
-def getComplexEvent(prc, cores, ttime, old):
+class ComplexEvent:
     """
-    Calculate the complex events.
+    Complex events of all the cores in one epoch. Every metric is an array
+    with one value per core (same order than cores()), the cores without
+    progress in the epoch are masked (see valid()) and their values are NaN.
+    The access and hit metrics are counts of the epoch, divide them by
+    elapsed() to compare epochs of different length.
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _cores = None
+    _row = None
+    _valid = None
+    _metrics = None
+    _delta = None
+    _elapsed = None
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, cores, valid, metrics, delta=None, elapsed=None):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - cores : list with the cores
+            - valid : boolean array, true if the core made progress
+            - metrics : dictionary metric name -> array (one value per core)
+            - delta : (optional) hw counter increments (cores x counters)
+            - elapsed : (optional) seconds measured in each core
+        """
+        self._cores = cores
+        self._row = {core: row for row, core in enumerate(cores)}
+        self._valid = valid
+        self._metrics = metrics
+        self._delta = delta
+        self._elapsed = elapsed
+
+    def __getitem__(self, name):
+        """
+        Return the array of the given metric
+        """
+        return self._metrics[name]
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def cores(self):
+        """
+        Return the list of cores
+        """
+        return self._cores
+
+    def valid(self):
+        """
+        Return the boolean mask of the cores with progress
+        """
+        return self._valid
+
+    def metrics(self):
+        """
+        Return the dictionary metric name -> array
+        """
+        return self._metrics
+
+    def delta(self):
+        """
+        Return the hw counter increments of the epoch (cores x counters, the
+        column order is given by Process.hwcIndex)
+        """
+        return self._delta
+
+    def elapsed(self):
+        """
+        Return the seconds measured in each core
+        """
+        return self._elapsed
+
+    def row(self, core):
+        """
+        Return the position of the given core in the metric arrays
+        """
+        return self._row[core]
+
+    def get(self, core, name):
+        """
+        Return the value of a metric of one core, None if the core is masked
+        or the value is not a number
+
+        Parameters:
+            - core : core
+            - name : metric name
+        """
+        value = self._metrics[name][self._row[core]]
+        return None if np.isnan(value) else float(value)
+
+def getComplexEvent(prc, cores, old, new=None):
+    """
+    Calculate the complex events of all the cores at once.
 
     Parameter: 
         - prc : process object of the process class
         - cores : list with the cores
-        - ttime : time where the old hardware counters was measured
-        - old : hardware counters to calculate the new complex event
+        - old : hardware counters snapshot (see getHWC) to calculate the new
+                complex event
+        - new : (optional) newer snapshot, by default the counters are read
 
-    Return : a dictionary with the complex hardware events by core
+    Return : ComplexEvent object with the complex hardware events
     """
-    dic = {}
-    lr = prc.getL3Monitor(cores)
-    for core in cores:
-        oc = 0
-        hwcg = prc.readHWC(core)
-        t = time() - ttime
-        if hwcg['Instr Retired'] > old[core]['Instr Retired']:
-            ins = hwcg['Instr Retired'] - old[core]['Instr Retired']
-            cyc = hwcg['Cycles'] - old[core]['Cycles']
-            l3m = hwcg['L3Miss'] - old[core]['L3Miss']
-            l3d = hwcg['L3MissDC'] - old[core]['L3MissDC']
-            lt1 = hwcg['L3Latency1'] - old[core]['L3Latency1']
-            lt2 = hwcg['L3Latency2'] - old[core]['L3Latency2']
-            lpf = hwcg['L3HitPF'] - old[core]['L3HitPF']
-            lp2 = hwcg['L3HitPFL2'] - old[core]['L3HitPFL2']
-            l3h = hwcg['L3HitDC'] - old[core]['L3HitDC']
-            och = hwcg['L3Occupancy (KB)']
-
-            # Measure oc, in case of 0 return 1
-            oc = lr[core]
-            oc = 1 if oc == 0 else oc
-
-            # Complex event
-            hpm = ((lpf + lp2 + l3h) / (l3m))
-            hpmo = hpm / (oc / 1024)
-            mpki3 = (l3m / (ins / 1000))
-
-            dic[core] = {
-                    'cpi': cyc / ins, 
-                    'bwl': ((l3m * 64) / (1024 * 1024 * 1024)) / t,
-                    'lat': (lt1 * 16) / lt2,
-                    'dmpki3': (l3d) / (ins / 1000),
-                    'hpm': hpm,
-                    'hr': (lpf + lp2 + l3h) / (l3m + lpf + lp2 + l3h),
-                    'mr': l3m / (l3m + lpf + lp2 + l3h),
-                    'oc': oc / 1024,
-                    'hpmo': hpmo,
-                    'mro': (l3m / (l3m + lpf + lp2 + l3h)) / oc,
-                    #'acy': (lpf + lp2 + l3h + l3m) / cyc,
-                    'acy': (lpf + lp2 + l3h + l3m) / ins,
-                    'access': (lpf + lp2 + l3h + l3m),
-                    'hit': (lpf + lp2 + l3h),
-                    'och': och / 1024,
-                    'hpmom': hpmo * mpki3,
-                    'bw': ((l3m * 64) / (1024 * 1024 * 1024)) / t
-                    }
-        else:
-            dic[core] = {'cpi': None, 'bwl': None, 'lat': None, 'dmpki3': None,
-                    'hr': None, 'acy': None, 'oc': None, 'hpmo': None,
-                    'hpm': None, 'och': None, 'bw': None}
-    return dic
+    lr, lci = prc.getL3Monitor(cores, ci=True)
+    lo = prc.getL3Occupancy(cores)
+    mbm = prc.getMBM(cores)
+    if new is None:
+        new = prc.snapshot(cores)
+    idx = prc.hwcIndex()
+    # Increments (wraparound and job launches aware) and elapsed time of
+    # every core
+    delta, t = new.delta(old, prc.hwcShared())
+
+    ins = delta[:, idx['Instr Retired']]
+    cyc = delta[:, idx['Cycles']]
+    l3m = delta[:, idx['L3Miss']]
+    l3d = delta[:, idx['L3MissDC']]
+    lt1 = delta[:, idx['L3Latency1']]
+    lt2 = delta[:, idx['L3Latency2']]
+    lpf = delta[:, idx['L3HitPF']]
+    lp2 = delta[:, idx['L3HitPFL2']]
+    l3h = delta[:, idx['L3HitDC']]
+    och = np.array([lo[core] for core in cores], dtype=np.float64)
+
+    # Measure oc, in case of 0 return 1
+    oc = np.array([lr[core] for core in cores], dtype=np.float64)
+    oc[oc == 0] = 1
+    oci = np.array([lci[core] for core in cores], dtype=np.float64)
+    # Measured memory traffic (MBM, GiB/s), total and local
+    mbm = np.array([mbm[core] for core in cores], dtype=np.float64)\
+            .reshape(-1, 2)
+
+    # Only cores that retired instructions
+    valid = ins > 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit = lpf + lp2 + l3h
+        access = hit + l3m
+        hpm = hit / l3m
+        hpmo = hpm / (oc / 1024)
+        mpki3 = l3m / (ins / 1000)
+        mr = l3m / access
+
+        metrics = {
+                'cpi': cyc / ins,
+                'lat': (lt1 * 16) / lt2,
+                'dmpki3': l3d / (ins / 1000),
+                'mpki3': mpki3,
+                'hpm': hpm,
+                'hr': hit / access,
+                'mr': mr,
+                'oc': oc / 1024,
+                'oci': oci / 1024,
+                'hpmo': hpmo,
+                'mro': mr / oc,
+                'acy': access / ins,
+                'access': access,
+                'hit': hit,
+                'och': och / 1024,
+                'hpmom': hpmo * mpki3,
+                'bw': ((l3m * 64) / (1024 * 1024 * 1024)) / t,
+                'mbm': mbm[:, 0],
+                'mbml': mbm[:, 1]
+                }
+
+    for name in metrics:
+        # Mask the cores without progress and the undefined values
+        metrics[name][~valid | ~np.isfinite(metrics[name])] = np.nan
+
+    return ComplexEvent(cores, valid, metrics, delta=delta, elapsed=t)
 
 def getHWC(prc, cores):
     """
@@ -96,9 +213,9 @@ def getHWC(prc, cores):
     Parameters:
         - cores : list with the cores
 
-    Return: hardware counters
+    Return: hardware counters snapshot
     """
-    return prc.readAllHWC(cores)
+    return prc.snapshot(cores)
 
 def doEpoch(prc, cores, tepoch):
     """
@@ -112,6 +229,5 @@ def doEpoch(prc, cores, tepoch):
     Return: hardware counter data in the epoch
     """
     aux = getHWC(prc, cores)
-    t = time()
     sleep(tepoch)
-    return getComplexEvent(prc, cores, t, aux)
+    return getComplexEvent(prc, cores, aux)
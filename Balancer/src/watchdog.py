@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+"""
+Cheap probes for the watchdogs of Process.
+
+    * JobStat : keeps /proc/<pid>/stat of a job open and returns the share
+            of cpu used by the job since the previous read and the cpu where
+            it ran last. The file is read with one pread, without walking
+            /proc nor creating psutil objects. The open file belongs to the
+            process, so a reused pid is never mistaken for the job.
+    * FreqMeter : effective frequency of a set of cpus from the APERF and
+            MPERF MSRs (read with msr.readMany), instead of the
+            cpufreq files of sysfs. MPERF counts at the base frequency and
+            APERF at the real one while the cpu is not halted, so the
+            frequency is base * dAPERF / dMPERF.
+
+@AUTHOR: BALANCER contributors
+@DATE: 18/10/2026
+@UPDATES:
+"""
+import os
+import msr
+import numpy as np
+from time import monotonic
+
+MPERF = 0xE7
+APERF = 0xE8
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+class JobStat:
+    """
+    Class to read the cpu usage of a job from /proc/<pid>/stat
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _pid = None
+    _fd = None
+    _ticks = None # utime + stime of the last read
+    _time = None # Time of the last read
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, pid):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - pid : pid of the job
+        """
+        self._pid = pid
+        self._fd = os.open("/proc/{}/stat".format(pid), os.O_RDONLY)
+        self._time = monotonic()
+        self._ticks = self._read()[1]
+
+    ###########################################################################
+    # Private functions
+    ###########################################################################
+    def _read(self):
+        """
+        Return (state, utime + stime ticks, last cpu) of the job
+        """
+        data = os.pread(self._fd, 1024, 0)
+        # The name of the command can have spaces and parentheses
+        fields = data[data.rindex(b')') + 2:].split()
+        return fields[0], int(fields[11]) + int(fields[12]), int(fields[36])
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def sample(self):
+        """
+        Return the share of cpu (0 to 1) used by the job since the previous
+        sample and the cpu where it ran last, or None if the job does not
+        exist anymore
+        """
+        if self._fd is None:
+            return None
+        try:
+            state, ticks, cpu = self._read()
+        except (OSError, ValueError, IndexError):
+            return None
+        if state in (b'Z', b'X'):
+            # Finished but not reaped yet
+            return None
+        now = monotonic()
+        share = ((ticks - self._ticks) / CLK_TCK) / (now - self._time) if \
+                now > self._time else 0.
+        self._ticks = ticks
+        self._time = now
+        return share, cpu
+
+    def close(self):
+        """
+        Close the stat file
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class FreqMeter:
+    """
+    Class to measure the effective frequency of a set of cpus
+    """
+    ###########################################################################
+    # Class attribute
+    ###########################################################################
+    _cpus = None
+    _base = None # Frequency of MPERF (MHz)
+    _last = None # APERF and MPERF of the last read (cpus x 2)
+
+    ###########################################################################
+    # Not override functions
+    ###########################################################################
+    def __init__(self, cpus, base=2000):
+        """
+        Constructor of the class.
+
+        Parameters:
+            - cpus : list of cpus
+            - base : base (P0) frequency of the processor in MHz, MPERF
+                    counts at this frequency
+        """
+        self._cpus = list(cpus)
+        self._base = base
+        self._last = None
+
+    ###########################################################################
+    # API functions
+    ###########################################################################
+    def read(self):
+        """
+        Return the effective frequency (MHz) of every cpu since the previous
+        read. It is NaN in the first read and for the cpus that were halted
+        all the time.
+        """
+        values = msr.readMany(self._cpus, [APERF, MPERF])
+        if self._last is None:
+            self._last = values
+            return np.full(len(self._cpus), np.nan)
+        # uint64 arithmetic, the counters can wrap
+        delta = (values - self._last).astype(np.float64)
+        self._last = values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(delta[:, 1] > 0, self._base * delta[:, 0] /
+                    delta[:, 1], np.nan)
+
+if __name__ == '__main__':
+    # NOTE: An small test, ad-hoc developed
+    import subprocess
+    import simMSR
+    from time import sleep, perf_counter
+    proc = subprocess.Popen(["yes"], stdout=subprocess.DEVNULL)
+    stat = JobStat(proc.pid)
+    sleep(.5)
+    print("Job: {}".format(stat.sample()))
+    proc.kill()
+    proc.wait()
+    print("Finished: {}".format(stat.sample()))
+    stat.close()
+
+    cpus = list(range(0, 256))
+    msr.setBackend(simMSR.SimMSR(cpus))
+    meter = FreqMeter(cpus)
+    meter.read()
+    sleep(.1)
+    t = perf_counter()
+    freq = meter.read()
+    print("Freq: {} MHz in {:.2f} ms".format(freq[:4], (perf_counter() - t) *
+        1000))
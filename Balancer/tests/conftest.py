@@ -0,0 +1,57 @@
+"""
+Common fixtures of the tests. The modules of src are imported by their bare
+name, like Balancer does.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'src'))
+
+import msr
+import simMSR
+import PQOS
+import topology
+
+class Clock:
+    """
+    Manual clock of the simulated MSR device
+    """
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def sim(clock):
+    """
+    Simulated device (two CCXs of 4 threads) as msr backend, every thread
+    runs a workload without LLC accesses and IPC 2 unless the test changes it
+    """
+    workloads = {i: simMSR.SimWorkload([{'ipc': 2, 'apki': 0,
+        'footprint': 1, 'pf': 0}]) for i in range(0, 8)}
+    device = simMSR.SimMSR(list(range(0, 8)), workloads=workloads,
+            clock=clock)
+    msr.setBackend(device)
+    yield device
+    msr.setBackend(None)
+
+@pytest.fixture
+def pqos(sim):
+    """
+    PQOS on the simulated device. PQOS keeps its state in class attributes
+    (one instance per process), so it is cleared between tests.
+    """
+    for name in ('_shadow', '_mbm', '_stats', '_cpuMutex', '_ccxMutex',
+            '_rmid_core'):
+        getattr(PQOS.PQOS, name).clear()
+    PQOS.PQOS._rmid = 1
+    PQOS.PQOS._commits = 0
+    PQOS.PQOS._staged.writes = None
+    return PQOS.PQOS(topo=topology.Topology(None))
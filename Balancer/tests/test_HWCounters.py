@@ -0,0 +1,69 @@
+"""
+Tests of the layout of the hardware counters on Rome (4 cores per CCX) and
+Milan/Genoa (8 cores per CCX) CCXs
+"""
+import pytest
+import msr
+import simMSR
+import topology
+import HWCounters
+
+# Default hwCounters of the README
+CONFIG = {
+    "Instr Retired": {"addr": "0xC0010200", "value": "0x5100c0"},
+    "Cycles": {"addr": "0xC0010202", "value": "0x510076"},
+    "L3HitDC": {"addr": "0xC0010204", "value": "0x511243"},
+    "L3MissDC": {"addr": "0xC0010206", "value": "0x514843"},
+    "L3HitPF": {"addr": "0xC0010208", "value": "0x51125A"},
+    "L3HitPFL2": {"addr": "0xC001020A", "value": "0x513F71"},
+    "L3Miss": {"addr": "0xC0010230", "value": "0x0F000000400106"},
+    "L3Latency1": {"addr": "0xC0010238", "value": "0xFF0F000000400090"},
+    "L3Latency2": {"addr": "0xC001023A", "value": "0xFF0F000000401B9A"}}
+
+def test_rome_uses_one_l3_pmc_per_core():
+    hwc = HWCounters.HWCounters(CONFIG, cpus=list(range(0, 8)),
+            topo=topology.Topology(None, ccxSize=4))
+    col = hwc.index('L3Miss')
+    assert not hwc.isShared()[col]
+    for cpu in range(0, 8):
+        pos = cpu % 4
+        assert hwc._sel[hwc._getRow(cpu), col] == 0xC0010230 + 2 * pos
+        assert hwc._val[hwc._getRow(cpu), col] >> 56 == 1 << (2 * pos)
+    assert list(hwc.isShared()).count(True) == 2
+
+def test_milan_falls_back_to_a_ccx_counter(capsys):
+    topo = topology.Topology(None, ccxSize=8)
+    hwc = HWCounters.HWCounters(CONFIG, cpus=list(range(0, 16)), topo=topo)
+    col = hwc.index('L3Miss')
+    assert hwc.isShared()[col]
+    for cpu in range(0, 16):
+        row = hwc._getRow(cpu)
+        assert hwc._sel[row, col] == 0xC0010230
+        assert hwc._ctr[row, col] == 0xC0010231
+        assert hwc._val[row, col] >> 56 == 0xFF
+    assert "L3Miss" in capsys.readouterr().err
+
+def test_fallback_does_not_depend_on_the_order():
+    # The first cpu of the CCX fits, the rest of the CCX does not
+    topo = topology.Topology(None, ccxSize=8)
+    hwc = HWCounters.HWCounters(CONFIG, cpus=[0], topo=topo)
+    col = hwc.index('L3Miss')
+    assert hwc.isShared()[col]
+    assert hwc._sel[hwc._getRow(0), col] == 0xC0010230
+
+def test_milan_counts_on_the_simulated_device(clock):
+    device = simMSR.SimMSR(list(range(0, 8)), ccx=8, clock=clock)
+    msr.setBackend(device)
+    try:
+        hwc = HWCounters.HWCounters(CONFIG, cpus=list(range(0, 8)),
+                topo=topology.Topology(None, ccxSize=8))
+        for cpu in range(0, 8):
+            hwc.start(cpu)
+        clock.now = 1.
+        values = [hwc.readValues(cpu) for cpu in range(0, 8)]
+        assert values[0]['Instr Retired'] > 0
+        # The whole CCX is counted by every cpu
+        assert values[0]['L3Miss'] > 0
+        assert len(set([i['L3Miss'] for i in values])) == 1
+    finally:
+        msr.setBackend(None)
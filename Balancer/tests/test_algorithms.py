@@ -0,0 +1,60 @@
+"""
+Tests of the rolling averages of the management algorithm on the simulated
+device
+"""
+import pytest
+import numpy as np
+import process
+import algorithms
+import utilities
+from test_HWCounters import CONFIG as HWC
+
+CORES = list(range(0, 8))
+
+@pytest.fixture
+def alg(pqos):
+    config = {'alg': 'llcbw', 'msr': 'sim', 'hwCounters': HWC,
+            'threads': CORES, 'limit': 1.2, 'rolling': 3, 'hpmo_max': .065,
+            'hpmo_limit': .06, 'bw_limit': 2.5, 'lat_limit': 450}
+    prc = process.Process({}, config)
+    parameters = {i: config[i] for i in ['limit', 'rolling', 'hpmo_max',
+        'bw_limit', 'lat_limit', 'hpmo_limit']}
+    parameters['core'] = CORES
+    parameters['prc'] = prc
+    return algorithms.Algorithm(config['alg'], parameters)
+
+def event(proxy, mbm):
+    """
+    Epoch of one second where every metric is 1 except the L3 misses proxy
+    and the MBM bandwidth of core 0
+    """
+    metrics = {key: np.ones(len(CORES)) for key in
+            algorithms.Algorithm.RAVG_KEYS}
+    metrics['mbm'] = np.full(len(CORES), np.nan)
+    metrics['bw'][0] = proxy
+    metrics['mbm'][0] = mbm
+    return utilities.ComplexEvent(CORES, np.ones(len(CORES), dtype=bool),
+            metrics, elapsed=np.ones(len(CORES)))
+
+def test_bandwidth_without_mbm_is_the_proxy(alg):
+    for i in range(0, 3):
+        ravg, _ = alg._rollingAVG_update(event(5., np.nan))
+    assert ravg['bw'][0] == pytest.approx(5.)
+
+def test_missing_mbm_read_repeats_the_last_one(alg):
+    alg._rollingAVG_update(event(5., 2.))
+    alg._rollingAVG_update(event(5., np.nan))
+    ravg, _ = alg._rollingAVG_update(event(5., 4.))
+    assert ravg['bw'][0] == pytest.approx((2. + 2. + 4.) / 3)
+
+def test_mbm_starts_a_new_window(alg):
+    alg._rollingAVG_update(event(5., np.nan))
+    alg._rollingAVG_update(event(5., np.nan))
+    ravg, _ = alg._rollingAVG_update(event(5., 2.))
+    # The proxy values are discarded, the window is not full yet
+    assert ravg['bw'][0] is None
+    assert alg._interCall['hwc'].nElements()[0, algorithms.Algorithm.\
+            RAVG_KEYS.index('bw')] == 1
+    alg._rollingAVG_update(event(5., np.nan))
+    ravg, _ = alg._rollingAVG_update(event(5., 2.))
+    assert ravg['bw'][0] == pytest.approx(2.)
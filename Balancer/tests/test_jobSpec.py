@@ -0,0 +1,77 @@
+"""
+Tests of the parser and the launcher of the job commands
+"""
+import os
+import pytest
+import jobSpec
+
+def test_argv_is_split_as_sh():
+    spec = jobSpec.parse("./mcf_r 'a b' \"c d\" e\\ f")
+    assert spec['argv'] == ['./mcf_r', 'a b', 'c d', 'e f']
+    assert not spec['shell']
+
+def test_quoted_operators_are_arguments():
+    assert jobSpec.parse('grep ">" in.txt')['argv'] == ['grep', '>',
+            'in.txt']
+    assert jobSpec.parse("echo 'a|b' \"x&&y\"")['argv'] == ['echo', 'a|b',
+            'x&&y']
+
+@pytest.mark.parametrize("command, stdin, stdout, stderr", [
+    ("./a < in.txt", 'in.txt', None, None),
+    ("./a > out.txt", None, ('out.txt', False), None),
+    ("./a >>out.txt 2>err.txt", None, ('out.txt', True), ('err.txt', False)),
+    ("./a > out.txt 2>&1", None, ('out.txt', False), 'stdout'),
+    ("./a &>out.txt", None, ('out.txt', False), 'stdout'),
+    ("./a 2>> err.txt", None, None, ('err.txt', True)),
+])
+def test_redirections(command, stdin, stdout, stderr):
+    spec = jobSpec.parse(command)
+    assert spec['argv'] == ['./a']
+    assert (spec['stdin'], spec['stdout'], spec['stderr']) == (stdin,
+            stdout, stderr)
+
+def test_cwd_and_env():
+    spec = jobSpec.parse("cd /tmp/run && OMP_NUM_THREADS=1 A=x ./lbm 3000")
+    assert spec['cwd'] == '/tmp/run'
+    assert spec['env'] == {'OMP_NUM_THREADS': '1', 'A': 'x'}
+    assert spec['argv'] == ['./lbm', '3000']
+
+@pytest.mark.parametrize("command", ["ls | wc -l", "echo $HOME", "a&&b",
+    "ls *.txt", "./a; ./b", "./a >out|b", "echo 'not closed", "> out"])
+def test_shell_fallback(command):
+    spec = jobSpec.parse(command)
+    assert spec['shell']
+    assert spec['argv'] == [jobSpec.SHELL, '-c', command]
+
+def test_shell_is_bash():
+    assert jobSpec.SHELL == '/bin/bash'
+
+def test_spawn_redirections_cwd_and_env(tmp_path):
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    (tmp_path / "in.txt").write_text("line\n")
+    spec = jobSpec.parse("cd {} && MSG=hello sh -c 'cat; echo $MSG; "
+            "echo err >&2' < in.txt > out.txt 2>&1".format(tmp_path))
+    assert not spec['shell']
+    proc = jobSpec.spawn(spec, cpu)
+    assert proc.wait() == 0
+    assert (tmp_path / "out.txt").read_text() == "line\nhello\nerr\n"
+
+def test_spawn_pins_the_job(tmp_path):
+    cpu = sorted(os.sched_getaffinity(0))[-1]
+    mask = os.sched_getaffinity(0)
+    proc = jobSpec.spawn(jobSpec.parse("grep Cpus_allowed_list "
+        "/proc/self/status > {}".format(tmp_path / "out.txt")), cpu)
+    assert proc.wait() == 0
+    assert (tmp_path / "out.txt").read_text().split()[-1] == str(cpu)
+    # The affinity of the caller is restored
+    assert os.sched_getaffinity(0) == mask
+
+@pytest.mark.skipif(not os.path.exists(jobSpec.SHELL), reason="no bash")
+def test_spawn_shell_fallback_runs_bash(tmp_path):
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    # &> and the pipe are bash syntax, dash would run "echo a" in background
+    spec = jobSpec.parse("echo a | tr a b &> {}".format(tmp_path / "out.txt"))
+    assert spec['shell']
+    proc = jobSpec.spawn(spec, cpu)
+    assert proc.wait() == 0
+    assert (tmp_path / "out.txt").read_text() == "b\n"
@@ -0,0 +1,107 @@
+"""
+Tests of the database of the Characterization outputs on a temporal tree
+"""
+import os
+import pytest
+import numpy as np
+import profileDB
+
+def write(path, ins, cycles, l3miss=100, bw=None):
+    """
+    Output of a sweep point ("name: value" lines of hwCounters.py)
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("Instr Retired: {}\nCycles: {}\nL3Miss: {}\n".format(ins,
+            cycles, l3miss))
+        if bw is not None:
+            f.write("BW (MB/s): {}\n".format(bw))
+
+def count(db, table):
+    return db._db.execute("SELECT COUNT(*) FROM {}".format(table))\
+            .fetchone()[0]
+
+@pytest.fixture
+def db(tmp_path):
+    db = profileDB.ProfileDB(str(tmp_path / "profile.db"))
+    yield db
+    db.close()
+
+@pytest.mark.parametrize("path, key", [
+    ("out/505.mcf_r.2/0xF000.out",
+        ('505.mcf_r', '2', 0xF000, 4, 0, 0, 1, 0)),
+    ("out/505.mcf_r/0xFFFF-Triads_3.out",
+        ('505.mcf_r', '1', 0xFFFF, 16, 0, 3, 1, 0)),
+    ("nopf-2k17/505.mcf_r.1/0x1000.out",
+        ('505.mcf_r', '1', 0x1000, 1, 0, 0, 0, 0)),
+    ("pf_turbo/505.mcf_r.1/0x1000.out",
+        ('505.mcf_r', '1', 0x1000, 1, 0, 0, 1, 1)),
+    ("noturbo.nopf/505.mcf_r.1/0x1000.out",
+        ('505.mcf_r', '1', 0x1000, 1, 0, 0, 0, 0)),
+])
+def test_path_key(path, key):
+    assert profileDB.pathKey(path) == key
+
+def test_path_key_defaults_and_other_files():
+    assert profileDB.pathKey("out/a.1/0x3.out", prefetch=0, turbo=1,
+            bwMask=5) == ('a', '1', 3, 2, 5, 0, 0, 1)
+    assert profileDB.pathKey("out/a.1/sweep.jsonl") is None
+    assert profileDB.pathKey("out/a.1/0xF.out.tmp") is None
+
+def test_reingest_skips_unchanged_and_replaces_modified(db, tmp_path):
+    root = tmp_path / "out"
+    write(str(root / "a.1" / "0x1000.out"), 100, 200)
+    write(str(root / "a.1" / "0xFFFF.out"), 300, 200)
+    with open(str(root / "a.1" / "notes.txt"), 'w') as f:
+        f.write("Not a point: 1\n")
+    assert db.ingest(str(root), workers=1) == (2, 0, 0)
+    assert count(db, 'points') == 2
+    assert count(db, 'counters') == 6
+
+    assert db.ingest(str(root), workers=1) == (0, 2, 0)
+
+    # A point run again with more counters
+    path = str(root / "a.1" / "0x1000.out")
+    write(path, 150, 200, bw=10.5)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 1))
+    assert db.ingest(str(root), workers=1) == (1, 1, 0)
+    assert count(db, 'points') == 2
+    assert count(db, 'counters') == 7
+    point = db.points('a', ways=1)
+    assert len(point) == 1
+    assert point[0]['Instr Retired'] == 150
+    assert point[0]['BW (MB/s)'] == 10.5
+
+def test_series(db, tmp_path):
+    root = tmp_path / "out"
+    # Two inputs of the same benchmark
+    write(str(root / "a.1" / "0x1000.out"), 100, 200, l3miss=10)
+    write(str(root / "a.2" / "0x1000.out"), 300, 200, l3miss=30)
+    write(str(root / "a.1" / "0xF000.out"), 400, 200, l3miss=4)
+    write(str(root / "a.1" / "0xFFFF.out"), 400, 200)
+    write(str(root / "a.1" / "0xFFFF-Triads_2.out"), 300, 200, bw=100)
+    write(str(root / "a.1" / "0xFFFF-Triads_4.out"), 200, 200)
+    write(str(root / "b.1" / "0xFFFF.out"), 1, 1)
+    db.ingest(str(root), workers=2)
+    assert db.benchmarks() == [('a', '1'), ('a', '2'), ('b', '1')]
+
+    ways, ipc = db.ipcVsWays('a')
+    assert ways.tolist() == [1, 4, 16]
+    assert ipc == pytest.approx([1., 2., 2.])
+    ways, ipc = db.ipcVsWays('a', input='1')
+    assert ipc == pytest.approx([.5, 2., 2.])
+    ways, mpki = db.mpkiVsWays('a', input='1')
+    assert mpki == pytest.approx([100., 10., 250.])
+
+    triads, bw, ipc = db.ipcVsBW('a')
+    assert triads.dtype == np.int64
+    assert triads.tolist() == [0, 2, 4]
+    assert np.isnan(bw[0]) and bw[1] == 100 and np.isnan(bw[2])
+    assert ipc == pytest.approx([2., 1.5, 1.])
+
+    # Without points the arrays are empty
+    triads, bw, ipc = db.ipcVsBW('c')
+    assert triads.shape == bw.shape == ipc.shape == (0,)
+    ways, ipc = db.ipcVsWays('c')
+    assert ways.shape == ipc.shape == (0,)
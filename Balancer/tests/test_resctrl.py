@@ -0,0 +1,99 @@
+"""
+Tests of the resctrl backend on a temporal directory that mimics resctrl
+(the kernel moves the cpus between groups, here the files are only written)
+"""
+import os
+import pytest
+import resctrl
+import topology
+
+@pytest.fixture
+def root(tmp_path):
+    os.makedirs(tmp_path / "info" / "L3")
+    (tmp_path / "info" / "L3" / "cbm_mask").write_text("ffff\n")
+    return tmp_path
+
+@pytest.fixture
+def pqos(root):
+    # Fallback topology: CCXs of 4 cpus (L3 domains 0, 1, ...)
+    return resctrl.Resctrl(str(root), topo=topology.Topology(None))
+
+def read(path):
+    return path.read_text() if path.exists() else None
+
+def test_schemata_of_a_group_in_one_write(pqos, root):
+    pqos.bwAllocation(True, 1, 20, 0)
+    assert read(root / "balancer_cos1" / "schemata") == "MB:0=20\n"
+    pqos.l3Allocation(True, 1, 0x3, 4)
+    assert read(root / "balancer_cos1" / "schemata") == "L3:1=3\n"
+    assert read(root / "balancer_cos1" / "cpus_list") == "0,4\n"
+
+def test_transaction_stages_schemata_and_moves(pqos, root):
+    with pqos.transaction():
+        pqos.l3Allocation(True, 1, 0xF, 0)
+        pqos.bwAllocation(True, 1, 20, 0)
+        pqos.l3Allocation(True, 1, 0xF, 1)
+        assert read(root / "balancer_cos1" / "schemata") is None
+        assert read(root / "balancer_cos1" / "cpus_list") is None
+    assert read(root / "balancer_cos1" / "schemata") == "L3:0=f\nMB:0=20\n"
+    assert read(root / "balancer_cos1" / "cpus_list") == "0,1\n"
+    # One schemata and one cpus_list write
+    assert pqos.stats()['writes'] == 2
+    assert pqos.stats()['commits'] == 1
+
+def test_transaction_is_closed_on_error(pqos, root):
+    with pytest.raises(RuntimeError):
+        with pqos.transaction():
+            pqos.l3Allocation(True, 2, 0x1, 0)
+            raise RuntimeError()
+    assert read(root / "balancer_cos2" / "cpus_list") == "0\n"
+    pqos.l3Allocation(True, 2, 0x3, 0)
+    assert read(root / "balancer_cos2" / "schemata") == "L3:0=3\n"
+
+def test_unchanged_values_are_elided(pqos, root):
+    pqos.l3Allocation(True, 1, 0xF, 0)
+    writes = pqos.stats()['writes']
+    pqos.l3Allocation(True, 1, 0xF, 0)
+    assert pqos.stats()['writes'] == writes
+    assert pqos.stats()['elided'] == 2
+
+def test_cpu_returns_to_the_default_group(pqos, root):
+    pqos.l3Allocation(True, 1, 0xF, 0)
+    pqos.l3Allocation(True, 1, 0xF, 1)
+    pqos.l3Allocation(False, 1, 0xF, 0)
+    assert read(root / "balancer_cos1" / "cpus_list") == "1\n"
+    assert read(root / "balancer_cos1" / "schemata") == "L3:0=ffff\n"
+
+def test_one_monitor_group_per_domain(pqos, root):
+    pqos.l3Allocation(True, 1, 0xF, 0)
+    pqos.l3Occupancy(True, 0)
+    pqos.l3Occupancy(True, 4)
+    assert os.listdir(root / "balancer_cos1" / "mon_groups") == ["cpu0"]
+    # The multiplexer moves to another cpu of the domain of cpu 0
+    pqos.l3Occupancy(True, 1)
+    assert os.listdir(root / "balancer_cos1" / "mon_groups") == []
+    assert sorted(os.listdir(root / "mon_groups")) == ["cpu1", "cpu4"]
+    pqos.close()
+    assert os.listdir(root / "mon_groups") == []
+
+def test_monitor_group_follows_the_cpu(pqos, root):
+    pqos.l3Occupancy(True, 0)
+    with pqos.transaction():
+        pqos.l3Allocation(True, 3, 0xF, 0)
+        assert os.path.isdir(root / "mon_groups" / "cpu0")
+    assert not os.path.exists(root / "mon_groups" / "cpu0")
+    assert read(root / "balancer_cos3" / "mon_groups" / "cpu0" /
+            "cpus_list") == "0\n"
+
+def test_monitor_reads(pqos, root):
+    pqos.l3Occupancy(True, 5)
+    data = root / "mon_groups" / "cpu5" / "mon_data" / "mon_L3_01"
+    os.makedirs(data)
+    (data / "llc_occupancy").write_text("1048576\n")
+    (data / "mbm_total_bytes").write_text("4096\n")
+    assert pqos.l3OccupancyRead(5) == 1048576
+    assert pqos.mbmRead(5) == 4096
+    assert pqos.mbmRead(5, local=True) is None
+    # Without monitor group
+    assert pqos.mbmRead(6) is None
+    assert pqos.l3OccupancyRead(6) == 0
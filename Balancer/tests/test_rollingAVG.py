@@ -0,0 +1,84 @@
+"""
+Tests of the rolling averages against NumPy over the last elements
+"""
+import pytest
+import numpy as np
+import rollingAVG
+
+WINDOW = 4
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def test_rolling_avg_over_more_elements_than_the_window(rng):
+    avg = rollingAVG.RollingAVG(WINDOW)
+    assert np.isnan(avg.avg())
+    values = rng.uniform(0, 100, 25)
+    for i, value in enumerate(values):
+        avg.add(value)
+        assert avg.nElements() == min(i + 1, WINDOW)
+        assert avg.avg() == pytest.approx(np.average(
+            values[max(0, i + 1 - WINDOW):i + 1]))
+
+def test_rolling_avg_after_reset(rng):
+    avg = rollingAVG.RollingAVG(WINDOW)
+    for value in rng.uniform(0, 100, 7):
+        avg.add(value)
+    avg.reset()
+    assert avg.nElements() == 0
+    assert np.isnan(avg.avg())
+    values = rng.uniform(0, 100, 6)
+    for i, value in enumerate(values):
+        avg.add(value)
+        assert avg.avg() == pytest.approx(np.average(
+            values[max(0, i + 1 - WINDOW):i + 1]))
+
+def test_batch_with_weights(rng):
+    avg = rollingAVG.BatchRollingAVG((3, 2), WINDOW)
+    values = rng.uniform(0, 100, (25, 3, 2))
+    # Elapsed time of every core (the same for all its metrics)
+    weights = rng.uniform(.1, 2, (25, 3, 1))
+    for i in range(0, len(values)):
+        avg.update(values[i], weights=weights[i])
+        first = max(0, i + 1 - WINDOW)
+        assert avg.full().all() == (i + 1 >= WINDOW)
+        expected = np.average(values[first:i + 1], axis=0,
+                weights=np.broadcast_to(weights[first:i + 1],
+                    values[first:i + 1].shape))
+        assert avg.avg() == pytest.approx(expected)
+
+def test_batch_reset_of_some_averages(rng):
+    avg = rollingAVG.BatchRollingAVG((2,), WINDOW)
+    values = rng.uniform(0, 100, (12, 2))
+    for i in range(0, 6):
+        avg.update(values[i])
+    avg.reset(np.array([True, False]))
+    assert avg.nElements().tolist() == [0, WINDOW]
+    assert np.isnan(avg.avg()[0])
+    for i in range(6, 12):
+        avg.update(values[i])
+        expected = [np.average(values[max(6, i + 1 - WINDOW):i + 1, 0]),
+                np.average(values[i + 1 - WINDOW:i + 1, 1])]
+        assert avg.avg() == pytest.approx(expected)
+
+def test_batch_invalid_value_resets_the_average(rng):
+    avg = rollingAVG.BatchRollingAVG((2,), WINDOW)
+    values = rng.uniform(0, 100, (10, 2))
+    values[5, 1] = np.nan
+    for i in range(0, len(values)):
+        avg.update(values[i])
+    assert avg.nElements().tolist() == [WINDOW, WINDOW]
+    assert avg.avg() == pytest.approx(np.average(values[-WINDOW:], axis=0))
+    avg.update(np.array([1., np.nan]))
+    assert avg.nElements().tolist() == [WINDOW, 0]
+    assert not avg.full()[1]
+
+def test_batch_sum_does_not_drift():
+    # Large and small values, the running sum is compensated
+    avg = rollingAVG.BatchRollingAVG((1,), WINDOW)
+    for i in range(0, 10000):
+        avg.update(np.array([1e12 if i % 2 else 1e-3]))
+    for i in range(0, WINDOW):
+        avg.update(np.array([1.]))
+    assert avg.avg()[0] == pytest.approx(1., rel=1e-9)
@@ -0,0 +1,91 @@
+"""
+Tests of the simulated MSR device and of PQOS on top of it
+"""
+import pytest
+import numpy as np
+import msr
+import simMSR
+
+INS_SEL = 0x5100c0 # Instr Retired
+CYC_SEL = 0x510076 # Cycles
+
+def test_backend_replaces_msr_functions(sim):
+    msr.writeMSR(3, 0x10, 0x1234)
+    assert msr.readMSR(3, 0x10) == 0x1234
+    assert msr.readMSR(2, 0x10) == 0
+
+def test_masks_are_shared_by_the_ccx(sim):
+    msr.writeMSR(0, sim.L3_MASK_BASE + 1, 0xF)
+    msr.writeMSR(1, sim.BW_MASK_BASE + 1, 20)
+    for cpu in range(0, 4):
+        assert msr.readMSR(cpu, sim.L3_MASK_BASE + 1) == 0xF
+        assert msr.readMSR(cpu, sim.BW_MASK_BASE + 1) == 20
+    # Other CCX
+    assert msr.readMSR(4, sim.L3_MASK_BASE + 1) == 0xFFFF
+    assert msr.readMSR(4, sim.BW_MASK_BASE + 1) == 2048
+
+def test_pmcs_follow_the_workload(sim, clock):
+    msr.writeMSR(0, sim.PMC_BASE, INS_SEL)
+    msr.writeMSR(0, sim.PMC_BASE + 2, CYC_SEL)
+    clock.now = 1.
+    ins = msr.readMSR(0, sim.PMC_BASE + 1)
+    cyc = msr.readMSR(0, sim.PMC_BASE + 3)
+    assert cyc == pytest.approx(2e9)
+    assert ins / cyc == pytest.approx(2.)
+
+def test_disabled_pmc_does_not_count(sim, clock):
+    msr.writeMSR(0, sim.PMC_BASE, INS_SEL & ~(1 << 22))
+    clock.now = 1.
+    assert msr.readMSR(0, sim.PMC_BASE + 1) == 0
+
+def test_readMany_matches_readMSR(sim, clock):
+    for cpu in range(0, 8):
+        msr.writeMSR(cpu, sim.PMC_BASE, INS_SEL)
+        msr.writeMSR(cpu, 0x20, cpu)
+    clock.now = .5
+    regs = [sim.PMC_BASE + 1, 0x20]
+    values = msr.readMany(list(range(0, 8)), regs)
+    assert values.dtype == np.uint64
+    for cpu in range(0, 8):
+        assert list(values[cpu]) == [msr.readMSR(cpu, i) for i in regs]
+
+def test_pqos_shadow_of_shared_registers(pqos, sim):
+    pqos.l3Allocation(True, 1, 0xF, 0)
+    # Same COS and mask in another cpu of the CCX: only PQR_ASSOC changes
+    pqos.l3Allocation(True, 1, 0xF, 1)
+    # Another CCX has its own registers
+    pqos.l3Allocation(True, 1, 0xF, 4)
+    stats = pqos.stats()
+    assert stats['writes'] == 5
+    assert stats['elided'] == 1
+    assert msr.readMSR(2, sim.L3_MASK_BASE + 1) == 0xF
+    assert msr.readMSR(5, sim.L3_MASK_BASE + 1) == 0xF
+
+def test_pqos_transaction_is_closed_on_error(pqos, sim):
+    with pytest.raises(RuntimeError):
+        with pqos.transaction():
+            pqos.l3Allocation(True, 2, 0x3, 0)
+            assert msr.readMSR(0, sim.L3_MASK_BASE + 2) == 0xFFFF
+            raise RuntimeError()
+    # The staged writes are done and the next write is not staged
+    assert msr.readMSR(0, sim.L3_MASK_BASE + 2) == 0x3
+    pqos.l3Allocation(True, 2, 0x7, 0)
+    assert msr.readMSR(0, sim.L3_MASK_BASE + 2) == 0x7
+
+def test_pqos_mbm_accumulates_the_wraps(pqos, sim, clock):
+    # Streaming workload, about 0.4 GiB of memory traffic every second
+    sim._workload[0] = simMSR.SimWorkload([{'ipc': 2, 'apki': 40,
+        'footprint': 1 << 40, 'pf': 0}])
+    assert pqos.mbmRead(0) == 0
+    for step in range(1, 11):
+        clock.now = step
+        total = pqos.mbmRead(0)
+    # The 24 bits counter (1 GiB) wrapped several times
+    assert sim._acc[0]['bytes'] > 3 * (1 << 30)
+    assert total == pytest.approx(sim._acc[0]['bytes'], abs=64 * 10)
+
+def test_pqos_mbm_discards_reads_that_can_miss_a_wrap(pqos, sim, clock):
+    pqos._mbmPeak = float('inf')
+    assert pqos.mbmRead(0) == 0
+    clock.now = 1.
+    assert pqos.mbmRead(0) is None
@@ -0,0 +1,60 @@
+"""
+Tests of the increments between two snapshots of the hardware counters
+"""
+import pytest
+import numpy as np
+import snapshot
+
+# Two counters of the core and one shared by the CCX
+SHARED = np.array([False, False, True])
+
+def snap(values, time, gen=(0, 0), ccxGen=(0, 0), start=(0., 0.),
+        ccxStart=(0., 0.)):
+    """
+    Snapshot of two cores of the same CCX
+    """
+    return snapshot.Snapshot([0, 1], np.array(values, dtype=np.uint64),
+            np.array(time, dtype=np.float64), np.array(gen),
+            np.array(ccxGen), np.array(start, dtype=np.float64),
+            np.array(ccxStart, dtype=np.float64))
+
+def test_increments_and_elapsed_time():
+    old = snap([[10, 20, 30], [1, 2, 3]], [1., 1.5])
+    new = snap([[15, 30, 60], [2, 4, 6]], [2., 2.])
+    delta, dt = new.delta(old, SHARED)
+    assert delta.dtype == np.float64
+    assert delta.tolist() == [[5, 10, 30], [1, 2, 3]]
+    assert dt.tolist() == [1., .5]
+
+def test_counter_wrap():
+    top = (1 << 48) - 5
+    old = snap([[top, 0, 0], [0, 0, 0]], [1., 1.])
+    new = snap([[10, 0, 0], [0, 0, 0]], [2., 2.])
+    delta, _ = new.delta(old, SHARED)
+    assert delta[0, 0] == 15
+
+def test_new_job_generation():
+    old = snap([[100, 100, 100], [100, 100, 100]], [1., 1.])
+    # A job was launched in core 0 at 1.75 s, its counters started again
+    new = snap([[7, 8, 9], [110, 110, 110]], [2., 2.], gen=(2, 0),
+            start=(1.75, 0.))
+    delta, dt = new.delta(old, np.zeros(3, dtype=bool))
+    assert delta.tolist() == [[7, 8, 9], [10, 10, 10]]
+    assert dt.tolist() == [.25, 1.]
+
+def test_new_ccx_generation():
+    old = snap([[100, 100, 100], [100, 100, 100]], [1., 1.])
+    # The launch in core 0 resets the shared counter of core 1 too
+    new = snap([[7, 8, 9], [110, 110, 4]], [2., 2.], gen=(2, 0),
+            ccxGen=(2, 2), start=(1.75, 0.), ccxStart=(1.75, 1.75))
+    delta, dt = new.delta(old, SHARED)
+    assert delta.tolist() == [[7, 8, 9], [10, 10, 4]]
+    # The shared counter of core 1 only counted since the launch
+    assert dt.tolist() == [.25, .25]
+
+def test_ccx_generation_without_shared_counters():
+    old = snap([[100, 100, 100], [100, 100, 100]], [1., 1.])
+    new = snap([[7, 8, 9], [110, 110, 110]], [2., 2.], gen=(2, 0),
+            ccxGen=(2, 2), start=(1.75, 0.), ccxStart=(1.75, 1.75))
+    _, dt = new.delta(old, np.zeros(3, dtype=bool))
+    assert dt.tolist() == [.25, 1.]
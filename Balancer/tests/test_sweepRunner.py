@@ -0,0 +1,83 @@
+"""
+Tests of the journal and of the outputs of the sweep runner on the simulated
+device (one slot, the jobs are small commands)
+"""
+import os
+import json
+import pytest
+import sweepRunner
+from test_HWCounters import CONFIG as HWC
+
+@pytest.fixture
+def config(tmp_path, pqos):
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    return {'threads': [cpu], 'msr': 'sim', 'hwCounters': HWC,
+            'out': str(tmp_path / "out"), 'llc_masks': ["0x1000", "0xFFFF"],
+            'benchmarks': {'ok': "true", 'ko': "false"}, 'attempts': 2}
+
+def run(config):
+    runner = sweepRunner.SweepRunner(config)
+    try:
+        runner.run()
+    finally:
+        runner.close()
+    return runner
+
+def journal(config):
+    with open(os.path.join(config['out'], sweepRunner.JOURNAL)) as f:
+        return [json.loads(line) for line in f]
+
+def test_outputs_are_complete(config):
+    run(config)
+    for mask in config['llc_masks']:
+        path = os.path.join(config['out'], 'ok', mask + ".out")
+        with open(path) as f:
+            names = [line.split(':')[0] for line in f]
+        assert names == list(HWC) + ['Time (s)', 'BW (MB/s)', 'Slots']
+        # The temporal file is renamed
+        assert not os.path.exists(path + ".tmp")
+        # The failed points have no output
+        assert not os.path.exists(os.path.join(config['out'], 'ko',
+            mask + ".out"))
+    status = {(i['mask'], i['bench']): i['status'] for i in journal(config)}
+    assert status == {('0x1000', 'ok'): 'ok', ('0xFFFF', 'ok'): 'ok',
+            ('0x1000', 'ko'): 'failed', ('0xFFFF', 'ko'): 'failed'}
+
+def test_resume_retries_only_the_failed_points(config):
+    run(config)
+    runner = sweepRunner.SweepRunner(config)
+    assert runner._done == {(None, '0x1000', 'ok'), (None, '0xFFFF', 'ok')}
+    assert runner._failed == {(None, '0x1000', 'ko'): 1,
+            (None, '0xFFFF', 'ko'): 1}
+    assert runner._points(None) == [(None, '0x1000', 'ko'),
+            (None, '0xFFFF', 'ko')]
+    runner.close()
+    # Second attempt, the failed points are not run again
+    run(config)
+    runner = sweepRunner.SweepRunner(config)
+    assert runner._points(None) == []
+    runner.close()
+    assert len(journal(config)) == 6
+
+def test_point_without_output_is_run_again(config):
+    run(config)
+    os.remove(os.path.join(config['out'], 'ok', "0xFFFF.out"))
+    runner = sweepRunner.SweepRunner(config)
+    assert (None, '0xFFFF', 'ok') in runner._points(None)
+    assert (None, '0x1000', 'ok') not in runner._points(None)
+    runner.close()
+
+def test_partial_journal_line_is_ignored(config):
+    os.makedirs(config['out'])
+    with open(os.path.join(config['out'], sweepRunner.JOURNAL), 'w') as f:
+        f.write('{"triads": null, "mask": "0x1000", "be')
+    runner = sweepRunner.SweepRunner(config)
+    assert len(runner._points(None)) == 4
+    runner.close()
+    # The records of the next run start in a new line
+    run(config)
+    runner = sweepRunner.SweepRunner(config)
+    assert runner._done == {(None, '0x1000', 'ok'), (None, '0xFFFF', 'ok')}
+    assert runner._failed == {(None, '0x1000', 'ko'): 1,
+            (None, '0xFFFF', 'ko'): 1}
+    runner.close()
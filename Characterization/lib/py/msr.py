@@ -3,53 +3,80 @@
 """
 Functions to read and write MSR registers
 
+The MSR device of every CPU is opened the first time that it is accessed and
+kept open until close() is called (or the program ends). Accesses use
+positional I/O (pread/pwrite).
+
 @Author: Navarro Torres, Agustin (agusnt@unizar.es)
 @Date: 21/04/2020
 """
 import os
 import struct
+import atexit
+from threading import Lock
+
+# Path of the MSR device, {} is replaced by the cpu number
+MSR_DEV = "/dev/cpu/{}/msr"
+
+# Pool of open file descriptors (cpu -> fd)
+_fds = {}
+_mutex = Lock()
+
+def _getFD(cpu):
+    """
+    Return the file descriptor of the MSR device of the given CPU, opening it
+    if it is the first access.
+
+    Parameters :
+        cpu : cpu number
+
+    Return :
+        File descriptor
+    """
+    fd = _fds.get(cpu)
+    if fd is None:
+        with (_mutex):
+            fd = _fds.get(cpu)
+            if fd is None:
+                fd = os.open(MSR_DEV.format(cpu), os.O_RDWR)
+                _fds[cpu] = fd
+    return fd
 
 def readMSR (cpu, reg):
     """
     Read the given MSR in the given CPU.
 
-    Parameters : 
+    Parameters :
         cpu : cpu number
         reg : msr register
 
     Return :
         Reading value
     """
-    dmsr = "/dev/cpu/{}/msr".format(cpu)
-    # Open the MSR interface
-    f = os.open(dmsr, os.O_RDONLY)
-    # Seek the MSR register
-    os.lseek(f, reg, os.SEEK_SET)
-    # Read the register
-    value = struct.unpack('Q', os.read(f, 8))[0]
-    os.close(f)
-
-    return value
+    return struct.unpack('Q', os.pread(_getFD(cpu), 8, reg))[0]
 
 def writeMSR (cpu, reg, value):
     """
     Write the given MSR in the given CPU.
 
-    Parameters : 
+    Parameters :
         cpu : cpu number
         reg : msr register
         value : value to write into the msr
     """
-    dmsr = "/dev/cpu/{}/msr".format(cpu)
-    # Open the MSR interface
-    f = os.open(dmsr, os.O_WRONLY)
-    # Seek the MSR register
-    os.lseek(f, reg, os.SEEK_SET)
-    # Read the register
-    os.write(f, struct.pack('Q', value))
-    os.close(f)
+    os.pwrite(_getFD(cpu), struct.pack('Q', value), reg)
     return value
 
+def close():
+    """
+    Close all the open MSR devices
+    """
+    with (_mutex):
+        for cpu in list(_fds):
+            os.close(_fds.pop(cpu))
+
+atexit.register(close)
+
 if __name__ == '__main__':
     # Read register associated to hardware counter select (Core 0)
     print("1st Read 0x{:02x}".format(readMSR(0, 0xC0010202)))